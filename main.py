@@ -1,14 +1,19 @@
 #!/bin/env python
 """The main entry point for the stickerfinder."""
+import random
+import tracemalloc
 from contextlib import contextmanager
 
 import typer
 from sqlalchemy_utils.functions import database_exists, create_database, drop_database
 
 from stickerfinder.config import config
-from stickerfinder.db import engine, base
+from stickerfinder.db import engine, base, get_session
+from stickerfinder.logic.search_doc import rebuild_search_docs
 from stickerfinder.models import *  # noqa
+from stickerfinder.prefork import run_prefork
 from stickerfinder.stickerfinder import init_app
+from stickerfinder.telegram.inline_query.compact import CachedResults, StickerFiles
 
 cli = typer.Typer()
 
@@ -59,9 +64,81 @@ def initdb(exist_ok: bool = False, drop_existing: bool = False):
     typer.echo("Database initialization complete.")
 
 
+@cli.command("rebuild-search-docs")
+def rebuild_search_docs_command():
+    """Rebuild the search documents of all stickers."""
+    session = get_session()
+    with wrap_echo("Rebuilding search documents"):
+        try:
+            rebuild_search_docs(session)
+            session.commit()
+        finally:
+            session.remove()
+
+
+@cli.command("benchmark-query-cache")
+def benchmark_query_cache(
+    queries: int = 2000, results: int = 500, stickers: int = 20000
+):
+    """Measure the memory per cached inline query of the list and the array layout.
+
+    Each query caches `results` random stickers out of `stickers` popular ones.
+    """
+    generator = random.Random(0)
+    sticker_ids = [generator.sample(range(stickers), results) for _ in range(queries)]
+
+    def fetch_results(query_ids):
+        # Each query gets its own string objects, just like rows fetched from the database.
+        return [
+            (
+                sticker_id,
+                f"CAACAgIAAxkBAAIB{sticker_id:040d}",
+                f"AgAD{sticker_id:012d}",
+                "set",
+                1.5,
+            )
+            for sticker_id in query_ids
+        ]
+
+    def measure(cache_results):
+        tracemalloc.start()
+        entries = [cache_results(fetch_results(query_ids)) for query_ids in sticker_ids]
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del entries
+        return size / queries / 1024
+
+    def cache_lists(search_results):
+        strict = []
+        strict_unique = []
+        for result in search_results:
+            strict.append([result[0], result[1], result[4]])
+            strict_unique.append(result[2])
+        return strict, strict_unique
+
+    sticker_files = StickerFiles()
+
+    def cache_arrays(search_results):
+        sticker_files.add(search_results)
+        strict = CachedResults()
+        for result in search_results:
+            strict.append(result[0], result[4])
+        return strict
+
+    typer.echo(f"Lists: {measure(cache_lists):.1f} KB per query")
+    typer.echo(f"Arrays: {measure(cache_arrays):.1f} KB per query")
+    typer.echo(f"(including {len(sticker_files)} shared sticker files)")
+
+
 @cli.command()
 def run():
     """Actually start the bot."""
+    if config["webhook"]["enabled"] and config["webhook"]["workers"] > 1:
+        workers = config["webhook"]["workers"]
+        typer.echo(f"Starting the bot in webhook mode with {workers} workers.")
+        run_prefork()
+        return
+
     updater = init_app()
 
     if config["webhook"]["enabled"]:
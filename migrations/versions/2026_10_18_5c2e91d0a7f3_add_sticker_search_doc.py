@@ -0,0 +1,133 @@
+"""Add sticker search doc
+
+Revision ID: 5c2e91d0a7f3
+Revises: b8ac0fcff20c
+Create Date: 2026-10-18 12:14:02.118513
+
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "5c2e91d0a7f3"
+down_revision = "b8ac0fcff20c"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "sticker_search_doc",
+        sa.Column("file_unique_id", sa.String(), nullable=False),
+        sa.Column("sticker_id", sa.BigInteger(), nullable=False),
+        sa.Column("file_id", sa.String(), nullable=False),
+        sa.Column("text", sa.String(), nullable=True),
+        sa.Column("animated", sa.Boolean(), nullable=False),
+        sa.Column("tags", postgresql.ARRAY(sa.String()), nullable=False),
+        sa.Column("international_tags", postgresql.ARRAY(sa.String()), nullable=False),
+        sa.Column("set_name", sa.String(), nullable=False),
+        sa.Column("set_title", sa.String(), nullable=True),
+        sa.Column("banned", sa.Boolean(), nullable=False),
+        sa.Column("nsfw", sa.Boolean(), nullable=False),
+        sa.Column("furry", sa.Boolean(), nullable=False),
+        sa.Column("international", sa.Boolean(), nullable=False),
+        sa.Column("deluxe", sa.Boolean(), nullable=False),
+        sa.Column("reviewed", sa.Boolean(), nullable=False),
+        sa.Column("deleted", sa.Boolean(), nullable=False),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(
+            ["file_unique_id"],
+            ["sticker.file_unique_id"],
+            onupdate="cascade",
+            ondelete="cascade",
+            deferrable=True,
+        ),
+        sa.ForeignKeyConstraint(
+            ["set_name"],
+            ["sticker_set.name"],
+            onupdate="cascade",
+            ondelete="cascade",
+            deferrable=True,
+        ),
+        sa.PrimaryKeyConstraint("file_unique_id"),
+        sa.UniqueConstraint("sticker_id"),
+    )
+    op.create_index(
+        op.f("ix_sticker_search_doc_set_name"),
+        "sticker_search_doc",
+        ["set_name"],
+        unique=False,
+    )
+    op.create_index(
+        "sticker_search_doc_tags_idx",
+        "sticker_search_doc",
+        ["tags"],
+        unique=False,
+        postgresql_using="gin",
+    )
+    op.create_index(
+        "sticker_search_doc_international_tags_idx",
+        "sticker_search_doc",
+        ["international_tags"],
+        unique=False,
+        postgresql_using="gin",
+    )
+    op.create_index(
+        "sticker_search_doc_text_idx",
+        "sticker_search_doc",
+        ["text"],
+        unique=False,
+        postgresql_using="gin",
+        postgresql_ops={"text": "gin_trgm_ops"},
+    )
+
+    # Backfill the search documents of all existing stickers
+    op.execute(
+        """
+        INSERT INTO sticker_search_doc (
+            file_unique_id, sticker_id, file_id, text, animated,
+            tags, international_tags,
+            set_name, set_title, banned, nsfw, furry,
+            international, deluxe, reviewed, deleted
+        )
+        SELECT
+            sticker.file_unique_id, sticker.id, sticker.file_id,
+            sticker.text, sticker.animated,
+            coalesce(
+                array_agg(tag.name) FILTER (WHERE tag.international IS false),
+                '{}'::varchar[]
+            ),
+            coalesce(
+                array_agg(tag.name) FILTER (WHERE tag.international IS true),
+                '{}'::varchar[]
+            ),
+            sticker_set.name, sticker_set.title, sticker_set.banned,
+            sticker_set.nsfw, sticker_set.furry, sticker_set.international,
+            sticker_set.deluxe, sticker_set.reviewed, sticker_set.deleted
+        FROM sticker
+        JOIN sticker_set ON sticker.sticker_set_name = sticker_set.name
+        LEFT OUTER JOIN sticker_tag
+            ON sticker.file_unique_id = sticker_tag.sticker_file_unique_id
+        LEFT OUTER JOIN tag ON sticker_tag.tag_name = tag.name
+        WHERE sticker.banned IS false
+        GROUP BY sticker.file_unique_id, sticker_set.name
+        """
+    )
+
+
+def downgrade():
+    op.drop_index("sticker_search_doc_text_idx", table_name="sticker_search_doc")
+    op.drop_index(
+        "sticker_search_doc_international_tags_idx", table_name="sticker_search_doc"
+    )
+    op.drop_index("sticker_search_doc_tags_idx", table_name="sticker_search_doc")
+    op.drop_index(
+        op.f("ix_sticker_search_doc_set_name"), table_name="sticker_search_doc"
+    )
+    op.drop_table("sticker_search_doc")
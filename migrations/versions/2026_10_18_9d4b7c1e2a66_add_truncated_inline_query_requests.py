@@ -0,0 +1,26 @@
+"""Add truncated inline query requests
+
+Revision ID: 9d4b7c1e2a66
+Revises: 5c2e91d0a7f3
+Create Date: 2026-10-18 16:41:27.503112
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "9d4b7c1e2a66"
+down_revision = "5c2e91d0a7f3"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "inline_query_request", sa.Column("truncated", sa.Boolean(), nullable=True)
+    )
+
+
+def downgrade():
+    op.drop_column("inline_query_request", "truncated")
@@ -0,0 +1,72 @@
+"""Process wide caches, which are shared between all users."""
+
+from stickerfinder.config import config
+from stickerfinder.helper.lru_cache import LRUCache
+from stickerfinder.helper.sqlite_cache import SQLiteCache
+
+# Maps (search term, similarity threshold) to a list of similar tags.
+# Each similar tag is a (name, similarity, international) tuple.
+# New tags are found once the entries expired or the trigram index has been rebuilt.
+tag_expansion_cache = LRUCache(
+    config["cache"]["tag_expansion_size"],
+    config["cache"]["tag_expansion_ttl_minutes"] * 60,
+)
+
+# Maps (sorted search tags, filter profile) to the unpersonalized strict candidates.
+# The candidates are a tuple of the ranked candidate rows and a flag,
+# whether there are more matching stickers than candidates.
+shared_result_cache = LRUCache(
+    config["cache"]["shared_results_size"],
+    config["cache"]["shared_results_ttl_minutes"] * 60,
+)
+
+
+def get_usage_map_size(usages):
+    """Estimate the memory footprint of a usage map in bytes.
+
+    Each entry consists of the dict slot, the file_unique_id string,
+    the (usage_count, updated_at) tuple and the datetime.
+    """
+    return 240 + len(usages) * 200
+
+
+# Maps user ids to the user's sticker usages.
+# The usages are a dict of file_unique_id to a (usage_count, updated_at) tuple.
+usage_cache = LRUCache(
+    config["cache"]["usage_users"],
+    config["cache"]["usage_ttl_minutes"] * 60,
+    max_bytes=config["cache"]["usage_max_megabytes"] * 1024 * 1024,
+    size_of=get_usage_map_size,
+)
+
+# Maps user ids to the user's flags and search settings.
+user_profile_cache = LRUCache(
+    config["cache"]["user_profile_size"],
+    config["cache"]["user_profile_ttl_minutes"] * 60,
+)
+
+# Maps user ids to the time, when their profile has been invalidated.
+# Forked bot processes handle the updates of different users, so a user might be
+# banned by an admin in another process. The invalidations are shared via SQLite.
+# Profiles expire anyway, which is why invalidations are kept just as long.
+user_profile_invalidations = None
+if config["cache"]["user_profile_enabled"] and config["webhook"]["workers"] > 1:
+    user_profile_invalidations = SQLiteCache(
+        config["cache"]["user_profile_invalidation_sqlite_path"],
+        config["cache"]["user_profile_size"],
+        config["cache"]["user_profile_ttl_minutes"] * 60,
+    )
+
+# Maps user ids to a dict of (nsfw, furry, animated) to the user's top favorites
+# with these filters. The favorites are a tuple of the ranked favorite rows and a flag,
+# whether these are all favorites of the user.
+favorite_cache = LRUCache(
+    config["cache"]["favorites_size"],
+    config["cache"]["favorites_ttl_minutes"] * 60,
+)
+
+# Maps user ids to the filters, tags and complete strict results of the user's latest search.
+recent_search_cache = LRUCache(
+    config["cache"]["recent_searches_size"],
+    config["cache"]["recent_searches_ttl_seconds"],
+)
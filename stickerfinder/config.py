@@ -30,6 +30,8 @@ default_config = {
         "token": "stickerfinder",
         "cert_path": "/path/to/cert.pem",
         "port": 7000,
+        # Fork this many bot processes. Updates are distributed by user id.
+        "workers": 1,
     },
     "job": {
         "user_check_count": 200,
@@ -41,6 +43,82 @@ default_config = {
         "auto_accept_set": False,
         "private_inline_query": False,
         "inline_cache_size": 500,
+        # The amount of pages of 8 sets, which are fetched and cached at once in set search
+        "inline_set_cache_pages": 8,
+        # Either "sql", "numpy" or "memory". The in-memory engine answers strict search
+        # from a tag index, which is rebuilt every few minutes. The numpy engine only
+        # fetches the matching stickers and computes their scores and order in python.
+        "search_engine": "sql",
+        "search_index_refresh_minutes": 10,
+        # Answer pure emoji searches from an in-memory emoji index, which is rebuilt
+        # together with the other search indices.
+        "emoji_index": False,
+        # Either "sql" or "memory". The in-memory engine looks up similar tags
+        # for fuzzy search in a trigram index of all tags.
+        "similar_tag_engine": "sql",
+        # Start the fuzzy query in parallel to the strict query, if the searched
+        # tags are found on less than `concurrent_fuzzy_max_frequency` stickers.
+        "concurrent_fuzzy": False,
+        "concurrent_fuzzy_max_frequency": 50,
+        # Fetch the next window of results in the background, before the cache runs out.
+        "prefetch": False,
+        "prefetch_workers": 4,
+        # Compute the strict results of an extended query from the user's previous query.
+        "incremental_search": False,
+        # Answer inline queries within a time budget. Telegram drops answers after ~10 seconds.
+        # Fuzzy search is skipped, if less than `search_fuzzy_min_seconds` are left.
+        "search_deadline": False,
+        "search_budget_seconds": 7,
+        "search_fuzzy_min_seconds": 1,
+        # Run inline queries in an event loop on async database connections.
+        # This needs the optional asyncpg package: `poetry install --extras async`
+        "async_inline_search": False,
+        # Buffer the analytics of inline queries and insert them in batches.
+        "buffered_analytics": False,
+        "analytics_flush_seconds": 5,
+        "analytics_batch_size": 500,
+        # The amount of recent offsets, which are remembered to detect duplicate requests.
+        "analytics_offsets_size": 100000,
+        # Aggregate the usages of chosen inline results and upsert them in batches.
+        "batched_usages": False,
+        "usage_flush_seconds": 2,
+    },
+    "cache": {
+        # Cache the similar tags of fuzzy search terms across all users
+        "tag_expansion_enabled": False,
+        "tag_expansion_size": 10000,
+        "tag_expansion_ttl_minutes": 60,
+        # Share the unpersonalized strict results of a search between all users
+        "shared_results_enabled": False,
+        "shared_results_size": 1000,
+        "shared_results_ttl_minutes": 5,
+        "shared_results_candidates": 2000,
+        # Keep the sticker usages of active users in memory
+        "usage_enabled": False,
+        "usage_users": 10000,
+        "usage_max_megabytes": 64,
+        "usage_ttl_minutes": 60,
+        # Keep the profiles of active users in memory for inline queries
+        "user_profile_enabled": False,
+        "user_profile_size": 100000,
+        "user_profile_ttl_minutes": 10,
+        # Forked bot processes share the invalidations of profiles via this file.
+        "user_profile_invalidation_sqlite_path": "/tmp/stickerfinder_profile_invalidations.sqlite",
+        # Keep the top favorites of users in memory for empty queries
+        "favorites_enabled": False,
+        "favorites_size": 10000,
+        "favorites_count": 200,
+        "favorites_ttl_minutes": 60,
+        # The latest complete strict results of users for incremental search
+        "recent_searches_size": 10000,
+        "recent_searches_ttl_seconds": 60,
+        # The results of running inline queries, which are served for the following pages.
+        # Use the `sqlite` backend to share them between multiple bot processes on a host.
+        "inline_query_backend": "memory",
+        "inline_query_sqlite_path": "/tmp/stickerfinder_inline_queries.sqlite",
+        "inline_query_size": 100000,
+        "inline_query_max_megabytes": 256,
+        "inline_query_ttl_minutes": 20,
     },
 }
 
@@ -56,6 +134,7 @@ else:
 
     # Set default values for any missing keys in the loaded config
     for key, category in default_config.items():
+        config.setdefault(key, {})
         for option, value in category.items():
             if option not in config[key]:
                 config[key][option] = value
@@ -10,9 +10,21 @@ from sqlalchemy.types import Numeric
 
 from stickerfinder.config import config
 
+
+def get_pool_size():
+    """Get the pool size, including the sessions of the search worker threads."""
+    pool_size = config["database"]["connection_count"]
+    if config["mode"]["concurrent_fuzzy"]:
+        pool_size += config["telegram"]["worker_count"]
+    if config["mode"]["prefetch"]:
+        pool_size += config["mode"]["prefetch_workers"]
+
+    return pool_size
+
+
 engine = create_engine(
     config["database"]["sql_uri"],
-    pool_size=config["database"]["connection_count"],
+    pool_size=get_pool_size(),
     max_overflow=config["database"]["overflow_count"],
     echo=False,
 )
@@ -0,0 +1,205 @@
+"""A thread-safe LRU cache with time based expiry."""
+
+import time
+from collections import OrderedDict
+from threading import Lock
+
+
+class LRUCache:
+    """A bounded mapping, which evicts the least recently used entries.
+
+    Entries expire `ttl` seconds after they have been stored.
+    Hits and misses are counted, so we can see how well the cache performs.
+
+    If `max_bytes` is given, the cache additionally evicts entries as long as the
+    accumulated size of all entries exceeds the budget. The size of an entry is
+    estimated by the `size_of` function.
+
+    `on_evict` is called with the value of each entry, which is evicted or expires.
+    """
+
+    def __init__(self, max_size, ttl, max_bytes=None, size_of=None, on_evict=None):
+        """Create a new empty cache."""
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.size_of = size_of
+        self.on_evict = on_evict
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+        self.bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        """Return the amount of cached entries."""
+        return len(self.entries)
+
+    def get(self, key):
+        """Get an entry and mark it as recently used.
+
+        Returns `None` if there's no entry or the entry expired.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, stored_at, _ = entry
+            if time.monotonic() - stored_at > self.ttl:
+                self.remove(key)
+                self.evicted(value)
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Store an entry and evict the least recently used ones, if the cache is full."""
+        with self.lock:
+            self.store(key, value)
+
+    def setdefault(self, key, value):
+        """Get an entry or store the value, if there's no entry yet.
+
+        Returns the cached value, which might have been stored by another thread.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] <= self.ttl:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+            if entry is not None:
+                self.remove(key)
+                self.evicted(entry[0])
+
+            self.misses += 1
+            self.store(key, value)
+
+            return value
+
+    def update(self, key, function):
+        """Replace a cached value with the result of `function(value)`.
+
+        Nothing happens, if there's no entry for the key.
+        The function is called while holding the lock, so concurrent updates aren't lost.
+        The entry keeps its position and its expiry time.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return
+
+            value, stored_at, size = entry
+            value = function(value)
+
+            new_size = self.size_of(value) if self.size_of is not None else 0
+            self.entries[key] = (value, stored_at, new_size)
+            self.bytes += new_size - size
+
+            self.evict()
+
+    def pop(self, key):
+        """Remove an entry and return its value.
+
+        Returns `None` if there's no entry for the key.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+
+            self.remove(key)
+            return entry[0]
+
+    def expire(self):
+        """Remove all expired entries."""
+        with self.lock:
+            now = time.monotonic()
+            keys = [
+                key
+                for key, (_, stored_at, _) in self.entries.items()
+                if now - stored_at > self.ttl
+            ]
+            for key in keys:
+                value = self.entries[key][0]
+                self.remove(key)
+                self.evicted(value)
+
+    def get_values(self):
+        """Get a list of all cached values, including expired ones.
+
+        This doesn't count as an access of the entries.
+        """
+        with self.lock:
+            return [value for value, _, _ in self.entries.values()]
+
+    def invalidate(self, predicate):
+        """Remove all entries whose key matches the predicate."""
+        with self.lock:
+            keys = [key for key in self.entries if predicate(key)]
+            for key in keys:
+                self.remove(key)
+
+    def clear(self):
+        """Remove all entries."""
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def store(self, key, value):
+        """Store an entry and evict entries, if necessary. The lock has to be held by the caller."""
+        if key in self.entries:
+            self.remove(key)
+
+        size = self.size_of(value) if self.size_of is not None else 0
+        self.entries[key] = (value, time.monotonic(), size)
+        self.bytes += size
+
+        self.evict()
+
+    def remove(self, key):
+        """Remove a single entry. The lock has to be held by the caller."""
+        _, _, size = self.entries.pop(key)
+        self.bytes -= size
+
+    def evict(self):
+        """Evict the least recently used entries, until the cache fits its limits.
+
+        The lock has to be held by the caller.
+        """
+        while len(self.entries) > self.max_size or (
+            self.max_bytes is not None and self.bytes > self.max_bytes
+        ):
+            _, (value, _, size) = self.entries.popitem(last=False)
+            self.bytes -= size
+            self.evicted(value)
+
+    def evicted(self, value):
+        """Count an evicted or expired entry. The lock has to be held by the caller."""
+        self.evictions += 1
+        if self.on_evict is not None:
+            self.on_evict(value)
+
+    def get_stats(self):
+        """Get a human readable summary of the cache usage."""
+        requests = self.hits + self.misses
+        hit_rate = self.hits / requests * 100 if requests > 0 else 0
+
+        stats = (
+            f"{len(self.entries)}/{self.max_size} entries, "
+            f"{self.hits} hits, {self.misses} misses ({hit_rate:.1f}% hit rate), "
+            f"{self.evictions} evictions"
+        )
+        if self.max_bytes is not None:
+            stats += f", {self.bytes // 1024}/{self.max_bytes // 1024} KB"
+
+        return stats
@@ -0,0 +1,252 @@
+"""A cache in a SQLite database file, which is shared between processes."""
+
+import os
+import pickle
+import sqlite3
+import time
+from threading import Lock, local
+
+# The limits of the cache are enforced after this many writes of a process
+EVICTION_INTERVAL = 100
+
+
+class SQLiteCache:
+    """A cache with the same interface as the LRU cache, but stored in a SQLite file.
+
+    All processes on the same host, which use the same file, share their entries.
+    Values are serialized with `dump` and deserialized with `load`.
+
+    Entries expire `ttl` seconds after they have been stored. Expired entries are
+    only removed by `expire`. The oldest entries beyond `max_size` and `max_bytes`
+    are removed every few writes and by `expire`, since counting the entries and
+    their size on every insert would be too expensive.
+    """
+
+    def __init__(
+        self,
+        path,
+        max_size,
+        ttl,
+        max_bytes=None,
+        dump=pickle.dumps,
+        load=pickle.loads,
+    ):
+        """Create the cache table, if it doesn't exist yet."""
+        self.path = path
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.dump = dump
+        self.load = load
+        self.connections = local()
+        self.lock = Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.writes = 0
+
+        connection = self.get_connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache "
+            "(key TEXT PRIMARY KEY, value BLOB NOT NULL, stored_at REAL NOT NULL)"
+        )
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS cache_stored_at ON cache (stored_at)"
+        )
+
+    def __len__(self):
+        """Return the amount of stored entries."""
+        return self.get_connection().execute("SELECT count(*) FROM cache").fetchone()[0]
+
+    def get_connection(self):
+        """Get the connection of the current thread.
+
+        SQLite connections can't be shared between threads or forked processes.
+        Transactions are handled explicitely, hence the autocommit mode.
+        """
+        connection = getattr(self.connections, "connection", None)
+        if connection is None or self.connections.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            self.connections.connection = connection
+            self.connections.pid = os.getpid()
+
+        return connection
+
+    def get(self, key):
+        """Get an entry.
+
+        Returns `None` if there's no entry or the entry expired.
+        """
+        row = (
+            self.get_connection()
+            .execute(
+                "SELECT value FROM cache WHERE key = ? AND stored_at >= ?",
+                (str(key), time.time() - self.ttl),
+            )
+            .fetchone()
+        )
+
+        with self.lock:
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+
+        return self.load(row[0])
+
+    def put(self, key, value):
+        """Store an entry."""
+        self.get_connection().execute(
+            "INSERT OR REPLACE INTO cache (key, value, stored_at) VALUES (?, ?, ?)",
+            (str(key), self.dump(value), time.time()),
+        )
+        self.written()
+
+    def setdefault(self, key, value):
+        """Get an entry or store the value, if there's no entry yet.
+
+        Returns the stored value, which might have been stored by another process.
+        An entry of another process is never replaced, since it might already hold results.
+        """
+        data = self.dump(value)
+        now = time.time()
+
+        connection = self.get_connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "DELETE FROM cache WHERE key = ? AND stored_at < ?",
+                (str(key), now - self.ttl),
+            )
+            inserted = connection.execute(
+                "INSERT OR IGNORE INTO cache (key, value, stored_at) VALUES (?, ?, ?)",
+                (str(key), data, now),
+            ).rowcount
+            row = None
+            if inserted == 0:
+                row = connection.execute(
+                    "SELECT value FROM cache WHERE key = ?", (str(key),)
+                ).fetchone()
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+        with self.lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        if row is None:
+            self.written()
+            return value
+
+        return self.load(row[0])
+
+    def update(self, key, function):
+        """Replace a stored value with the result of `function(value)`.
+
+        Nothing happens, if there's no entry for the key.
+        The update runs in a write transaction, so concurrent updates of other
+        processes aren't lost. The entry keeps its expiry time.
+        """
+        connection = self.get_connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT value FROM cache WHERE key = ?", (str(key),)
+            ).fetchone()
+            if row is not None:
+                value = function(self.load(row[0]))
+                connection.execute(
+                    "UPDATE cache SET value = ? WHERE key = ?",
+                    (self.dump(value), str(key)),
+                )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def pop(self, key):
+        """Remove an entry and return its value.
+
+        Returns `None` if there's no entry for the key.
+        """
+        connection = self.get_connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute(
+                "SELECT value FROM cache WHERE key = ?", (str(key),)
+            ).fetchone()
+            connection.execute("DELETE FROM cache WHERE key = ?", (str(key),))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+        if row is None:
+            return None
+
+        return self.load(row[0])
+
+    def expire(self):
+        """Remove all expired entries and the oldest entries beyond the limits."""
+        expired = (
+            self.get_connection()
+            .execute("DELETE FROM cache WHERE stored_at < ?", (time.time() - self.ttl,))
+            .rowcount
+        )
+
+        with self.lock:
+            self.evictions += expired
+
+        self.evict()
+
+    def written(self):
+        """Count a write of this process and enforce the limits every few writes."""
+        with self.lock:
+            self.writes += 1
+            evict = self.writes % EVICTION_INTERVAL == 0
+
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """Remove the oldest entries beyond the maximum size and the maximum bytes."""
+        connection = self.get_connection()
+        evicted = connection.execute(
+            "DELETE FROM cache WHERE key IN "
+            "(SELECT key FROM cache ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_size,),
+        ).rowcount
+
+        if self.max_bytes is not None:
+            evicted += connection.execute(
+                "DELETE FROM cache WHERE key IN "
+                "(SELECT key FROM (SELECT key, sum(length(value)) "
+                "OVER (ORDER BY stored_at DESC, key) AS total FROM cache) "
+                "WHERE total > ?)",
+                (self.max_bytes,),
+            ).rowcount
+
+        with self.lock:
+            self.evictions += evicted
+
+    def clear(self):
+        """Remove all entries."""
+        self.get_connection().execute("DELETE FROM cache")
+
+    def get_stats(self):
+        """Get a human readable summary of the cache usage of this process."""
+        requests = self.hits + self.misses
+        hit_rate = self.hits / requests * 100 if requests > 0 else 0
+
+        return (
+            f"{len(self)}/{self.max_size} entries, "
+            f"{self.hits} hits, {self.misses} misses ({hit_rate:.1f}% hit rate), "
+            f"{self.evictions} evictions"
+        )
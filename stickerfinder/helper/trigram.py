@@ -0,0 +1,43 @@
+"""Trigram helper functions, which behave like the ones of pg_trgm."""
+
+
+def get_words(text):
+    """Split a text into lowercase words of alphanumeric characters, like pg_trgm does."""
+    words = []
+    word = []
+    for char in text.lower():
+        if char.isalnum():
+            word.append(char)
+        elif word:
+            words.append("".join(word))
+            word = []
+
+    if word:
+        words.append("".join(word))
+
+    return words
+
+
+def get_trigrams(text):
+    """Get the set of trigrams of a text, equivalent to pg_trgm's `show_trgm`.
+
+    Each word is padded with two spaces in front and one space at the end.
+    """
+    trigrams = set()
+    for word in get_words(text):
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            trigrams.add(padded[i : i + 3])
+
+    return trigrams
+
+
+def similarity(first, second):
+    """Compute the pg_trgm similarity of two texts."""
+    first = get_trigrams(first)
+    second = get_trigrams(second)
+    if len(first) == 0 or len(second) == 0:
+        return 0
+
+    shared = len(first & second)
+    return shared / (len(first) + len(second) - shared)
@@ -0,0 +1,56 @@
+"""Base class for buffers, which are written to the database in the background."""
+
+import atexit
+from abc import ABC, abstractmethod
+from threading import Event, Lock, Thread
+
+from stickerfinder.config import config
+
+
+class WriteBehindBuffer(ABC):
+    """A buffer, which is flushed periodically by a background thread.
+
+    Subclasses implement `flush`, which writes all buffered rows.
+    Flushes never run concurrently, since they're serialized by `flush_lock`.
+    """
+
+    def __init__(self, name, interval_key):
+        """Create a new buffer, whose thread still needs to be started.
+
+        The buffer is flushed every `config["mode"][interval_key]` seconds.
+        """
+        self.name = name
+        self.interval_key = interval_key
+        self.lock = Lock()
+        self.flush_lock = Lock()
+        self.wakeup = Event()
+        self.thread = None
+        self.running = False
+
+    def start(self):
+        """Start the background thread, which flushes the buffer."""
+        self.running = True
+        self.thread = Thread(target=self.run, name=self.name, daemon=True)
+        self.thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Stop the background thread and flush all remaining rows."""
+        if not self.running:
+            return
+
+        self.running = False
+        self.wakeup.set()
+        self.thread.join()
+        self.flush()
+
+    def run(self):
+        """Flush the buffer periodically or as soon as it's woken up."""
+        while self.running:
+            self.wakeup.wait(config["mode"][self.interval_key])
+            self.wakeup.clear()
+            self.flush()
+
+    @abstractmethod
+    def flush(self):
+        """Write all buffered rows."""
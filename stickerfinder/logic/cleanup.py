@@ -5,8 +5,9 @@ from datetime import datetime, timedelta
 from sqlalchemy import or_
 from sqlalchemy.orm import aliased
 
+from stickerfinder.caches import tag_expansion_cache
 from stickerfinder.logic.tag import get_tags_from_text
-from stickerfinder.models import InlineQuery, Tag, User
+from stickerfinder.models import InlineQuery, StickerSearchDoc, Tag, User
 
 
 def full_cleanup(session, inline_query_threshold, chat=None):
@@ -32,6 +33,7 @@ def tag_cleanup(session, chat=None):
 
         # If the tag is empty, remove it
         if len(tags) == 0:
+            StickerSearchDoc.remove_tag(session, tag.name)
             session.delete(tag)
             session.commit()
             removed += 1
@@ -44,13 +46,18 @@ def tag_cleanup(session, chat=None):
         if new_name != tag.name:
             new_exists = session.query(Tag).get(new_name)
             if new_exists is not None or new_name == "":
+                StickerSearchDoc.remove_tag(session, tag.name)
                 session.delete(tag)
                 removed += 1
                 session.commit()
             else:
+                StickerSearchDoc.rename_tag(session, tag.name, new_name)
                 tag.name = new_name
                 session.commit()
 
+    # Tags have been renamed and removed, throw away all cached tag expansions
+    tag_expansion_cache.clear()
+
     if chat is not None:
         chat.send_message(f"Removed {removed}\nCorrected: {corrected}")
 
@@ -4,7 +4,8 @@ from sqlalchemy import func
 from telegram.error import BadRequest, ChatMigrated, Unauthorized
 
 from stickerfinder.helper.text import split_text
-from stickerfinder.models import Change, Chat, StickerSet, Task
+from stickerfinder.logic.search_doc import update_search_doc
+from stickerfinder.models import Change, Chat, StickerSearchDoc, StickerSet, Task
 from stickerfinder.telegram.keyboard import (
     check_user_tags_keyboard,
     get_nsfw_ban_keyboard,
@@ -211,8 +212,9 @@ def change_language_of_task_changes(session, task):
         for change in changes:
             # Change the language of the added tags.
             for tag in change.added_tags:
-                if not tag.emoji:
+                if not tag.emoji and tag.international != task.international:
                     tag.international = task.international
+                    StickerSearchDoc.move_tag(session, tag.name, tag.international)
 
             # Change the language for the change
             change.international = task.international
@@ -222,6 +224,7 @@ def change_language_of_task_changes(session, task):
                 if tag not in change.sticker.tags:
                     change.sticker.tags.append(tag)
 
+            update_search_doc(session, change.sticker)
             session.commit()
 
 
@@ -250,6 +253,7 @@ def revert_user_changes(session, user):
                 sticker.tags.append(tag)
 
         change.reverted = True
+        update_search_doc(session, sticker)
 
     user.reverted = True
 
@@ -279,6 +283,7 @@ def undo_user_changes_revert(session, user):
                 sticker.tags.remove(tag)
 
         change.reverted = False
+        update_search_doc(session, sticker)
 
     user.reverted = False
 
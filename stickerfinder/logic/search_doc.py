@@ -0,0 +1,114 @@
+"""Helper functions for maintaining the sticker search documents."""
+
+from sqlalchemy import String, cast, func, literal_column, select
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from stickerfinder.models import (
+    Sticker,
+    StickerSearchDoc,
+    StickerSet,
+    Tag,
+    sticker_tag,
+)
+from stickerfinder.models.sticker_search_doc import get_set_flags
+
+
+def update_search_doc(session, sticker):
+    """Create, update or remove the search document of a single sticker."""
+    doc = session.query(StickerSearchDoc).get(sticker.file_unique_id)
+
+    # Banned stickers and stickers without a set can never be found
+    if sticker.banned or sticker.sticker_set is None:
+        if doc is not None:
+            session.delete(doc)
+        return
+
+    if doc is None:
+        doc = StickerSearchDoc(sticker)
+        session.add(doc)
+    else:
+        doc.update_from_sticker(sticker)
+
+
+def update_search_docs_of_set(session, sticker_set):
+    """Update the set data of all search documents of a sticker set."""
+    values = get_set_flags(sticker_set)
+    values["set_title"] = sticker_set.title
+
+    session.query(StickerSearchDoc).filter(
+        StickerSearchDoc.set_name == sticker_set.name
+    ).update(values, synchronize_session=False)
+
+
+def refresh_search_docs_of_set(session, sticker_set):
+    """Update the documents of all stickers of a set and remove stale ones."""
+    file_unique_ids = []
+    for sticker in sticker_set.stickers:
+        update_search_doc(session, sticker)
+        file_unique_ids.append(sticker.file_unique_id)
+
+    # Remove documents of stickers that are no longer part of this set
+    session.query(StickerSearchDoc).filter(
+        StickerSearchDoc.set_name == sticker_set.name
+    ).filter(StickerSearchDoc.file_unique_id.notin_(file_unique_ids)).delete(
+        synchronize_session=False
+    )
+
+
+def rebuild_search_docs(session):
+    """Throw away all search documents and create them from scratch."""
+    session.query(StickerSearchDoc).delete(synchronize_session=False)
+
+    empty_array = cast(literal_column("'{}'"), ARRAY(String))
+
+    def tag_array(international):
+        tags = func.array_agg(Tag.name).filter(Tag.international.is_(international))
+        return func.coalesce(tags, empty_array)
+
+    docs = (
+        select(
+            Sticker.file_unique_id,
+            Sticker.id,
+            Sticker.file_id,
+            Sticker.text,
+            Sticker.animated,
+            tag_array(False),
+            tag_array(True),
+            StickerSet.name,
+            StickerSet.title,
+            StickerSet.banned,
+            StickerSet.nsfw,
+            StickerSet.furry,
+            StickerSet.international,
+            StickerSet.deluxe,
+            StickerSet.reviewed,
+            StickerSet.deleted,
+        )
+        .join(StickerSet, Sticker.sticker_set_name == StickerSet.name)
+        .outerjoin(
+            sticker_tag, Sticker.file_unique_id == sticker_tag.c.sticker_file_unique_id
+        )
+        .outerjoin(Tag, sticker_tag.c.tag_name == Tag.name)
+        .where(Sticker.banned.is_(False))
+        .group_by(Sticker.file_unique_id, StickerSet.name)
+    )
+
+    columns = [
+        "file_unique_id",
+        "sticker_id",
+        "file_id",
+        "text",
+        "animated",
+        "tags",
+        "international_tags",
+        "set_name",
+        "set_title",
+        "banned",
+        "nsfw",
+        "furry",
+        "international",
+        "deluxe",
+        "reviewed",
+        "deleted",
+    ]
+    session.execute(StickerSearchDoc.__table__.insert().from_select(columns, docs))
@@ -3,6 +3,11 @@
 from telegram.error import BadRequest
 
 from stickerfinder.config import config
+from stickerfinder.logic.search_doc import (
+    refresh_search_docs_of_set,
+    update_search_doc,
+    update_search_docs_of_set,
+)
 from stickerfinder.logic.tag import add_original_emojis
 from stickerfinder.models import Chat, Sticker
 from stickerfinder.telegram.keyboard import get_tag_this_set_keyboard
@@ -25,6 +30,7 @@ def refresh_stickers(session, sticker_set, bot, refresh_ocr=False, chat=None):
             sticker_set.completed = True
             if len(sticker_set.tasks) > 0 and sticker_set.tasks[0].type == "scan_set":
                 sticker_set.tasks[0].reviewed = True
+            update_search_docs_of_set(session, sticker_set)
             return
 
         raise e
@@ -72,6 +78,7 @@ def refresh_stickers(session, sticker_set, bot, refresh_ocr=False, chat=None):
         for chat in newsfeed_chats:
             bot.send_sticker(chat.id, sticker_set.stickers[0].file_id)
 
+    refresh_search_docs_of_set(session, sticker_set)
     session.commit()
 
 
@@ -99,5 +106,6 @@ def merge_sticker(session, sticker, new_sticker):
             new_usage.sticker_file_unique_id = sticker.file_unique_id
             session.commit()
 
+    update_search_doc(session, sticker)
     session.delete(new_sticker)
     session.commit()
@@ -6,6 +6,7 @@ from sqlalchemy import func
 
 from stickerfinder.enums import TagMode
 from stickerfinder.i18n import i18n
+from stickerfinder.logic.search_doc import update_search_doc
 from stickerfinder.models import Change, ProposedTags, Sticker, StickerSet, Tag
 from stickerfinder.telegram.keyboard import (
     get_fix_sticker_tags_keyboard,
@@ -15,6 +16,48 @@ from stickerfinder.telegram.keyboard import (
 
 ignored_characters = set(["\n", ",", ".", "!", "?", "'", "@", "#", "*", "[", "_"])
 
+# Code point ranges of emoji symbols
+emoji_ranges = [
+    (0x00A9, 0x00A9),
+    (0x00AE, 0x00AE),
+    (0x203C, 0x203C),
+    (0x2049, 0x2049),
+    (0x2122, 0x2122),
+    (0x2139, 0x2139),
+    (0x2194, 0x2199),
+    (0x21A9, 0x21AA),
+    (0x231A, 0x231B),
+    (0x2328, 0x2328),
+    (0x23CF, 0x23CF),
+    (0x23E9, 0x23F3),
+    (0x23F8, 0x23FA),
+    (0x24C2, 0x24C2),
+    (0x25AA, 0x25AB),
+    (0x25B6, 0x25B6),
+    (0x25C0, 0x25C0),
+    (0x25FB, 0x25FE),
+    (0x2600, 0x27BF),
+    (0x2934, 0x2935),
+    (0x2B05, 0x2B07),
+    (0x2B1B, 0x2B1C),
+    (0x2B50, 0x2B50),
+    (0x2B55, 0x2B55),
+    (0x3030, 0x3030),
+    (0x303D, 0x303D),
+    (0x3297, 0x3297),
+    (0x3299, 0x3299),
+    (0x1F000, 0x1FAFF),
+]
+
+# Code point ranges of joiners, keycaps, variation selectors, skin tones and flag tags
+emoji_modifier_ranges = [
+    (0x200D, 0x200D),
+    (0x20E3, 0x20E3),
+    (0xFE0E, 0xFE0F),
+    (0x1F3FB, 0x1F3FF),
+    (0xE0020, 0xE007F),
+]
+
 
 def current_sticker_tags_message(sticker, user, send_set_info=False):
     """Create a message displaying the current text and tags."""
@@ -204,6 +247,35 @@ def get_tags_from_text(text, limit=15):
     return filtered_tags[:15]
 
 
+def is_emoji(text):
+    """Check whether a text only consists of emojis."""
+    if len(get_emojis(text)) == 0:
+        return False
+
+    return all(
+        in_ranges(char, emoji_ranges) or in_ranges(char, emoji_modifier_ranges)
+        for char in text
+    )
+
+
+def get_emojis(text):
+    """Get the emoji symbols of a text without their modifiers and joiners.
+
+    Original emojis are stored character by character, see `add_original_emojis`.
+    """
+    return [
+        char
+        for char in text
+        if in_ranges(char, emoji_ranges) and not in_ranges(char, emoji_modifier_ranges)
+    ]
+
+
+def in_ranges(char, ranges):
+    """Check whether the code point of a character is in one of the given ranges."""
+    code_point = ord(char)
+    return any(start <= code_point <= end for start, end in ranges)
+
+
 def send_tagged_count_message(session, bot, user, chat):
     """Send a user a message that displays how many stickers he already tagged."""
     if chat.tag_mode in [TagMode.sticker_set.value, TagMode.random.value]:
@@ -304,6 +376,7 @@ def tag_sticker(
         message_id=message_id,
     )
     session.add(change)
+    update_search_doc(session, sticker)
 
     session.commit()
 
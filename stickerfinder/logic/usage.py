@@ -0,0 +1,71 @@
+"""Access to the sticker usages of users.
+
+Strict search and favorite mode need the usages of the requesting user on every page.
+If the usage cache is enabled, the usages of active users are kept in memory,
+which allows search to skip the `sticker_usage` table entirely.
+"""
+
+from stickerfinder.caches import favorite_cache, usage_cache
+from stickerfinder.config import config
+from stickerfinder.models import StickerUsage
+
+
+def get_usages(session, user_id):
+    """Get all sticker usages of a user.
+
+    Returns a dict of file_unique_id to a (usage_count, updated_at) tuple.
+    The returned dict must not be modified, since it might be shared via the cache.
+    """
+    enabled = config["cache"]["usage_enabled"]
+    if enabled:
+        usages = usage_cache.get(user_id)
+        if usages is not None:
+            return usages
+
+    rows = (
+        session.query(
+            StickerUsage.sticker_file_unique_id,
+            StickerUsage.usage_count,
+            StickerUsage.updated_at,
+        )
+        .filter(StickerUsage.user_id == user_id)
+        .all()
+    )
+    usages = {
+        file_unique_id: (usage_count, updated_at)
+        for file_unique_id, usage_count, updated_at in rows
+    }
+
+    if enabled:
+        usage_cache.put(user_id, usages)
+
+    return usages
+
+
+def get_usage_counts(session, user_id):
+    """Get a dict of file_unique_id to usage count of all used stickers of a user."""
+    return {
+        file_unique_id: usage_count
+        for file_unique_id, (usage_count, _) in get_usages(session, user_id).items()
+    }
+
+
+def record_usage(sticker_usage):
+    """Update the cached usages of a user with a committed sticker usage."""
+    file_unique_id = sticker_usage.sticker_file_unique_id
+    usage = (sticker_usage.usage_count, sticker_usage.updated_at)
+
+    # Copy the usages, since other threads might be iterating over the cached dict.
+    usage_cache.update(
+        sticker_usage.user_id,
+        lambda usages: {**usages, file_unique_id: usage},
+    )
+
+
+def invalidate_usages(user_id):
+    """Drop the cached usages and favorites of a user.
+
+    This needs to be called after usages of the user have been deleted.
+    """
+    usage_cache.pop(user_id)
+    favorite_cache.pop(user_id)
@@ -0,0 +1,78 @@
+"""Access to the profiles of users.
+
+Inline queries only need a few flags of the requesting user, but loading the user
+costs a query on every single request. If the profile cache is enabled, the flags
+of active users are kept in memory, which allows most inline queries to skip the
+`user` table entirely.
+
+Profiles need to be invalidated, whenever one of their flags is changed.
+Forked bot processes share their invalidations, since a user may be banned by an
+admin, whose updates are handled by another process.
+"""
+
+import time
+from types import SimpleNamespace
+
+from stickerfinder.caches import user_profile_cache, user_profile_invalidations
+from stickerfinder.config import config
+from stickerfinder.models import User
+
+
+def get_user_profile(session, tg_user):
+    """Get the profile of a telegram user.
+
+    The user is created, if it doesn't exist yet.
+    The returned profile must not be modified, since it might be shared via the cache.
+    """
+    enabled = config["cache"]["user_profile_enabled"]
+    if enabled:
+        profile = user_profile_cache.get(tg_user.id)
+        # A changed username needs to be written to the database.
+        if (
+            profile is not None
+            and (
+                tg_user.username is None or tg_user.username.lower() == profile.username
+            )
+            and not is_invalidated(profile)
+        ):
+            return profile
+
+    # Invalidations during the query have to apply to the loaded profile.
+    loaded_at = time.time()
+    user = User.get_or_create(session, tg_user)
+    profile = SimpleNamespace(
+        id=user.id,
+        username=user.username,
+        banned=user.banned,
+        authorized=user.authorized,
+        admin=user.admin,
+        nsfw=user.nsfw,
+        furry=user.furry,
+        international=user.international,
+        deluxe=user.deluxe,
+        loaded_at=loaded_at,
+    )
+
+    if enabled:
+        user_profile_cache.put(user.id, profile)
+
+    return profile
+
+
+def invalidate_user_profile(user_id):
+    """Drop the cached profile of a user.
+
+    This needs to be called after the flags of the user have been committed.
+    """
+    user_profile_cache.pop(user_id)
+    if user_profile_invalidations is not None:
+        user_profile_invalidations.put(user_id, time.time())
+
+
+def is_invalidated(profile):
+    """Check whether a profile has been invalidated by another process."""
+    if user_profile_invalidations is None:
+        return False
+
+    invalidated_at = user_profile_invalidations.get(profile.id)
+    return invalidated_at is not None and invalidated_at >= profile.loaded_at
@@ -1,5 +1,5 @@
 from stickerfinder.models.chat import Chat, chat_sticker_set
-from stickerfinder.models.sticker import Sticker, sticker_tag
+from stickerfinder.models.sticker import Sticker, sticker_original_emoji, sticker_tag
 from stickerfinder.models.task import Task
 from stickerfinder.models.sticker_set import StickerSet
 from stickerfinder.models.tag import Tag
@@ -14,3 +14,4 @@ from stickerfinder.models.inline_query import InlineQuery
 from stickerfinder.models.inline_query_request import InlineQueryRequest
 from stickerfinder.models.sticker_usages import StickerUsage
 from stickerfinder.models.proposed_tags import ProposedTags
+from stickerfinder.models.sticker_search_doc import StickerSearchDoc
@@ -37,7 +37,8 @@ class InlineQuery(base):
     def __init__(self, query, user):
         """Create a new change."""
         self.query = query
-        self.user = user
+        # The user might be a cached profile instead of a model instance.
+        self.user_id = user.id
         self.bot = config["telegram"]["bot_name"]
 
     def __repr__(self):
@@ -18,6 +18,8 @@ class InlineQueryRequest(base):
     next_offset = Column(String)
     duration = Column(Interval)
     fuzzy = Column(Boolean, default=False)
+    # The search has been cut short, since it would have exceeded its deadline
+    truncated = Column(Boolean, default=False)
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
 
     inline_query_id = Column(
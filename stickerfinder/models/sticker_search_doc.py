@@ -0,0 +1,158 @@
+"""The sqlite model for a sticker search document."""
+
+from sqlalchemy import Column, ForeignKey, Index, func
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.types import BigInteger, Boolean, DateTime, String
+
+from stickerfinder.db import base
+
+
+class StickerSearchDoc(base):
+    """Denormalized search document of a single sticker.
+
+    There's one document per non-banned sticker, which contains everything
+    that's needed for inline search. This way the search queries don't need to join
+    stickers, sticker sets and tags on every request.
+
+    The documents are updated by the logic that changes stickers, tags and sets.
+    """
+
+    __tablename__ = "sticker_search_doc"
+    __table_args__ = (
+        Index("sticker_search_doc_tags_idx", "tags", postgresql_using="gin"),
+        Index(
+            "sticker_search_doc_international_tags_idx",
+            "international_tags",
+            postgresql_using="gin",
+        ),
+        Index(
+            "sticker_search_doc_text_idx",
+            "text",
+            postgresql_using="gin",
+            postgresql_ops={"text": "gin_trgm_ops"},
+        ),
+    )
+
+    file_unique_id = Column(
+        String,
+        ForeignKey(
+            "sticker.file_unique_id",
+            ondelete="cascade",
+            onupdate="cascade",
+            deferrable=True,
+        ),
+        primary_key=True,
+    )
+    sticker_id = Column(BigInteger, nullable=False, unique=True)
+    file_id = Column(String, nullable=False)
+    text = Column(String)
+    animated = Column(Boolean, default=False, nullable=False)
+
+    # Tags in default language (including emojis) and international tags
+    tags = Column(ARRAY(String), default=[], nullable=False)
+    international_tags = Column(ARRAY(String), default=[], nullable=False)
+
+    # Sticker set data
+    set_name = Column(
+        String,
+        ForeignKey(
+            "sticker_set.name",
+            ondelete="cascade",
+            onupdate="cascade",
+            deferrable=True,
+        ),
+        index=True,
+        nullable=False,
+    )
+    set_title = Column(String)
+    banned = Column(Boolean, default=False, nullable=False)
+    nsfw = Column(Boolean, default=False, nullable=False)
+    furry = Column(Boolean, default=False, nullable=False)
+    international = Column(Boolean, default=False, nullable=False)
+    deluxe = Column(Boolean, default=False, nullable=False)
+    reviewed = Column(Boolean, default=False, nullable=False)
+    deleted = Column(Boolean, default=False, nullable=False)
+
+    updated_at = Column(
+        DateTime, server_default=func.now(), onupdate=func.now(), nullable=False
+    )
+
+    def __init__(self, sticker):
+        """Create a new search document from a sticker."""
+        self.file_unique_id = sticker.file_unique_id
+        self.update_from_sticker(sticker)
+
+    def __repr__(self):
+        """Print as string."""
+        return f"StickerSearchDoc: {self.file_unique_id}, set: {self.set_name}"
+
+    def update_from_sticker(self, sticker):
+        """Copy all searchable data from the sticker and its set."""
+        self.sticker_id = sticker.id
+        self.file_id = sticker.file_id
+        self.text = sticker.text
+        self.animated = sticker.animated
+
+        self.tags = sorted(tag.name for tag in sticker.tags if not tag.international)
+        self.international_tags = sorted(
+            tag.name for tag in sticker.tags if tag.international
+        )
+
+        sticker_set = sticker.sticker_set
+        self.set_name = sticker_set.name
+        self.set_title = sticker_set.title
+        self.update_set_flags(sticker_set)
+
+    def update_set_flags(self, sticker_set):
+        """Copy the flags of the sticker set."""
+        for key, value in get_set_flags(sticker_set).items():
+            setattr(self, key, value)
+
+    @staticmethod
+    def move_tag(session, name, international):
+        """Move a tag into the tag array of its new language."""
+        if international:
+            source, target = "tags", "international_tags"
+        else:
+            source, target = "international_tags", "tags"
+
+        source = getattr(StickerSearchDoc, source)
+        target = getattr(StickerSearchDoc, target)
+        session.query(StickerSearchDoc).filter(source.any(name)).update(
+            {
+                source: func.array_remove(source, name),
+                target: func.array_append(target, name),
+            },
+            synchronize_session=False,
+        )
+
+    @staticmethod
+    def rename_tag(session, old_name, new_name):
+        """Rename a tag in all search documents."""
+        for column in [StickerSearchDoc.tags, StickerSearchDoc.international_tags]:
+            session.query(StickerSearchDoc).filter(column.any(old_name)).update(
+                {column: func.array_replace(column, old_name, new_name)},
+                synchronize_session=False,
+            )
+
+    @staticmethod
+    def remove_tag(session, name):
+        """Remove a tag from all search documents."""
+        for column in [StickerSearchDoc.tags, StickerSearchDoc.international_tags]:
+            session.query(StickerSearchDoc).filter(column.any(name)).update(
+                {column: func.array_remove(column, name)},
+                synchronize_session=False,
+            )
+
+
+def get_set_flags(sticker_set):
+    """Get all sticker set flags that are stored on search documents."""
+    return {
+        "banned": sticker_set.banned,
+        "nsfw": sticker_set.nsfw,
+        "furry": sticker_set.furry,
+        "international": sticker_set.international,
+        "deluxe": sticker_set.deluxe,
+        "reviewed": sticker_set.reviewed,
+        "deleted": sticker_set.deleted,
+    }
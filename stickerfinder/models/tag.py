@@ -6,6 +6,7 @@ from sqlalchemy.types import Boolean, DateTime, String
 
 from stickerfinder.db import base
 from stickerfinder.models.sticker import sticker_tag
+from stickerfinder.models.sticker_search_doc import StickerSearchDoc
 
 
 class Tag(base):
@@ -44,10 +45,12 @@ class Tag(base):
             tag.emoji = True
             if tag.international is True:
                 tag.international = False
+                StickerSearchDoc.move_tag(session, tag.name, False)
 
         # If somebody didn't tag in default language, but the thag should be, fix it.
         if tag and not international and tag.international:
             tag.international = False
+            StickerSearchDoc.move_tag(session, tag.name, False)
 
         if tag is None:
             tag = Tag(name, international, emoji)
@@ -66,8 +66,8 @@ class User(base):
                 if user is None:
                     raise e
 
-        # Allways update the username in case the username changed
-        if tg_user.username is not None:
+        # Update the username in case the username changed
+        if tg_user.username is not None and user.username != tg_user.username.lower():
             user.username = tg_user.username.lower()
 
         return user
@@ -0,0 +1,158 @@
+"""Serve the webhook with multiple pre-forked bot processes.
+
+A single bot process is limited by the GIL, no matter how many worker threads it has.
+In pre-fork mode, the main process only receives the updates of the webhook and
+forwards them to one of several worker processes. Each worker runs its own dispatcher
+and has its own database connection pool.
+
+Updates are distributed by the id of the user, who caused them. That way, all
+updates of a user are handled by the same process and the in-process caches
+of this user stay warm, e.g. the results of running inline queries.
+"""
+
+import json
+import multiprocessing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+from telegram import Bot, Update
+
+from stickerfinder.config import config
+from stickerfinder.db import engine
+from stickerfinder.stickerfinder import init_app
+from stickerfinder.telegram.inline_query.analytics import analytics_buffer
+from stickerfinder.telegram.inline_query.usages import usage_buffer
+
+# The keys of all update types and whether their sender is stored in `from`.
+UPDATE_SENDERS = [
+    ("message", True),
+    ("edited_message", True),
+    ("inline_query", True),
+    ("chosen_inline_result", True),
+    ("callback_query", True),
+    ("my_chat_member", True),
+    ("chat_member", True),
+    ("channel_post", False),
+    ("edited_channel_post", False),
+]
+
+
+def get_update_user_id(update):
+    """Get the id of the user or chat, who caused an update.
+
+    Updates without any sender are all handled by the same worker.
+    """
+    for key, has_sender in UPDATE_SENDERS:
+        payload = update.get(key)
+        if payload is None:
+            continue
+
+        if has_sender and "from" in payload:
+            return payload["from"]["id"]
+        if "chat" in payload:
+            return payload["chat"]["id"]
+
+    return 0
+
+
+def get_worker(update, workers):
+    """Get the index of the worker, which handles an update."""
+    return get_update_user_id(update) % workers
+
+
+def run_worker(index, queue):
+    """Handle all updates of a worker's queue.
+
+    Only the first worker runs the jobs, which should run once for the whole bot.
+    """
+    # The connections of the pool mustn't be shared with the parent process.
+    engine.dispose(close=False)
+
+    updater = init_app(global_jobs=index == 0)
+    dispatcher = updater.dispatcher
+    Thread(target=dispatcher.start, name=f"dispatcher_{index}", daemon=True).start()
+    updater.job_queue.start()
+
+    try:
+        while True:
+            data = queue.get()
+            if data is None:
+                break
+
+            update = Update.de_json(data, updater.bot)
+            updater.update_queue.put(update)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        updater.job_queue.stop()
+        dispatcher.stop()
+        # Forked processes don't run exit handlers.
+        usage_buffer.stop()
+        analytics_buffer.stop()
+
+
+def get_webhook_handler(queues):
+    """Create the request handler, which forwards updates to the worker queues."""
+    path = f"/{config['webhook']['token']}"
+
+    class WebhookHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            """Forward an update to its worker."""
+            if self.path != path:
+                self.send_response(403)
+                self.end_headers()
+                return
+
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                update = json.loads(self.rfile.read(length))
+            except ValueError:
+                self.send_response(400)
+                self.end_headers()
+                return
+
+            queues[get_worker(update, len(queues))].put(update)
+
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            """Don't log every single update."""
+
+    return WebhookHandler
+
+
+def run_prefork():
+    """Fork the workers and serve the webhook until the bot is stopped."""
+    workers = config["webhook"]["workers"]
+    context = multiprocessing.get_context("fork")
+    queues = [context.Queue() for _ in range(workers)]
+    processes = [
+        context.Process(target=run_worker, args=(index, queue), name=f"worker_{index}")
+        for index, queue in enumerate(queues)
+    ]
+    for process in processes:
+        process.start()
+
+    domain = config["webhook"]["domain"]
+    token = config["webhook"]["token"]
+    with open(config["webhook"]["cert_path"], "rb") as certificate:
+        Bot(config["telegram"]["api_key"]).set_webhook(
+            url=f"{domain}{token}",
+            certificate=certificate,
+        )
+
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", config["webhook"]["port"]),
+        get_webhook_handler(queues),
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        for queue in queues:
+            queue.put(None)
+        for process in processes:
+            process.join()
@@ -9,6 +9,7 @@ from telegram.error import BadRequest, ChatMigrated, RetryAfter, TimedOut, Unaut
 from stickerfinder.config import config
 from stickerfinder.db import get_session
 from stickerfinder.i18n import i18n
+from stickerfinder.logic.user import get_user_profile
 from stickerfinder.models import Chat, User
 from stickerfinder.sentry import sentry
 
@@ -41,12 +42,9 @@ def inline_query_wrapper(func):
     def wrapper(update, context):
         session = get_session()
         try:
-            user = User.get_or_create(session, update.inline_query.from_user)
+            user = get_user_profile(session, update.inline_query.from_user)
 
-            if user.banned:
-                return
-
-            if config["mode"]["private_inline_query"] and not user.authorized:
+            if not may_use_inline_search(user):
                 return
 
             func(context, update, session, user)
@@ -65,6 +63,17 @@ def inline_query_wrapper(func):
     return wrapper
 
 
+def may_use_inline_search(user):
+    """Check whether a user is allowed to use inline search."""
+    if user.banned:
+        return False
+
+    if config["mode"]["private_inline_query"] and not user.authorized:
+        return False
+
+    return True
+
+
 def callback_query_wrapper(func):
     """Create a session, handle permissions and exceptions."""
 
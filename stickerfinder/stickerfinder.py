@@ -39,13 +39,17 @@ from stickerfinder.telegram.commands import (
     unban_user,
 )
 from stickerfinder.telegram.inline_query import search
+from stickerfinder.telegram.inline_query.analytics import analytics_buffer
+from stickerfinder.telegram.inline_query.async_search import async_inline_search
 from stickerfinder.telegram.inline_query.result import handle_chosen_inline_result
+from stickerfinder.telegram.inline_query.usages import usage_buffer
 from stickerfinder.telegram.jobs import (
     cleanup_job,
     distribute_tasks_job,
     free_cache,
     maintenance_job,
     newsfeed_job,
+    refresh_search_index_job,
     scan_sticker_sets_job,
 )
 from stickerfinder.telegram.message_handlers import (
@@ -61,11 +65,14 @@ logging.basicConfig(
 )
 
 
-def init_app():
+def init_app(global_jobs=True):
     """Build the telegram updater.
 
     This function registers all update handlers on the updater.
     It furthermore registers jobs background in the apscheduler library.
+
+    If multiple processes serve the bot, only one of them should run the `global_jobs`.
+    Jobs that maintain in-process caches and indices are registered in all processes.
     """
 
     # Initialize telegram updater and dispatcher
@@ -77,8 +84,17 @@ def init_app():
     )
     dispatcher = updater.dispatcher
 
+    if config["mode"]["buffered_analytics"]:
+        analytics_buffer.start()
+    if config["mode"]["batched_usages"]:
+        usage_buffer.start()
+
     # Create inline query handler
-    updater.dispatcher.add_handler(InlineQueryHandler(search, run_async=True))
+    if config["mode"]["async_inline_search"]:
+        async_inline_search.start()
+        updater.dispatcher.add_handler(InlineQueryHandler(async_inline_search.handle))
+    else:
+        updater.dispatcher.add_handler(InlineQueryHandler(search, run_async=True))
 
     # Create group message handler
     dispatcher.add_handler(
@@ -153,36 +169,23 @@ def init_app():
 
     # Regular tasks
     minute = 60
-    hour = minute * 60
     job_queue = updater.job_queue
 
-    # Disable the newsfeed/review task if auto accept is on
-    if not config["mode"]["auto_accept_set"]:
+    if global_jobs:
+        register_global_jobs(job_queue)
+
+    if (
+        config["mode"]["search_engine"] == "memory"
+        or config["mode"]["similar_tag_engine"] == "memory"
+        or config["mode"]["emoji_index"]
+    ):
         job_queue.run_repeating(
-            newsfeed_job, interval=5 * minute, first=0, name="Process newsfeed"
+            refresh_search_index_job,
+            interval=config["mode"]["search_index_refresh_minutes"] * minute,
+            first=0,
+            name="Rebuild the in-memory search indices",
         )
 
-    job_queue.run_repeating(
-        maintenance_job,
-        interval=2 * hour,
-        first=0,
-        name="Create new maintenance tasks",
-    )
-    job_queue.run_repeating(
-        scan_sticker_sets_job, interval=10, first=0, name="Scan new sticker sets"
-    )
-    job_queue.run_repeating(
-        distribute_tasks_job,
-        interval=minute,
-        first=2 * minute,
-        name="Distribute new tasks",
-    )
-    job_queue.run_repeating(
-        cleanup_job,
-        interval=2 * hour,
-        first=0,
-        name="Perform some database cleanup tasks",
-    )
     job_queue.run_repeating(
         free_cache,
         interval=20 * minute,
@@ -216,3 +219,37 @@ def init_app():
     )
 
     return updater
+
+
+def register_global_jobs(job_queue):
+    """Register all jobs, which should only run once for the whole bot."""
+    minute = 60
+    hour = minute * 60
+
+    # Disable the newsfeed/review task if auto accept is on
+    if not config["mode"]["auto_accept_set"]:
+        job_queue.run_repeating(
+            newsfeed_job, interval=5 * minute, first=0, name="Process newsfeed"
+        )
+
+    job_queue.run_repeating(
+        maintenance_job,
+        interval=2 * hour,
+        first=0,
+        name="Create new maintenance tasks",
+    )
+    job_queue.run_repeating(
+        scan_sticker_sets_job, interval=10, first=0, name="Scan new sticker sets"
+    )
+    job_queue.run_repeating(
+        distribute_tasks_job,
+        interval=minute,
+        first=2 * minute,
+        name="Distribute new tasks",
+    )
+    job_queue.run_repeating(
+        cleanup_job,
+        interval=2 * hour,
+        first=0,
+        name="Perform some database cleanup tasks",
+    )
@@ -2,6 +2,13 @@ from datetime import datetime, timedelta
 
 from sqlalchemy import distinct
 
+from stickerfinder.caches import (
+    favorite_cache,
+    shared_result_cache,
+    tag_expansion_cache,
+    usage_cache,
+    user_profile_cache,
+)
 from stickerfinder.helper.plot import send_plots
 from stickerfinder.logic.cleanup import full_cleanup
 from stickerfinder.logic.sticker_set import refresh_stickers
@@ -13,6 +20,10 @@ from stickerfinder.models import (
     User,
     sticker_tag,
 )
+from stickerfinder.telegram.inline_query.cache import (
+    inline_query_cache,
+    sticker_files,
+)
 from stickerfinder.telegram.keyboard import get_main_keyboard
 
 
@@ -183,5 +194,13 @@ Sticker sets:
 
 Total queries : {total_queries_count}
     => last day: {last_day_queries_count}
+
+Caches:
+    => tag expansions: {tag_expansion_cache.get_stats()}
+    => shared results: {shared_result_cache.get_stats()}
+    => user profiles: {user_profile_cache.get_stats()}
+    => sticker usages: {usage_cache.get_stats()}
+    => favorites: {favorite_cache.get_stats()}
+    => inline queries: {inline_query_cache.get_stats()}, {len(sticker_files)} sticker files
 """
     context.message.edit_text(stats, reply_markup=get_main_keyboard(context.user))
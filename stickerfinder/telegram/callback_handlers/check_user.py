@@ -5,6 +5,7 @@ from stickerfinder.logic.maintenance import (
     revert_user_changes,
     undo_user_changes_revert,
 )
+from stickerfinder.logic.user import invalidate_user_profile
 from stickerfinder.models import Task
 from stickerfinder.telegram.keyboard import check_user_tags_keyboard, get_main_keyboard
 
@@ -15,9 +16,13 @@ def handle_check_user(session, context):
     # Ban the user
     if CallbackResult(context.action).name == "ban":
         task.user.banned = True
+        session.commit()
+        invalidate_user_profile(task.user.id)
         context.query.answer("User banned")
     elif CallbackResult(context.action).name == "unban":
         task.user.banned = False
+        session.commit()
+        invalidate_user_profile(task.user.id)
         context.query.answer("User ban reverted")
         message = "Your ban has been lifted."
         context.bot.send_message(
@@ -1,4 +1,5 @@
 from stickerfinder.logic.maintenance import distribute_newsfeed_tasks
+from stickerfinder.logic.search_doc import update_search_docs_of_set
 from stickerfinder.models import StickerSet, Task
 from stickerfinder.telegram.keyboard import (
     get_nsfw_ban_keyboard,
@@ -10,6 +11,7 @@ def handle_ban_set(session, context):
     """Handle the ban button in newsfeed chats."""
     sticker_set = session.query(StickerSet).get(context.payload.lower())
     sticker_set.banned = not sticker_set.banned
+    update_search_docs_of_set(session, sticker_set)
 
     keyboard = get_nsfw_ban_keyboard(sticker_set)
     context.query.message.edit_reply_markup(reply_markup=keyboard)
@@ -19,6 +21,7 @@ def handle_nsfw_set(session, context):
     """Handle the nsfw button in newsfeed chats."""
     sticker_set = session.query(StickerSet).get(context.payload.lower())
     sticker_set.nsfw = not sticker_set.nsfw
+    update_search_docs_of_set(session, sticker_set)
 
     keyboard = get_nsfw_ban_keyboard(sticker_set)
     context.query.message.edit_reply_markup(reply_markup=keyboard)
@@ -28,6 +31,7 @@ def handle_fur_set(session, context):
     """Handle the fur button in newsfeed chats."""
     sticker_set = session.query(StickerSet).get(context.payload.lower())
     sticker_set.furry = not sticker_set.furry
+    update_search_docs_of_set(session, sticker_set)
 
     keyboard = get_nsfw_ban_keyboard(sticker_set)
     context.query.message.edit_reply_markup(reply_markup=keyboard)
@@ -37,6 +41,7 @@ def handle_deluxe_set(session, context):
     """Handle the deluxe button in newsfeed chats."""
     sticker_set = session.query(StickerSet).get(context.payload)
     sticker_set.deluxe = not sticker_set.deluxe
+    update_search_docs_of_set(session, sticker_set)
 
     keyboard = get_nsfw_ban_keyboard(sticker_set)
     context.query.message.edit_reply_markup(reply_markup=keyboard)
@@ -46,6 +51,7 @@ def handle_change_set_language(session, context):
     """Handle the change language button in newsfeed chats."""
     sticker_set = session.query(StickerSet).get(context.payload.lower())
     sticker_set.international = not sticker_set.international
+    update_search_docs_of_set(session, sticker_set)
 
     keyboard = get_nsfw_ban_keyboard(sticker_set)
     context.query.message.edit_reply_markup(reply_markup=keyboard)
@@ -64,6 +70,7 @@ def handle_next_newsfeed_set(session, context):
 
     task.reviewed = True
     sticker_set.reviewed = True
+    update_search_docs_of_set(session, sticker_set)
 
     try:
         task_chat = task.processing_chat[0]
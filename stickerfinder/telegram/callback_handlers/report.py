@@ -1,5 +1,6 @@
 from stickerfinder.helper.callback import CallbackResult
 from stickerfinder.logic.maintenance import check_maintenance_chat
+from stickerfinder.logic.search_doc import update_search_docs_of_set
 from stickerfinder.models import Task
 from stickerfinder.telegram.keyboard import get_report_keyboard
 
@@ -14,6 +15,7 @@ def handle_report_ban(session, context):
         task.sticker_set.banned = False
         context.query.answer("Set no longer tagged as nsfw")
 
+    update_search_docs_of_set(session, task.sticker_set)
     session.commit()
 
     keyboard = get_report_keyboard(task)
@@ -30,6 +32,7 @@ def handle_report_nsfw(session, context):
         task.sticker_set.nsfw = False
         context.query.answer("Set unbanned")
 
+    update_search_docs_of_set(session, task.sticker_set)
     session.commit()
 
     keyboard = get_report_keyboard(task)
@@ -46,6 +49,7 @@ def handle_report_furry(session, context):
         task.sticker_set.furry = False
         context.query.answer("Set tagged as furry")
 
+    update_search_docs_of_set(session, task.sticker_set)
     session.commit()
 
     keyboard = get_report_keyboard(task)
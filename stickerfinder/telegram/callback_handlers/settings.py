@@ -1,4 +1,6 @@
 from stickerfinder.helper.display import get_settings_text
+from stickerfinder.logic.usage import invalidate_usages
+from stickerfinder.logic.user import invalidate_user_profile
 from stickerfinder.models import InlineQuery, StickerUsage
 from stickerfinder.telegram.keyboard import (
     get_settings_keyboard,
@@ -33,6 +35,8 @@ def delete_history(session, context):
     session.query(InlineQuery).filter(InlineQuery.user_id == context.user.id).delete(
         synchronize_session=False
     )
+    session.commit()
+    invalidate_usages(context.user.id)
 
     update_settings(context)
 
@@ -52,6 +56,7 @@ def user_toggle_international(session, context):
     user = context.user
     user.international = not user.international
     session.commit()
+    invalidate_user_profile(user.id)
     update_settings(context)
 
 
@@ -60,6 +65,7 @@ def user_toggle_deluxe(session, context):
     user = context.user
     user.deluxe = not user.deluxe
     session.commit()
+    invalidate_user_profile(user.id)
     update_settings(context)
 
 
@@ -68,6 +74,7 @@ def user_toggle_nsfw(session, context):
     user = context.user
     user.nsfw = not user.nsfw
     session.commit()
+    invalidate_user_profile(user.id)
     update_settings(context)
 
 
@@ -76,4 +83,5 @@ def user_toggle_furry(session, context):
     user = context.user
     user.furry = not user.furry
     session.commit()
+    invalidate_user_profile(user.id)
     update_settings(context)
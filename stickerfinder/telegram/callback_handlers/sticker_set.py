@@ -1,4 +1,5 @@
 from stickerfinder.helper.callback import CallbackResult
+from stickerfinder.logic.search_doc import update_search_docs_of_set
 from stickerfinder.models import StickerSet
 from stickerfinder.telegram.keyboard import get_tag_this_set_keyboard
 
@@ -10,6 +11,7 @@ def handle_deluxe_set_user_chat(session, context):
         sticker_set.deluxe = True
     elif CallbackResult(context.action).name == "ban":
         sticker_set.deluxe = False
+    update_search_docs_of_set(session, sticker_set)
 
     keyboard = get_tag_this_set_keyboard(sticker_set, context.user)
     context.query.message.edit_reply_markup(reply_markup=keyboard)
@@ -8,6 +8,8 @@ from telegram import ReplyKeyboardRemove
 from telegram.error import BadRequest, TelegramError, Unauthorized
 
 from stickerfinder.config import config
+from stickerfinder.logic.search_doc import update_search_doc, update_search_docs_of_set
+from stickerfinder.logic.user import invalidate_user_profile
 from stickerfinder.models import StickerSet, User
 from stickerfinder.session import message_wrapper
 
@@ -26,6 +28,8 @@ def ban_user(bot, update, session, chat, user):
         return "Unknown username"
 
     user_to_ban.banned = True
+    session.commit()
+    invalidate_user_profile(user_to_ban.id)
     return f"User {name_to_ban} banned"
 
 
@@ -47,6 +51,8 @@ def unban_user(bot, update, session, chat, user):
         return "Unknown username"
 
     user_to_unban.banned = False
+    session.commit()
+    invalidate_user_profile(user_to_unban.id)
     return f"User {name_to_unban} unbanned"
 
 
@@ -65,6 +71,7 @@ def authorize_user(bot, update, session, chat, user):
 
     user.authorized = True
     session.commit()
+    invalidate_user_profile(user.id)
     return f"User {identifier} authorized"
 
 
@@ -87,6 +94,8 @@ def make_admin(bot, update, session, chat, user):
         return "No known user with this name or id."
 
     admin.admin = True
+    session.commit()
+    invalidate_user_profile(admin.id)
     return "User is now admin"
 
 
@@ -209,6 +218,7 @@ def fix_stuff(bot, update, session, chat, user):
                     and sticker_set.tasks[0].type == "scan_set"
                 ):
                     sticker_set.tasks[0].reviewed = True
+                update_search_docs_of_set(session, sticker_set)
                 continue
 
             raise e
@@ -246,6 +256,7 @@ def ban_sticker(bot, update, session, chat, user):
     """Broadcast a message to all users."""
     chat.current_sticker.banned = True
     chat.current_sticker.tags = []
+    update_search_doc(session, chat.current_sticker)
 
     return "Sticker banned."
 
@@ -254,5 +265,6 @@ def ban_sticker(bot, update, session, chat, user):
 def unban_sticker(bot, update, session, chat, user):
     """Broadcast a message to all users."""
     chat.current_sticker.banned = True
+    update_search_doc(session, chat.current_sticker)
 
     return "Sticker unbanned."
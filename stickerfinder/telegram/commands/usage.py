@@ -1,5 +1,6 @@
 """Sticker usage related commands."""
 
+from stickerfinder.logic.usage import invalidate_usages
 from stickerfinder.models import Sticker, StickerUsage
 from stickerfinder.session import message_wrapper
 
@@ -25,5 +26,7 @@ def forget_set(bot, update, session, chat, user):
     session.query(StickerUsage).filter(
         StickerUsage.sticker_file_unique_id.in_(usage_file_unique_ids)
     ).filter(StickerUsage.user == user).delete(synchronize_session=False)
+    session.commit()
+    invalidate_usages(user.id)
 
     return "I forgot all of your usages of this set's sticker."
@@ -1,10 +1,13 @@
 """Inline query handler function."""
 from sqlalchemy.exc import IntegrityError
 
+from stickerfinder.config import config
 from stickerfinder.models import InlineQuery, InlineQueryRequest
 from stickerfinder.session import inline_query_wrapper
 
+from .analytics import analytics_buffer
 from .context import Context
+from .offset import strip_cursor
 from .search import search_sticker_sets, search_stickers
 
 
@@ -24,7 +27,34 @@ def search(tg_context, update, session, user):
         update.inline_query.answer([], cache_time=0)
         return
 
+    handle_inline_query(tg_context, update, session, user)
+
+
+def handle_inline_query(tg_context, update, session, user, deferred=False):
+    """Search and answer an inline query.
+
+    The answer of `deferred` searches is only remembered on the returned context.
+    """
+    offset_payload = update.inline_query.offset
     context = Context(tg_context, update.inline_query.query, offset_payload, user)
+    context.deferred = deferred
+
+    saved_offset = 0
+    if context.offset != 0 or context.fuzzy_offset is not None:
+        saved_offset = strip_cursor(offset_payload).split(":", 1)[1]
+
+    if config["mode"]["buffered_analytics"]:
+        inline_query_request = analytics_buffer.add_request(
+            session, context, saved_offset
+        )
+        # The same offset has already been requested, see below.
+        if inline_query_request is None:
+            return context
+
+        search_inline_query(session, update, context, inline_query_request)
+        analytics_buffer.submit(inline_query_request)
+
+        return context
 
     # Create a new inline query or get an existing one, if we aren't on the first request
     inline_query = InlineQuery.get_or_create(
@@ -37,10 +67,6 @@ def search(tg_context, update, session, user):
 
     # Save this specific InlineQueryRequest
     try:
-        saved_offset = 0
-        if context.offset != 0 or context.fuzzy_offset is not None:
-            saved_offset = offset_payload.split(":", 1)[1]
-
         inline_query_request = InlineQueryRequest(inline_query, saved_offset)
         session.add(inline_query_request)
         session.commit()
@@ -53,8 +79,15 @@ def search(tg_context, update, session, user):
         # above just happened and just don't answer.
         # This prevents duplicate sticker suggestions due to slow internet connections.
         session.rollback()
-        return
+        return context
+
+    search_inline_query(session, update, context, inline_query_request)
+
+    return context
+
 
+def search_inline_query(session, update, context, inline_query_request):
+    """Run the search of the inline query's mode."""
     if context.mode == Context.STICKER_SET_MODE:
         # Remove keyword tags to prevent wrong results
         search_sticker_sets(session, update, context, inline_query_request)
@@ -0,0 +1,220 @@
+"""Write-behind buffer for the analytics of inline queries.
+
+Every inline query request is stored as an `InlineQueryRequest` and every new search
+as an `InlineQuery`. Writing these rows used to take several round trips to the
+database, before the search even started.
+
+Instead, the rows are buffered in memory and inserted in batches by a background thread.
+The ids of new inline queries are still needed for the offsets of the answer, which
+is why they're reserved from the database sequence in blocks.
+
+Telegram clients sometimes fire requests with the same offset twice. Those used to be
+detected by a unique constraint, which is now done by remembering the recent offsets.
+
+If a batch fails, its rows are inserted one by one and only the failing rows are lost.
+Lost rows are logged and counted in `dropped_rows`.
+Requests of inline queries, which couldn't be inserted, are dropped as well.
+Otherwise they would fail on the foreign key and break all following batches.
+"""
+
+import logging
+import traceback
+from collections import OrderedDict, deque
+from datetime import datetime
+from threading import Lock
+from types import SimpleNamespace
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+
+from stickerfinder.config import config
+from stickerfinder.db import get_session
+from stickerfinder.helper.write_behind import WriteBehindBuffer
+from stickerfinder.models import InlineQuery, InlineQueryRequest
+from stickerfinder.sentry import sentry
+
+from .context import Context
+
+
+class AnalyticsBuffer(WriteBehindBuffer):
+    """Buffer of inline query analytics, which are flushed in batches."""
+
+    def __init__(self):
+        """Create a new empty buffer."""
+        super().__init__("analytics", "analytics_flush_seconds")
+        self.id_lock = Lock()
+
+        self.ids = deque()
+        self.offsets = OrderedDict()
+        self.lost_ids = OrderedDict()
+        self.inline_queries = []
+        self.requests = []
+        # The number of rows, which have been lost in failed batches.
+        self.dropped_rows = 0
+
+    def add_request(self, session, context, offset):
+        """Create the analytics of a new inline query request.
+
+        A new inline query gets an id, which is set on the context.
+        Returns `None`, if a request with the same offset has already been made.
+        """
+        inline_query = None
+        if context.inline_query_id is None:
+            inline_query = {
+                "id": self.get_inline_query_id(session),
+                "query": context.query,
+                "mode": InlineQuery.STICKER_MODE,
+                "user_id": context.user.id,
+                "created_at": datetime.now(),
+            }
+            if context.mode == Context.STICKER_SET_MODE:
+                inline_query["mode"] = InlineQuery.SET_MODE
+            context.inline_query_id = inline_query["id"]
+
+        key = (context.inline_query_id, str(offset))
+        with self.lock:
+            if key in self.offsets:
+                return None
+
+            self.offsets[key] = True
+            while len(self.offsets) > config["mode"]["analytics_offsets_size"]:
+                self.offsets.popitem(last=False)
+
+        return SimpleNamespace(
+            inline_query=inline_query,
+            inline_query_id=context.inline_query_id,
+            offset=str(offset),
+            next_offset=None,
+            duration=None,
+            fuzzy=False,
+            truncated=False,
+            created_at=datetime.now(),
+        )
+
+    def submit(self, request):
+        """Add a finished request to the buffer."""
+        row = vars(request).copy()
+        inline_query = row.pop("inline_query")
+
+        with self.lock:
+            if inline_query is not None:
+                self.inline_queries.append(inline_query)
+            self.requests.append(row)
+
+            batch_full = len(self.requests) >= config["mode"]["analytics_batch_size"]
+
+        if batch_full:
+            self.wakeup.set()
+
+    def get_inline_query_id(self, session):
+        """Get an id for a new inline query.
+
+        The ids are reserved from the sequence of the inline query table in blocks.
+        """
+        with self.id_lock:
+            if len(self.ids) == 0:
+                sequence = func.pg_get_serial_sequence("inline_query", "id")
+                ids = session.execute(
+                    select(func.nextval(sequence)).select_from(
+                        func.generate_series(1, config["mode"]["analytics_batch_size"])
+                    )
+                ).scalars()
+                self.ids.extend(ids)
+
+            return self.ids.popleft()
+
+    def flush(self):
+        """Insert all buffered rows.
+
+        Flushes are serialized, since requests may reference the inline query
+        of a previous batch. The rows of a failed batch are inserted one by one.
+        Duplicate requests of other processes are still caught by the unique constraint.
+        """
+        with self.flush_lock:
+            with self.lock:
+                inline_queries, self.inline_queries = self.inline_queries, []
+                requests, self.requests = self.requests, []
+
+            # Drop the requests of inline queries, which have been lost in previous batches
+            request_count = len(requests)
+            requests = [
+                request
+                for request in requests
+                if request["inline_query_id"] not in self.lost_ids
+            ]
+            self.dropped_rows += request_count - len(requests)
+            if len(inline_queries) == 0 and len(requests) == 0:
+                return
+
+            session = get_session()
+            try:
+                if len(inline_queries) > 0:
+                    session.execute(insert(InlineQuery.__table__), inline_queries)
+                if len(requests) > 0:
+                    session.execute(
+                        insert(InlineQueryRequest.__table__).on_conflict_do_nothing(),
+                        requests,
+                    )
+                session.commit()
+            except Exception:
+                session.rollback()
+                traceback.print_exc()
+                sentry.capture_exception(tags={"handler": "analytics"})
+
+                self.insert_rows(session, inline_queries, requests)
+            finally:
+                session.close()
+
+    def insert_rows(self, session, inline_queries, requests):
+        """Insert the rows of a failed batch one by one.
+
+        Each row gets its own savepoint, so only the failing rows are lost.
+        The ids of lost inline queries are remembered, to drop their later requests.
+        """
+        try:
+            for inline_query in inline_queries:
+                try:
+                    with session.begin_nested():
+                        session.execute(insert(InlineQuery.__table__), [inline_query])
+                except Exception:
+                    self.lost_ids[inline_query["id"]] = True
+                    self.drop_row(f"inline query {inline_query['id']}")
+
+            while len(self.lost_ids) > config["mode"]["analytics_offsets_size"]:
+                self.lost_ids.popitem(last=False)
+
+            for request in requests:
+                if request["inline_query_id"] in self.lost_ids:
+                    self.dropped_rows += 1
+                    continue
+
+                try:
+                    with session.begin_nested():
+                        session.execute(
+                            insert(
+                                InlineQueryRequest.__table__
+                            ).on_conflict_do_nothing(),
+                            [request],
+                        )
+                except Exception:
+                    self.drop_row(
+                        f"request of inline query {request['inline_query_id']} "
+                        f"with offset {request['offset']}"
+                    )
+
+            session.commit()
+        except Exception:
+            session.rollback()
+            traceback.print_exc()
+            sentry.capture_exception(tags={"handler": "analytics"})
+
+    def drop_row(self, row):
+        """Log and count a row, which couldn't be inserted."""
+        self.dropped_rows += 1
+        logging.getLogger().exception(
+            f"Dropped {row} of a failed analytics batch. "
+            f"{self.dropped_rows} rows have been dropped so far."
+        )
+
+
+analytics_buffer = AnalyticsBuffer()
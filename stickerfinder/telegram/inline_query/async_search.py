@@ -0,0 +1,119 @@
+"""Asyncio pipeline for inline queries.
+
+The default inline query handler occupies one of PTB's worker threads and a blocking
+database connection for the whole request, including the answer to telegram.
+This limits the amount of concurrent inline queries to the amount of worker threads.
+
+In async mode, the handler only hands the inline query over to an event loop, which
+runs in its own thread. The search itself is the same as in the synchronous handler,
+but its session runs on an asyncpg connection. Whenever a statement is executed, the
+search yields to the event loop, so thousands of queries can be in flight at once.
+The CPU-bound ranking in the in-memory indices is handed to the loop's thread pool,
+see `offload.py`. Only the database I/O runs in the event loop's thread.
+
+The answer is sent after the database connection has been released.
+PTB's bot is synchronous, which is why answers are sent from the loop's thread pool.
+
+The asyncpg driver is an optional dependency, which is only needed in async mode.
+"""
+
+import asyncio
+import traceback
+from threading import Thread
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from stickerfinder.config import config
+from stickerfinder.logic.user import get_user_profile
+from stickerfinder.sentry import sentry
+from stickerfinder.session import (
+    ignore_exception,
+    may_use_inline_search,
+    should_report_exception,
+)
+
+from . import handle_inline_query
+
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+
+def run_search(session, update, tg_context):
+    """Search an inline query on the synchronous facade of an async session.
+
+    Returns the context with the deferred answer or `None`, if there's nothing to answer.
+    """
+    user = get_user_profile(session, update.inline_query.from_user)
+    if not may_use_inline_search(user):
+        return None
+
+    context = handle_inline_query(tg_context, update, session, user, deferred=True)
+    session.commit()
+
+    return context
+
+
+class AsyncInlineSearch:
+    """Event loop and database engine of the async inline query pipeline."""
+
+    def __init__(self):
+        """Create a new pipeline, which still needs to be started."""
+        self.loop = None
+        self.engine = None
+
+    def start(self):
+        """Start the event loop in a background thread."""
+        if asyncpg is None:
+            raise RuntimeError(
+                "The async inline search needs the asyncpg package. "
+                "Install it with `poetry install --extras async`."
+            )
+
+        url = make_url(config["database"]["sql_uri"]).set(
+            drivername="postgresql+asyncpg"
+        )
+        self.engine = create_async_engine(
+            url,
+            pool_size=config["database"]["connection_count"],
+            max_overflow=config["database"]["overflow_count"],
+        )
+
+        self.loop = asyncio.new_event_loop()
+        Thread(target=self.loop.run_forever, name="inline_search", daemon=True).start()
+
+    def handle(self, update, tg_context):
+        """Hand an inline query over to the event loop.
+
+        This is the callback of the inline query handler and returns immediately.
+        """
+        asyncio.run_coroutine_threadsafe(self.search(update, tg_context), self.loop)
+
+    async def search(self, update, tg_context):
+        """Search and answer an inline query."""
+        try:
+            # If the offset is 'done' there are no more stickers for this query.
+            if update.inline_query.offset == "done":
+                await asyncio.to_thread(update.inline_query.answer, [], cache_time=0)
+                return
+
+            async with AsyncSession(self.engine) as session:
+                context = await session.run_sync(run_search, update, tg_context)
+
+            if context is None or context.deferred_answer is None:
+                return
+
+            inline_query, results, kwargs = context.deferred_answer
+            await asyncio.to_thread(inline_query.answer, results, **kwargs)
+
+        # Handle all not telegram relatated exceptions
+        except Exception as e:
+            if not ignore_exception(e):
+                traceback.print_exc()
+                if should_report_exception(tg_context, e):
+                    sentry.capture_exception(tags={"handler": "inline_query"})
+
+
+async_inline_search = AsyncInlineSearch()
@@ -1,27 +1,148 @@
-from datetime import datetime
+"""Cache of the results of running inline queries.
+
+The entries are keyed by inline query id and hold the results of all
+pages that have been fetched so far.
+The cache is bounded by the amount of entries and their estimated memory footprint.
+Entries expire after a fixed time, since users rarely scroll through results for long.
+
+By default, the entries are kept in the memory of the bot process. If multiple bot
+processes serve the same bot, the following page of an inline query may reach
+another process. In this case, the `sqlite` backend shares all entries between the
+processes on a host. Both backends provide `get`, `put`, `update`, `pop` and `expire`.
+"""
+
+import pickle
+import time
+from types import SimpleNamespace
+
+from stickerfinder.config import config
+from stickerfinder.helper.lru_cache import LRUCache
+from stickerfinder.helper.sqlite_cache import SQLiteCache
+
+from .compact import CachedResults, StickerFiles
+
+
+def get_entry_size(cache):
+    """Estimate the memory footprint of a cache entry in bytes.
+
+    Each cached sticker consists of its id and score in the result arrays.
+    The file ids are part of the shared `sticker_files` table.
+    """
+    return (
+        1000
+        + (len(cache["strict"]) + len(cache["fuzzy"])) * 16
+        + len(cache["sets"]) * 400
+    )
+
+
+# The file ids of all stickers in cached results
+sticker_files = StickerFiles()
+
+
+def dump_entry(cache):
+    """Serialize a cache entry for the shared backend.
+
+    Other processes don't know the file ids of the cached stickers, so they're included.
+    """
+    files = {}
+    for sticker_id in cache["strict"].ids + cache["fuzzy"].ids:
+        row = sticker_files.get(sticker_id)
+        if row is not None:
+            files[sticker_id] = row[:2]
+
+    return pickle.dumps({**cache, "files": files})
+
+
+def load_entry(data):
+    """Deserialize a cache entry and remember the file ids of its stickers."""
+    cache = pickle.loads(data)
+    files = cache.pop("files")
+    sticker_files.add(
+        (sticker_id, file_id, file_unique_id)
+        for sticker_id, (file_id, file_unique_id) in files.items()
+    )
+
+    return cache
+
+
+if config["cache"]["inline_query_backend"] == "sqlite":
+    inline_query_cache = SQLiteCache(
+        config["cache"]["inline_query_sqlite_path"],
+        config["cache"]["inline_query_size"],
+        config["cache"]["inline_query_ttl_minutes"] * 60,
+        max_bytes=config["cache"]["inline_query_max_megabytes"] * 1024 * 1024,
+        dump=dump_entry,
+        load=load_entry,
+    )
+else:
+    inline_query_cache = LRUCache(
+        config["cache"]["inline_query_size"],
+        config["cache"]["inline_query_ttl_minutes"] * 60,
+        max_bytes=config["cache"]["inline_query_max_megabytes"] * 1024 * 1024,
+        size_of=get_entry_size,
+    )
+
+
+def prune_sticker_files():
+    """Remove the file ids of all stickers, which aren't part of any cached results."""
+    before = time.monotonic()
+    sticker_ids = set()
+    if config["cache"]["inline_query_backend"] == "sqlite":
+        # Entries of the shared backend bring their own file ids, whenever they're loaded.
+        # Only keep the file ids of recently loaded entries, which might still be in use.
+        before -= 60
+    else:
+        for cache in inline_query_cache.get_values():
+            sticker_ids.update(cache["strict"].ids)
+            sticker_ids.update(cache["fuzzy"].ids)
+
+    sticker_files.prune(sticker_ids, before)
 
 
 def initialize_cache(context):
-    """Initialize the cache entry for the current inline query."""
-    if "query_cache" not in context.tg_context.bot_data:
-        context.tg_context.bot_data["query_cache"] = {}
+    """Get the cache entry for the current inline query.
 
-    query_id = context.inline_query_id
-    cache = context.tg_context.bot_data["query_cache"]
+    The entry is created, if it doesn't exist yet or has already been evicted.
+    An entry, which has been created by another process in the meantime, is kept.
+    The entry is remembered on the context for the rest of the request, since
+    entries of the shared backend would otherwise be loaded over and over again.
+    """
+    if context.cache_entry is not None:
+        return context.cache_entry
 
-    if query_id not in cache:
-        cache[query_id] = {
-            "strict": [],
-            "strict_unique": [],
+    context.cache_entry = inline_query_cache.setdefault(
+        context.inline_query_id,
+        {
+            "strict": CachedResults(),
             "strict_offset": 0,
-            "fuzzy": [],
+            "strict_base": 0,
+            "strict_complete": False,
+            "fuzzy": CachedResults(),
             "fuzzy_offset": 0,
-            "time": datetime.now(),
-        }
+            "fuzzy_base": 0,
+            "fuzzy_complete": False,
+            "sets": [],
+            "sets_base": 0,
+            "sets_complete": False,
+        },
+    )
+
+    return context.cache_entry
+
+
+def update_cache(context, function):
+    """Update the cache entry of the current inline query and remember the new entry."""
+
+    def update(cache):
+        context.cache_entry = function(cache)
+        return context.cache_entry
+
+    initialize_cache(context)
+    inline_query_cache.update(context.inline_query_id, update)
 
 
 def cache_stickers(context, search_results, fuzzy=False):
-    """Cache stickers in PTB's bot_data dict.
+    """Cache stickers for the following requests of an inline query.
 
     The max amount of results is 50 per inline query response. For expensive fuzzy
     queries, this may result in 2+ seconds per request for each set of 50 stickers.
@@ -31,44 +152,133 @@ def cache_stickers(context, search_results, fuzzy=False):
     This also reduces the amount of work done in the fuzzy query, since the
     strict matching stickers id's can be directly excluded without
     outer-joining the original strict matching query into the fuzzy query.
+
+    Each cached result consists of the sticker id and the score. The file ids of the
+    stickers are stored in the shared `sticker_files` table.
+    The score is needed to create the cursor for the next offset.
+    If the cache entry has been created after the first request (e.g. because it expired),
+    the results don't start at offset 0. That's why we remember the offset of the first result.
     """
-    query_id = context.inline_query_id
-    cache = context.tg_context.bot_data["query_cache"][query_id]
+    update_cache(
+        context, lambda cache: add_stickers(context, cache, search_results, fuzzy)
+    )
+
+
+def add_stickers(context, cache, search_results, fuzzy):
+    """Append search results to a cache entry.
 
+    The results are only appended, if they directly follow the cached results.
+    Otherwise, the same window has already been cached by a prefetch or another process.
+    """
     # Append all search results by inline_query_id and it's current mode (fuzzy/strict).
     if fuzzy:
+        if len(cache["fuzzy"]) == 0:
+            cache["fuzzy_base"] = context.fuzzy_offset
+        elif context.fuzzy_offset != cache["fuzzy_base"] + len(cache["fuzzy"]):
+            return cache
+
+        sticker_files.add(search_results)
         for result in search_results:
-            cache["fuzzy"].append([result[0], result[1]])
+            cache["fuzzy"].append(result[0], float(result[4]))
 
         cache["fuzzy_offset"] += len(search_results)
+        cache["fuzzy_complete"] = (
+            len(search_results) < config["mode"]["inline_cache_size"]
+        )
     else:
+        if len(cache["strict"]) == 0:
+            cache["strict_base"] = context.offset
+        elif context.offset != cache["strict_base"] + len(cache["strict"]):
+            return cache
+
+        sticker_files.add(search_results)
         for result in search_results:
-            cache["strict"].append([result[0], result[1]])
-            # For strict mode, we also save the unique_file_id
-            # This allows for fast exclusion of any
-            cache["strict_unique"].append(result[2])
+            cache["strict"].append(result[0], float(result[4]))
 
         cache["strict_offset"] += len(search_results)
+        cache["strict_complete"] = (
+            len(search_results) < config["mode"]["inline_cache_size"]
+        )
+
+    return cache
 
 
 def get_cached_stickers(context, fuzzy=False):
-    """Return cached search results from a previous inline query request."""
-    query_id = context.inline_query_id
+    """Return cached search results from a previous inline query request.
 
-    cache = context.tg_context.bot_data["query_cache"][query_id]
+    An entry with pruned file ids is dropped, since its results can't be answered
+    completely anymore. A short window would be mistaken for the end of the results.
+    """
+    cache = initialize_cache(context)
 
     if fuzzy:
         results = cache["fuzzy"]
-        offset = context.fuzzy_offset
+        offset = context.fuzzy_offset - cache["fuzzy_base"]
     else:
         results = cache["strict"]
-        offset = context.offset
+        offset = context.offset - cache["strict_base"]
+
+    if offset < 0:
+        return []
+
+    window = results.get_window(offset, 50, sticker_files)
+    if window is None:
+        inline_query_cache.pop(context.inline_query_id)
+        context.cache_entry = None
+        return []
+
+    return window
+
+
+def cache_sticker_sets(context, matching_sets):
+    """Cache the ranked sticker sets of a set search.
+
+    Only the name and title of each set are cached, since the sets are bound
+    to the session of the current request.
+    """
+    update_cache(context, lambda cache: add_sticker_sets(context, cache, matching_sets))
+
+
+def add_sticker_sets(context, cache, matching_sets):
+    """Append ranked sticker sets to a cache entry.
+
+    The sets are only appended, if they directly follow the cached sets.
+    """
+    if len(cache["sets"]) == 0:
+        cache["sets_base"] = context.offset
+    elif context.offset != cache["sets_base"] + len(cache["sets"]):
+        return cache
+
+    for sticker_set, score in matching_sets:
+        cached_set = SimpleNamespace(name=sticker_set.name, title=sticker_set.title)
+        cache["sets"].append([cached_set, score])
+
+    cache["sets_complete"] = (
+        len(matching_sets) < 8 * config["mode"]["inline_set_cache_pages"]
+    )
+
+    return cache
+
+
+def get_cached_sticker_sets(context):
+    """Return the cached sticker sets of the current page.
+
+    Returns `None`, if the page isn't cached yet.
+    """
+    cache = initialize_cache(context)
+
+    offset = context.offset - cache["sets_base"]
+    if offset < 0:
+        return None
+
+    matching_sets = cache["sets"][offset : offset + 8]
+    if len(matching_sets) == 0 and not cache["sets_complete"]:
+        return None
 
-    return results[offset : offset + 50]
+    return matching_sets
 
 
 def get_cached_strict_matching_stickers(context):
     """Get all unique file_id's of strict matching stickers."""
-    query_id = context.inline_query_id
-    cache = context.tg_context.bot_data["query_cache"][query_id]
-    return cache["strict_unique"]
+    cache = initialize_cache(context)
+    return cache["strict"].get_file_unique_ids(sticker_files)
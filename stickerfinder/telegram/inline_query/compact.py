@@ -0,0 +1,107 @@
+"""Compact storage of cached inline query results.
+
+A cached result only consists of the sticker id and its score, which are stored in typed
+arrays instead of a python list per result. Python objects have a considerable overhead,
+which dominates the memory usage once thousands of inline queries are cached.
+
+The file_id and file_unique_id of a sticker are stored once in a table, which is shared
+between all inline queries. Popular stickers show up in the results of many queries, so
+their file ids would otherwise be stored over and over again.
+"""
+
+import time
+from array import array
+from threading import Lock
+
+
+class StickerFiles:
+    """Shared table of sticker ids to their file_id and file_unique_id.
+
+    Each row remembers, when it has last been added. This allows to prune all rows
+    that aren't referenced by any cached results, without locking out new results.
+    """
+
+    def __init__(self):
+        """Create a new empty table."""
+        self.files = {}
+        self.lock = Lock()
+
+    def __len__(self):
+        """Return the amount of stickers in the table."""
+        return len(self.files)
+
+    def add(self, results):
+        """Add or refresh the file ids of the stickers of search results.
+
+        Each result starts with the sticker id, the file_id and the file_unique_id.
+        """
+        added_at = time.monotonic()
+        with self.lock:
+            for result in results:
+                self.files[result[0]] = (result[1], result[2], added_at)
+
+    def get(self, sticker_id):
+        """Get the file_id and file_unique_id of a sticker or `None`."""
+        return self.files.get(sticker_id)
+
+    def prune(self, sticker_ids, before):
+        """Remove all stickers, that aren't part of `sticker_ids` and older than `before`.
+
+        Stickers which have been added after `before` may belong to results, which
+        have been cached after the referenced stickers have been collected.
+        """
+        with self.lock:
+            self.files = {
+                sticker_id: files
+                for sticker_id, files in self.files.items()
+                if sticker_id in sticker_ids or files[2] >= before
+            }
+
+
+class CachedResults:
+    """The sticker ids and scores of cached search results."""
+
+    def __init__(self):
+        """Create a new empty result list."""
+        self.ids = array("q")
+        self.scores = array("d")
+
+    def __len__(self):
+        """Return the amount of cached results."""
+        return len(self.scores)
+
+    def append(self, sticker_id, score):
+        """Append a single result."""
+        self.ids.append(sticker_id)
+        self.scores.append(score)
+
+    def get_last(self):
+        """Get the id and score of the last result."""
+        return self.ids[len(self) - 1], self.scores[len(self) - 1]
+
+    def get_window(self, offset, limit, sticker_files):
+        """Get a window of results as (id, file_id, score) tuples.
+
+        Returns `None`, if the file ids of any sticker have already been pruned.
+        This can only happen, if the cache entry has been evicted in the meantime.
+        """
+        results = []
+        end = min(offset + limit, len(self))
+        for sticker_id, score in zip(self.ids[offset:end], self.scores[offset:end]):
+            files = sticker_files.get(sticker_id)
+            if files is None:
+                return None
+
+            results.append((sticker_id, files[0], score))
+
+        return results
+
+    def get_file_unique_ids(self, sticker_files):
+        """Get the file_unique_ids of all results."""
+        file_unique_ids = []
+        for sticker_id in self.ids[: len(self)]:
+            files = sticker_files.get(sticker_id)
+            if files is not None:
+                file_unique_ids.append(files[1])
+
+        return file_unique_ids
@@ -0,0 +1,157 @@
+"""Run the fuzzy query in parallel to the strict query.
+
+If only few stickers are tagged with the searched tags, we'll most likely have
+to switch to fuzzy search right after the strict search. In this case the fuzzy
+query is started on a separate pooled connection, while the strict query is running.
+Since the strict results aren't known yet, the fuzzy query cannot exclude them.
+Strict hits are removed from the fuzzy results afterwards instead.
+
+If the strict query finds enough stickers, the running fuzzy query is canceled
+on the server via `pg_cancel_backend`. Canceling the future alone would leave
+the query running until it's done.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from sqlalchemy import func, select
+
+from stickerfinder.config import config
+from stickerfinder.db import get_session
+from stickerfinder.models import StickerSearchDoc
+
+from .deadline import search_within_deadline
+from .sql_query import get_fuzzy_matching_query
+from .tag_index import tag_index
+
+executor = ThreadPoolExecutor(
+    max_workers=config["telegram"]["worker_count"],
+    thread_name_prefix="fuzzy_search",
+)
+
+
+def should_search_concurrently(session, context):
+    """Check whether the fuzzy query should be started in parallel.
+
+    This is only done for the first request of an inline query, if the searched tags are sparse.
+    """
+    if not config["mode"]["concurrent_fuzzy"]:
+        return False
+
+    # Waiting for the fuzzy results would block the event loop.
+    if context.deferred:
+        return False
+
+    if context.offset != 0 or context.fuzzy_offset is not None:
+        return False
+
+    max_frequency = config["mode"]["concurrent_fuzzy_max_frequency"]
+    international = context.user.international
+    if config["mode"]["search_engine"] == "memory" and tag_index.ready:
+        frequency = tag_index.get_document_frequency(context.tags, international)
+    else:
+        condition = StickerSearchDoc.tags.overlap(context.tags)
+        if international:
+            condition = condition | StickerSearchDoc.international_tags.overlap(
+                context.tags
+            )
+        # We only need to know, whether there are less documents than the maximum.
+        matching_docs = (
+            session.query(StickerSearchDoc.file_unique_id)
+            .filter(condition)
+            .limit(max_frequency)
+            .subquery()
+        )
+        frequency = session.query(matching_docs).count()
+
+    return frequency < max_frequency
+
+
+class FuzzySearch:
+    """A fuzzy query, which runs in a worker thread."""
+
+    def __init__(self):
+        self.future = None
+        # The pid of the postgres backend, while the fuzzy query is running on it.
+        self.backend_pid = None
+        self.canceled = False
+        self.lock = Lock()
+
+    def run(self, context, limit):
+        """Run the fuzzy query on a new session, without excluding strict results."""
+        session = get_session()
+        try:
+            with self.lock:
+                if self.canceled:
+                    return None
+                self.backend_pid = session.execute(
+                    select(func.pg_backend_pid())
+                ).scalar()
+
+            try:
+                query = get_fuzzy_matching_query(
+                    session, context, strict_file_unique_ids=[]
+                )
+                return search_within_deadline(
+                    session, context, lambda session, context: query.limit(limit).all()
+                )
+            finally:
+                # The connection goes back to the pool afterwards.
+                # Nobody must cancel the queries of its next user.
+                with self.lock:
+                    self.backend_pid = None
+        finally:
+            session.close()
+
+    def cancel(self, session):
+        """Cancel the fuzzy query, if it's still queued or running."""
+        if self.future.cancel():
+            return
+
+        with self.lock:
+            self.canceled = True
+            if self.backend_pid is not None:
+                session.execute(select(func.pg_cancel_backend(self.backend_pid)))
+
+
+def start_fuzzy_search(context):
+    """Start the fuzzy query in a worker thread."""
+    fuzzy_context = context.detach()
+
+    # Less than 50 strict stickers may be removed from the results afterwards.
+    # 50 more stickers are needed to fill up the first response.
+    limit = config["mode"]["inline_cache_size"] + 100
+
+    fuzzy_search = FuzzySearch()
+    fuzzy_search.future = executor.submit(fuzzy_search.run, fuzzy_context, limit)
+    return fuzzy_search
+
+
+def cancel_fuzzy_search(session, fuzzy_search):
+    """Cancel the fuzzy search, since we found enough strict stickers."""
+    if not fuzzy_search.future.done():
+        fuzzy_search.cancel(session)
+
+
+def get_fuzzy_search_result(fuzzy_search, context, strict_file_unique_ids):
+    """Wait for the fuzzy results and remove all strictly matching stickers.
+
+    Returns `None`, if the fuzzy query has been canceled due to the deadline.
+    """
+    fuzzy_matching_stickers = fuzzy_search.future.result()
+    if fuzzy_matching_stickers is None:
+        return None
+
+    fuzzy_matching_stickers = exclude_stickers(
+        fuzzy_matching_stickers, strict_file_unique_ids
+    )
+
+    # Only keep as many results, as a normal fuzzy query would have returned.
+    limit = config["mode"]["inline_cache_size"] + context.limit
+    return fuzzy_matching_stickers[:limit]
+
+
+def exclude_stickers(stickers, file_unique_ids):
+    """Remove all stickers with the given file_unique_ids."""
+    file_unique_ids = set(file_unique_ids)
+    return [sticker for sticker in stickers if sticker[2] not in file_unique_ids]
@@ -1,6 +1,12 @@
 """Object representing a inline query search for easier parameter handling."""
 
-from stickerfinder.logic.tag import get_tags_from_text
+import copy
+import time
+from decimal import Decimal
+from types import SimpleNamespace
+
+from stickerfinder.config import config
+from stickerfinder.logic.tag import get_tags_from_text, is_emoji
 
 
 class Context:
@@ -22,16 +28,34 @@ class Context:
         self.inline_query_id = None
         self.offset = None
         self.fuzzy_offset = None
+        self.cursor = None
         self.extract_info_from_offset(offset_payload)
 
         self.switched_to_fuzzy = False
         self.limit = None
 
+        # The cache entry of the inline query, which is loaded once per request.
+        self.cache_entry = None
+
+        # The point in time, by which the search has to be answered.
+        # The search is truncated, if it would take longer than that.
+        self.deadline = None
+        self.truncated = False
+        if config["mode"]["search_deadline"]:
+            self.deadline = time.monotonic() + config["mode"]["search_budget_seconds"]
+
+        # Searches of the async pipeline run inside the event loop.
+        # They must not wait for other threads and their answer is only sent,
+        # once their database connection has been released.
+        self.deferred = False
+        self.deferred_answer = None
+
     def __str__(self):
         """Debug string for class."""
         text = f"Context: {self.query}, {self.mode}"
         text += f"\nTags {self.tags}"
         text += f"\nOffsets: {self.offset}, {self.fuzzy_offset}"
+        text += f"\nCursor: {self.cursor}"
         text += f"\nanimated, nsfw, furry: {self.animated}, {self.nsfw}, {self.furry}"
         return text
 
@@ -41,7 +65,9 @@ class Context:
         if offset == "":
             self.offset = 0
         # Extract query_id, offset and possibly fuzzy_offset. They are sepparated by `:`
+        # The cursor of the last result is appended after a `;`
         else:
+            offset, _, cursor = offset.partition(";")
             splitted = offset.split(":")
             self.inline_query_id = int(splitted[0])
             self.offset = int(splitted[1])
@@ -50,6 +76,11 @@ class Context:
             if len(splitted) > 2:
                 self.fuzzy_offset = int(splitted[2])
 
+            # The cursor consists of the score and the key of the last result.
+            if cursor != "":
+                score, key = cursor.split(":")
+                self.cursor = (Decimal(score), key)
+
     def determine_special_search(self):
         """Check whether we should enter a special search mode."""
         # Handle animated mode
@@ -71,6 +102,50 @@ class Context:
         if len(self.tags) == 0:
             self.mode = Context.FAVORITE_MODE
 
+        # Pure emoji searches can't match any names or texts and are never fuzzy.
+        self.emoji = (
+            config["mode"]["emoji_index"]
+            and self.mode == Context.STICKER_MODE
+            and len(self.tags) > 0
+            and all(is_emoji(tag) for tag in self.tags)
+        )
+
+    def detach(self):
+        """Get a copy of this context, which can be used in another thread.
+
+        The user is bound to the session of the current thread.
+        That's why the copy only contains the user's values we need for searching.
+        """
+        user = self.user
+        context = copy.copy(self)
+        context.cache_entry = None
+        context.user = SimpleNamespace(
+            id=user.id,
+            nsfw=user.nsfw,
+            furry=user.furry,
+            international=user.international,
+            deluxe=user.deluxe,
+        )
+
+        return context
+
+    def answer(self, inline_query, results, **kwargs):
+        """Answer the inline query or remember the answer, if it's deferred.
+
+        Only the first answer of an inline query is accepted by telegram.
+        """
+        if not self.deferred:
+            inline_query.answer(results, **kwargs)
+        elif self.deferred_answer is None:
+            self.deferred_answer = (inline_query, results, kwargs)
+
+    def get_remaining_time(self):
+        """Get the remaining seconds until the deadline or `None`, if there's no deadline."""
+        if self.deadline is None:
+            return None
+
+        return self.deadline - time.monotonic()
+
     def switch_to_fuzzy(self, limit):
         """We didn't get enough strict results and switched to fuzzy search."""
         self.switched_to_fuzzy = True
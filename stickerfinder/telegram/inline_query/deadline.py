@@ -0,0 +1,67 @@
+"""Deadline handling for inline search.
+
+Telegram rejects answers to inline queries, which are older than roughly 10 seconds.
+Measuring the duration afterwards doesn't help in this case, which is why every search
+runs within a time budget. The statements of a search get a `statement_timeout` of the
+remaining budget, so postgres cancels them before the answer becomes useless.
+
+A canceled search is recorded as truncated. The user still gets all results we
+already have, which is better than no answer at all.
+"""
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import DBAPIError
+
+from stickerfinder.config import config
+
+# The SQLSTATE of canceled statements. It's the same for psycopg2 and asyncpg.
+QUERY_CANCELED = "57014"
+
+
+def search_within_deadline(session, context, search):
+    """Run a search, whose statements are canceled as soon as the deadline is reached.
+
+    Returns `None`, if the search has been canceled.
+    The timeout is set in a savepoint, so a canceled statement doesn't abort the
+    request's transaction and the timeout doesn't apply to any other statements.
+    """
+    remaining_time = context.get_remaining_time()
+    if remaining_time is None:
+        return search(session, context)
+
+    timeout = int(remaining_time * 1000)
+    if timeout <= 0:
+        context.truncated = True
+        return None
+
+    try:
+        with session.begin_nested():
+            previous_timeout = session.execute(
+                select(
+                    func.current_setting("statement_timeout"),
+                    func.set_config("statement_timeout", str(timeout), True),
+                )
+            ).first()[0]
+
+            results = search(session, context)
+
+            session.execute(
+                select(func.set_config("statement_timeout", previous_timeout, True))
+            )
+    except DBAPIError as error:
+        if getattr(error.orig, "pgcode", None) != QUERY_CANCELED:
+            raise
+
+        context.truncated = True
+        return None
+
+    return results
+
+
+def has_time_for_fuzzy_search(context):
+    """Check whether there's enough time left for a fuzzy search."""
+    remaining_time = context.get_remaining_time()
+    if remaining_time is None:
+        return True
+
+    return remaining_time >= config["mode"]["search_fuzzy_min_seconds"]
@@ -0,0 +1,216 @@
+"""In-memory emoji index for pure emoji searches.
+
+Many inline queries consist of a single emoji. Such a query can't match any sticker set
+names or texts, but still runs through the whole strict search and fuzzy search.
+
+The emoji index holds a posting list of sticker positions for every emoji, which is
+built from the original emojis of the stickers, all emoji tags and all tags of users,
+which only consist of emojis. The stickers are
+ordered by their popularity, which is the total usage count of all users.
+That's why the postings of an emoji are already in the order of the results.
+Only the usages of the requesting user are applied on top.
+
+The index is rebuilt periodically by a job and swapped atomically, which is why
+readers never have to lock anything.
+"""
+
+import numpy
+from sqlalchemy import func, or_, select, union
+
+from stickerfinder.logic.tag import get_emojis, is_emoji
+from stickerfinder.logic.usage import get_usage_counts
+from stickerfinder.models import (
+    StickerSearchDoc,
+    StickerUsage,
+    Tag,
+    sticker_original_emoji,
+    sticker_tag,
+)
+
+from .offload import run_cpu_bound
+from .scoring import TAG_SCORE, USAGE_SCORE, rank, round_scores
+from .tag_index import get_filter_mask, get_flags
+
+
+class EmojiIndexSnapshot:
+    """An immutable snapshot of all stickers with emojis."""
+
+    def __init__(self, stickers, sticker_emojis):
+        """Build the index from sticker rows and (file_unique_id, emojis) rows.
+
+        Tags may consist of several emojis, which are indexed one by one.
+
+        The sticker rows have to be sorted by popularity, sticker set name and file_unique_id.
+        The position of a sticker in this list is used as its tie-breaker in the ordering.
+        """
+        count = len(stickers)
+        self.ids = numpy.zeros(count, dtype=numpy.int64)
+        self.flags = numpy.zeros(count, dtype=numpy.uint16)
+        self.file_ids = []
+        self.file_unique_ids = []
+        self.set_names = []
+
+        self.position_by_file_unique_id = {}
+        for position, sticker in enumerate(stickers):
+            self.ids[position] = sticker.id
+            self.flags[position] = get_flags(sticker)
+            self.file_ids.append(sticker.file_id)
+            self.file_unique_ids.append(sticker.file_unique_id)
+            self.set_names.append(sticker.set_name)
+            self.position_by_file_unique_id[sticker.file_unique_id] = position
+
+        postings = {}
+        for file_unique_id, emojis in sticker_emojis:
+            position = self.position_by_file_unique_id.get(file_unique_id)
+            if position is None:
+                continue
+
+            for emoji in get_emojis(emojis):
+                postings.setdefault(emoji, set()).add(position)
+
+        self.postings = {
+            emoji: numpy.array(sorted(positions), dtype=numpy.int32)
+            for emoji, positions in postings.items()
+        }
+
+    def __len__(self):
+        """Return the amount of indexed stickers."""
+        return len(self.ids)
+
+    def get_matching_stickers(self, context, usages, offset, limit):
+        """Get the stickers with the searched emojis.
+
+        Stickers are scored like in strict search, by the amount of matching emojis
+        and the usages of the user. Ties are ordered by popularity.
+        `usages` is an iterable of (file_unique_id, usage_count) tuples of the current user.
+        """
+        emojis = set()
+        for tag in context.tags:
+            emojis.update(get_emojis(tag))
+
+        postings = [self.postings[emoji] for emoji in emojis if emoji in self.postings]
+        if len(postings) == 0:
+            return []
+
+        candidates, hits = numpy.unique(numpy.concatenate(postings), return_counts=True)
+        mask = get_filter_mask(self.flags[candidates], context)
+        candidates = candidates[mask]
+        scores = hits[mask] * float(TAG_SCORE)
+
+        # The usage is only applied to stickers that match any of the emojis
+        for file_unique_id, usage_count in usages:
+            position = self.position_by_file_unique_id.get(file_unique_id)
+            if position is None:
+                continue
+
+            index = numpy.searchsorted(candidates, position)
+            if index < len(candidates) and candidates[index] == position:
+                scores[index] += USAGE_SCORE * usage_count
+
+        scores = round_scores(scores)
+
+        # The position already represents the order of popularity.
+        order = rank(scores, candidates, offset, limit)
+
+        return [
+            (
+                int(self.ids[candidates[index]]),
+                self.file_ids[candidates[index]],
+                self.file_unique_ids[candidates[index]],
+                self.set_names[candidates[index]],
+                float(scores[index]),
+            )
+            for index in order
+        ]
+
+
+class EmojiIndex:
+    """Holder of the current emoji index snapshot."""
+
+    def __init__(self):
+        """Create a new empty emoji index."""
+        self.snapshot = None
+
+    @property
+    def ready(self):
+        """Check whether the index has been built at least once."""
+        return self.snapshot is not None
+
+    def rebuild(self, session):
+        """Load all stickers with emojis from the database and swap the snapshot."""
+        # Users tag stickers with emojis as well, which aren't flagged as emoji tags.
+        tag_names = session.execute(select(Tag.name).where(Tag.emoji.is_(False)))
+        user_emoji_tags = [name for name in tag_names.scalars() if is_emoji(name)]
+
+        emojis = union(
+            select(
+                sticker_original_emoji.c.sticker_file_unique_id,
+                sticker_original_emoji.c.emoji,
+            ),
+            select(sticker_tag.c.sticker_file_unique_id, sticker_tag.c.tag_name)
+            .join(Tag, Tag.name == sticker_tag.c.tag_name)
+            .where(or_(Tag.emoji.is_(True), Tag.name.in_(user_emoji_tags))),
+        ).subquery("emojis")
+
+        popularity = (
+            session.query(
+                StickerUsage.sticker_file_unique_id.label("file_unique_id"),
+                func.sum(StickerUsage.usage_count).label("usage_count"),
+            )
+            .group_by(StickerUsage.sticker_file_unique_id)
+            .subquery("popularity")
+        )
+        usage_count = func.coalesce(popularity.c.usage_count, 0)
+
+        stickers = (
+            session.query(
+                StickerSearchDoc.sticker_id.label("id"),
+                StickerSearchDoc.file_id,
+                StickerSearchDoc.file_unique_id,
+                StickerSearchDoc.set_name,
+                StickerSearchDoc.animated,
+                StickerSearchDoc.banned,
+                StickerSearchDoc.nsfw,
+                StickerSearchDoc.furry,
+                StickerSearchDoc.international,
+                StickerSearchDoc.deluxe,
+                StickerSearchDoc.reviewed,
+                StickerSearchDoc.deleted,
+            )
+            .outerjoin(
+                popularity,
+                popularity.c.file_unique_id == StickerSearchDoc.file_unique_id,
+            )
+            .filter(
+                StickerSearchDoc.file_unique_id.in_(
+                    select(emojis.c.sticker_file_unique_id)
+                )
+            )
+            .order_by(
+                usage_count.desc(),
+                StickerSearchDoc.set_name,
+                StickerSearchDoc.file_unique_id,
+            )
+            .all()
+        )
+        sticker_emojis = session.execute(select(emojis)).all()
+
+        self.snapshot = EmojiIndexSnapshot(stickers, sticker_emojis)
+
+    def get_matching_stickers(self, session, context, offset, limit):
+        """Answer a pure emoji search from the current snapshot."""
+        snapshot = self.snapshot
+
+        usages = get_usage_counts(session, context.user.id).items()
+
+        return run_cpu_bound(
+            context.deferred,
+            snapshot.get_matching_stickers,
+            context.detach(),
+            usages,
+            offset,
+            limit,
+        )
+
+
+emoji_index = EmojiIndex()
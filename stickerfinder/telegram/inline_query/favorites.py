@@ -0,0 +1,118 @@
+"""Precomputed favorite stickers of users.
+
+An empty query shows the most used stickers of the user, which is the most common query.
+Instead of sorting the user's usages on every request, the top favorites are
+kept in memory per user and filter variant (nsfw, furry, animated).
+All variants of a user are cached in a single entry, so they can be dropped at once.
+
+The lists are updated incrementally, whenever a user chooses a sticker.
+Favorites are sorted by usage count and the time of the last usage, both descending.
+"""
+
+from stickerfinder.caches import favorite_cache
+from stickerfinder.config import config
+
+
+def get_cached_favorites(context, offset, limit):
+    """Get a page of cached favorites.
+
+    Returns `None`, if the favorites aren't cached or the page isn't covered by them.
+    """
+    variants = favorite_cache.get(context.user.id)
+    if variants is None:
+        return None
+
+    cached = variants.get(get_filters(context))
+    if cached is None:
+        return None
+
+    favorites, complete = cached
+    if not complete and offset + limit > len(favorites):
+        return None
+
+    return [favorite[:4] for favorite in favorites[offset : offset + limit]]
+
+
+def cache_favorites(context, favorites, complete):
+    """Cache the top favorites of a user.
+
+    Each favorite is a (sticker_id, file_id, file_unique_id, usage_count, updated_at) tuple.
+    `complete` signals that these are all favorites of the user.
+    """
+    favorites = [tuple(favorite) for favorite in favorites]
+    cached = {get_filters(context): (favorites, complete)}
+
+    # Copy the variants, since other threads might be reading the cached dict.
+    if favorite_cache.get(context.user.id) is None:
+        favorite_cache.put(context.user.id, cached)
+    else:
+        favorite_cache.update(context.user.id, lambda variants: {**variants, **cached})
+
+    return favorites
+
+
+def record_favorite(sticker, sticker_usage):
+    """Update the cached favorites of a user with a committed sticker usage."""
+    sticker_set = sticker.sticker_set
+    if sticker.banned or sticker_set.banned:
+        return
+
+    favorite = (
+        sticker.id,
+        sticker.file_id,
+        sticker.file_unique_id,
+        sticker_usage.usage_count,
+        sticker_usage.updated_at,
+    )
+
+    # Animated stickers are also shown, if animated stickers aren't explicitly requested
+    filters = [
+        (sticker_set.nsfw, sticker_set.furry, animated)
+        for animated in set([False, sticker.animated])
+    ]
+    favorite_cache.update(
+        sticker_usage.user_id,
+        lambda variants: add_favorite_to_variants(variants, filters, favorite),
+    )
+
+
+def add_favorite_to_variants(variants, filters, favorite):
+    """Add a favorite to all cached variants with the given filters."""
+    variants = dict(variants)
+    for variant in filters:
+        if variant in variants:
+            variants[variant] = add_favorite(variants[variant], favorite)
+
+    return variants
+
+
+def add_favorite(cached, favorite):
+    """Insert or move a favorite in the ranked favorites."""
+    favorites, complete = cached
+    remaining = [entry for entry in favorites if entry[2] != favorite[2]]
+
+    # A sticker that's not among the favorites yet might still rank below all of them.
+    # Since there might be further unknown favorites, it can't be added in this case.
+    was_favorite = len(remaining) < len(favorites)
+    if not was_favorite and not complete:
+        if len(remaining) == 0 or get_rank(favorite) <= get_rank(remaining[-1]):
+            return cached
+
+    remaining.append(favorite)
+    remaining.sort(key=get_rank, reverse=True)
+
+    size = config["cache"]["favorites_count"]
+    if len(remaining) > size:
+        return (remaining[:size], False)
+
+    return (remaining, complete)
+
+
+def get_rank(favorite):
+    """Get the sort key of a favorite."""
+    return favorite[3], favorite[4]
+
+
+def get_filters(context):
+    """Get the filter variant of the user's favorites for the current search."""
+    return (context.nsfw, context.furry, context.animated)
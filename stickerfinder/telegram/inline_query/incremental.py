@@ -0,0 +1,88 @@
+"""Incremental strict search while the user is typing.
+
+Users tend to type their query word by word, e.g. "cat", "cat cute", "cat cute funny".
+Each of these queries would run the full strict search again.
+
+The strict score is a sum over all tags, which is why the results of an extended query
+can be computed from the results of the previous query: The scores of the added tags
+are simply added to the previous scores. This only requires a query for the added tags,
+which is a lot cheaper than querying all tags again.
+
+Only complete strict results are remembered, since stickers which only matched the
+previous tags might otherwise be missing.
+"""
+
+from collections import Counter
+from decimal import Decimal
+
+import numpy
+
+from stickerfinder.caches import recent_search_cache
+
+from .scoring import get_usage_score, rank
+from .shared_cache import get_filter_profile
+
+
+def remember_search(context, matching_stickers):
+    """Remember the complete strict results of the user's latest search."""
+    results = [
+        (sticker_id, file_id, file_unique_id, name, Decimal(str(score)))
+        for sticker_id, file_id, file_unique_id, name, score in matching_stickers
+    ]
+    recent_search_cache.put(
+        context.user.id,
+        (get_filter_profile(context), tuple(context.tags), results),
+    )
+
+
+def get_previous_search(context):
+    """Get the results of the user's previous search, if the current search extends it.
+
+    Returns a tuple of the previous results and the added tags or `None`.
+    """
+    cached = recent_search_cache.get(context.user.id)
+    if cached is None:
+        return None
+
+    profile, tags, results = cached
+    if profile != get_filter_profile(context):
+        return None
+
+    # All previous tags need to be part of the new search.
+    added_tags = Counter(context.tags) - Counter(tags)
+    missing_tags = Counter(tags) - Counter(context.tags)
+    if len(added_tags) == 0 or len(missing_tags) > 0:
+        return None
+
+    return results, list(added_tags.elements())
+
+
+def merge_results(results, added_results, usages, key_ranks):
+    """Add the scores of the added tags to the previous results.
+
+    `added_results` contain the unpersonalized strict score of the added tags.
+    The usage score only needs to be added to stickers that weren't part of the previous results.
+    The results are sorted the same way as the strict matching query.
+    `key_ranks` maps the file_unique_ids of all results to their position in the
+    order of set name and file_unique_id, which is computed by the database.
+    """
+    merged = {result[2]: result for result in results}
+    for sticker_id, file_id, file_unique_id, name, score in added_results:
+        previous = merged.get(file_unique_id)
+        if previous is None:
+            score = score + get_usage_score(usages.get(file_unique_id, 0))
+        else:
+            score = score + previous[4]
+
+        merged[file_unique_id] = (sticker_id, file_id, file_unique_id, name, score)
+
+    merged = list(merged.values())
+    scores = numpy.array([float(result[4]) for result in merged])
+    ranks = numpy.array([key_ranks[result[2]] for result in merged])
+
+    return [merged[position] for position in rank(scores, ranks, 0, len(merged))]
+
+
+def forget_search(user_id):
+    """Forget the latest search of a user."""
+    recent_search_cache.pop(user_id)
@@ -0,0 +1,26 @@
+"""Run the CPU-bound parts of async searches outside of the event loop.
+
+Async searches run on the synchronous facade of an `AsyncSession`, which executes
+the search in the event loop's thread. Statements yield to the event loop, but ranking
+stickers in the in-memory indices doesn't and would block all other searches meanwhile.
+
+That's why deferred searches hand their CPU-bound work to the loop's thread pool and
+wait for it, just like they wait for a statement.
+"""
+
+import asyncio
+
+from sqlalchemy.util import await_only
+
+
+def run_cpu_bound(deferred, function, *args):
+    """Run a CPU-bound function of a search.
+
+    The function runs in the event loop's thread pool, if the search is deferred.
+    It must not use the session and only gets detached objects.
+    """
+    if not deferred:
+        return function(*args)
+
+    loop = asyncio.get_running_loop()
+    return await_only(loop.run_in_executor(None, function, *args))
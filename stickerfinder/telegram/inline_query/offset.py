@@ -1,11 +1,34 @@
-"""Inline query offset handling."""
+"""Inline query offset handling.
+
+The offset payload has the format `query_id:offset[:fuzzy_offset][;score:key]`.
+The optional cursor contains the score and the key of the last result.
+It allows us to continue the search right after the last result via keyset pagination,
+instead of letting the database compute and discard all previous results.
+"""
+
+import hashlib
+
+from .context import Context
+
+# Telegram only accepts offsets with up to 64 bytes
+MAX_OFFSET_LENGTH = 64
 
 
 def get_next_offset(context, matching_stickers, fuzzy_matching_stickers):
     """Get the offset for the next query."""
+    # The search has been cut short by the deadline.
+    if context.truncated:
+        # Fuzzy search has been skipped. Continue with fuzzy search on the next request.
+        if context.switched_to_fuzzy and len(matching_stickers) > 0:
+            offset = context.offset + len(matching_stickers)
+            return f"{context.inline_query_id}:{offset}:0"
+
+        return "done"
+
     # We got the maximum amount of strict stickers. Get the next offset
-    if len(matching_stickers) == 50:
-        return f"{context.inline_query_id}:{context.offset + 50}"
+    elif len(matching_stickers) == 50:
+        offset = f"{context.inline_query_id}:{context.offset + 50}"
+        return add_sticker_cursor(context, offset, matching_stickers)
 
     # We were explicitely fuzzy searching found less than 50 stickers.
     elif not context.switched_to_fuzzy and len(fuzzy_matching_stickers) < 50:
@@ -20,7 +43,8 @@ def get_next_offset(context, matching_stickers, fuzzy_matching_stickers):
     ):
         offset = context.offset + len(matching_stickers)
         context.fuzzy_offset += len(fuzzy_matching_stickers)
-        return f"{context.inline_query_id}:{offset}:{context.fuzzy_offset}"
+        offset = f"{context.inline_query_id}:{offset}:{context.fuzzy_offset}"
+        return add_sticker_cursor(context, offset, fuzzy_matching_stickers)
     else:
         raise Exception("Unknown case during offset creation")
 
@@ -29,7 +53,47 @@ def get_next_set_offset(context, matching_sets):
     """Get the set search offset for the next query."""
     # Set the next offset. If we found all matching sets, set the offset to 'done'
     if len(matching_sets) == 8:
-        return f"{context.inline_query_id}:{context.offset + 8}"
+        offset = f"{context.inline_query_id}:{context.offset + 8}"
+        sticker_set, score = matching_sets[-1]
+        return add_cursor(offset, score, get_sticker_set_key(sticker_set.name))
 
     # We reached the end of the strictly matching sticker sets.
     return "done"
+
+
+def add_sticker_cursor(context, offset, stickers):
+    """Add the cursor of the last sticker to the offset.
+
+    Every sticker result starts with the sticker id and ends with its score.
+    Favorite stickers are paginated by offset, which is why they don't get a cursor.
+    """
+    if context.mode == Context.FAVORITE_MODE:
+        return offset
+
+    last_sticker = stickers[-1]
+    return add_cursor(offset, last_sticker[-1], last_sticker[0])
+
+
+def add_cursor(offset, score, key):
+    """Append a cursor to the offset, as long as it fits into the payload."""
+    # Format the score with a fixed amount of decimals.
+    # Scores are compared with a small epsilon, since fuzzy scores get rounded here.
+    score = f"{score:.10f}".rstrip("0").rstrip(".")
+    offset_with_cursor = f"{offset};{score}:{key}"
+    if len(offset_with_cursor) > MAX_OFFSET_LENGTH:
+        return offset
+
+    return offset_with_cursor
+
+
+def get_sticker_set_key(name):
+    """Get the key of a sticker set, which is used as tie-breaker in set search.
+
+    Sticker set names tend to be super long, which is why we use a hash instead.
+    """
+    return hashlib.md5(name.encode()).hexdigest()[:16]
+
+
+def strip_cursor(offset):
+    """Remove the cursor from an offset payload."""
+    return offset.split(";", 1)[0]
@@ -0,0 +1,155 @@
+"""Prefetch the next window of search results in the background.
+
+Telegram clients ask for the next page as soon as the user scrolls.
+If the next page isn't part of the cached results anymore, that request would have
+to wait for the whole query. Instead, we start fetching the next window of results
+right after answering the current page and append them to the cache entry.
+
+Prefetching is a best effort optimization. If all prefetch workers are busy,
+no prefetch is scheduled at all.
+
+Running prefetches are tracked per process by inline query id, since cache entries
+of the shared backend are copies, which can't hold a future.
+"""
+
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from threading import BoundedSemaphore, Lock
+
+from stickerfinder.config import config
+from stickerfinder.db import get_session
+from stickerfinder.sentry import sentry
+
+from .cache import cache_stickers, inline_query_cache
+from .context import Context
+from .sql_query import get_fuzzy_matching_stickers, get_strict_matching_stickers
+
+executor = ThreadPoolExecutor(
+    max_workers=config["mode"]["prefetch_workers"],
+    thread_name_prefix="prefetch",
+)
+slots = BoundedSemaphore(config["mode"]["prefetch_workers"])
+
+# Maps inline query ids to the future of their running prefetch.
+futures = {}
+futures_lock = Lock()
+
+
+def schedule_prefetch(context, next_offset):
+    """Schedule a prefetch, if the next page isn't fully cached."""
+    if not config["mode"]["prefetch"]:
+        return
+
+    if next_offset == "done" or context.mode != Context.STICKER_MODE:
+        return
+
+    cache = context.cache_entry
+    if cache is None:
+        cache = inline_query_cache.get(context.inline_query_id)
+    if cache is None:
+        return
+
+    # There's already a prefetch for this inline query
+    with futures_lock:
+        future = futures.get(context.inline_query_id)
+        if future is not None and not future.done():
+            return
+
+    # The offset of the next page has already been set on the context
+    fuzzy = context.fuzzy_offset is not None
+    if fuzzy:
+        key = "fuzzy"
+        next_page_offset = context.fuzzy_offset
+    else:
+        key = "strict"
+        next_page_offset = context.offset + 50
+
+    results = cache[key]
+    if cache[f"{key}_complete"] or len(results) == 0:
+        return
+
+    # The next page can be served from the cache.
+    end = cache[f"{key}_base"] + len(results)
+    if end - next_page_offset >= 50:
+        return
+
+    # Don't queue prefetches, if all workers are busy.
+    if not slots.acquire(blocking=False):
+        return
+
+    # Continue right after the last cached result
+    prefetch_context = context.detach()
+    sticker_id, score = results.get_last()
+    prefetch_context.cursor = (Decimal(str(score)), str(sticker_id))
+    if fuzzy:
+        prefetch_context.fuzzy_offset = end
+        prefetch_context.switched_to_fuzzy = False
+        prefetch_context.limit = None
+    else:
+        prefetch_context.offset = end
+
+    future = executor.submit(prefetch, prefetch_context, fuzzy)
+    with futures_lock:
+        futures[context.inline_query_id] = future
+    future.add_done_callback(lambda _: slots.release())
+
+
+def prefetch(context, fuzzy):
+    """Fetch the next window of results and append it to the cache entry."""
+    # The entry might have been evicted, while the prefetch was queued.
+    if inline_query_cache.get(context.inline_query_id) is None:
+        return
+
+    session = get_session()
+    try:
+        if fuzzy:
+            results = get_fuzzy_matching_stickers(session, context)
+        else:
+            results = get_strict_matching_stickers(session, context)
+
+        cache_stickers(context, results, fuzzy=fuzzy)
+    except Exception:
+        traceback.print_exc()
+        sentry.capture_exception(tags={"handler": "prefetch"})
+    finally:
+        session.close()
+
+
+def wait_for_prefetch(context):
+    """Wait for a running prefetch of this inline query.
+
+    Returns True, if there was a prefetch and new results might have been cached.
+    Deferred searches run in the event loop, which mustn't be blocked.
+    """
+    if context.deferred:
+        return False
+
+    with futures_lock:
+        future = futures.pop(context.inline_query_id, None)
+    if future is None or future.cancelled():
+        return False
+
+    future.result()
+
+    # The prefetch changed the cache entry
+    context.cache_entry = None
+
+    return True
+
+
+def cancel_prefetch(inline_query_id):
+    """Cancel a pending prefetch of an inline query."""
+    with futures_lock:
+        future = futures.pop(inline_query_id, None)
+
+    if future is not None:
+        future.cancel()
+
+
+def prune_prefetches():
+    """Remove all finished prefetches, which nobody waited for."""
+    with futures_lock:
+        for inline_query_id, future in list(futures.items()):
+            if future.done():
+                del futures[inline_query_id]
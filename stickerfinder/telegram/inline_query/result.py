@@ -1,9 +1,17 @@
+from stickerfinder.config import config
 from stickerfinder.db import get_session
+from stickerfinder.logic.usage import record_usage
 from stickerfinder.models import InlineQuery, Sticker, StickerUsage
 
+from .analytics import analytics_buffer
+from .cache import inline_query_cache
+from .favorites import record_favorite
+from .incremental import forget_search
+from .prefetch import cancel_prefetch
+from .usages import usage_buffer
+
 
 def handle_chosen_inline_result(update, context):
-    session = get_session()
     """Save the chosen inline result."""
     result = update.chosen_inline_result
     splitted = result.result_id.split(":")
@@ -19,13 +27,28 @@ def handle_chosen_inline_result(update, context):
     if len(sticker_id) == 32:
         return
 
+    if config["mode"]["batched_usages"]:
+        # Clean all cache values as soon as the user selects a result
+        inline_query_cache.pop(int(search_id))
+        cancel_prefetch(int(search_id))
+
+        usage_buffer.add(result.from_user.id, int(search_id), int(sticker_id))
+        return
+
+    session = get_session()
     inline_query = session.query(InlineQuery).get(search_id)
 
+    # The inline query might still be buffered
+    if inline_query is None and config["mode"]["buffered_analytics"]:
+        analytics_buffer.flush()
+        inline_query = session.query(InlineQuery).get(search_id)
+
+    if inline_query is None:
+        return
+
     # Clean all cache values as soon as the user selects a result
-    if "query_cache" in context.bot_data:
-        cache = context.bot_data["query_cache"]
-        if inline_query.id in cache:
-            del cache[inline_query.id]
+    inline_query_cache.pop(inline_query.id)
+    cancel_prefetch(inline_query.id)
 
     sticker = session.query(Sticker).filter(Sticker.id == sticker_id).one_or_none()
     # This happens, if the user clicks on a link in sticker set search.
@@ -33,9 +56,13 @@ def handle_chosen_inline_result(update, context):
         return
 
     inline_query.sticker_file_unique_id = sticker.file_unique_id
-    inline_query.sticker_file_unique_id = sticker.file_unique_id
 
     sticker_usage = StickerUsage.get_or_create(session, inline_query.user, sticker)
     sticker_usage.usage_count += 1
 
     session.commit()
+
+    record_usage(sticker_usage)
+    record_favorite(sticker, sticker_usage)
+    # The scores of the latest search don't include this usage
+    forget_search(sticker_usage.user_id)
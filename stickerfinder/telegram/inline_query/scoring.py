@@ -0,0 +1,141 @@
+"""Scoring and ranking of strictly matching stickers.
+
+This module defines the ranking rules of strict search for all search engines.
+The `sql` engine computes the strict score in postgres as numeric arithmetic over one
+CASE expression per search term and sorts all matching stickers by it.
+The `numpy` engine only fetches the matching stickers with a flag for each term and
+kind of match. The scores and the order are then computed vectorized over all matches.
+The in-memory indices, the shared candidates and incremental search rank in python
+with the same weights, rounding and order.
+
+The score of a sticker is:
++ 1 for each exactly matching tag
++ 0.75 for each term that's contained in the sticker set name or title
++ 0.4 for each term that's contained in the OCR text
++ 0.05 for each usage of the sticker by the user
+
+Stickers are ordered by score descending and afterwards by set name and file_unique_id.
+The order of the names is the collation of the database, which is why postgres returns
+the position of each sticker in this order as key rank.
+"""
+
+from decimal import Decimal
+
+import numpy
+
+TAG_SCORE = 1
+SET_SCORE = 0.75
+TEXT_SCORE = 0.4
+USAGE_SCORE = 0.05
+
+# Scores in the offset cursor are rounded to 10 decimals
+CURSOR_EPSILON = Decimal("1e-9")
+
+
+def get_scores(tag_hits, set_hits, text_hits, usage_counts):
+    """Compute the scores from the amount of hits of each kind."""
+    scores = (
+        tag_hits * TAG_SCORE
+        + set_hits * SET_SCORE
+        + text_hits * TEXT_SCORE
+        + usage_counts * USAGE_SCORE
+    )
+
+    return round_scores(scores)
+
+
+def round_scores(scores):
+    """Round float scores, to get the same ties as the numeric sql computation."""
+    return numpy.round(scores, 2)
+
+
+def get_usage_score(usage_count):
+    """Get the exact usage score of a sticker for scores of the numeric sql computation."""
+    return Decimal(str(USAGE_SCORE)) * usage_count
+
+
+def get_cursor_mask(scores, key_ranks, cursor_score, cursor_key_rank):
+    """Get a mask of all stickers after the cursor.
+
+    This mirrors `get_cursor_condition` of the sql queries.
+    """
+    cursor_score = float(cursor_score)
+    epsilon = float(CURSOR_EPSILON)
+
+    return (scores < cursor_score - epsilon) | (
+        (scores <= cursor_score + epsilon) & (key_ranks > cursor_key_rank)
+    )
+
+
+def rank(scores, key_ranks, offset, limit):
+    """Get the positions of a window of stickers in the order of the strict search.
+
+    Stickers are ordered by score descending and afterwards by their key rank.
+    Only the part of the stickers we actually need is sorted. All stickers that tie
+    with the last needed score are kept, since the keys decide which of those are
+    part of the window.
+    """
+    positions = numpy.arange(len(scores))
+    end = offset + limit
+    if end < len(scores):
+        threshold = scores[numpy.argpartition(-scores, end - 1)[end - 1]]
+        positions = numpy.flatnonzero(scores >= threshold)
+
+    order = numpy.lexsort((key_ranks[positions], -scores[positions]))
+
+    return positions[order][offset:end]
+
+
+def rank_matches(matches, term_count, usages, offset, limit, cursor=None):
+    """Score and rank the matching stickers of a strict search.
+
+    Each match consists of (id, file_id, file_unique_id, set name, key rank), followed by
+    the flags of exactly matching tags, set matches and text matches for each term.
+    `usages` maps file_unique_ids to the user's usage count.
+    If a cursor is given, the window starts right after it instead of at the offset.
+    The offset is used, if the sticker of the cursor no longer matches.
+    """
+    if len(matches) == 0:
+        return []
+
+    key_ranks = numpy.array([match[4] for match in matches], dtype=numpy.int64)
+    # Missing texts don't match, which is why NULL flags count as False.
+    flags = numpy.array([match[5:] for match in matches], dtype=numpy.bool_)
+    usage_counts = numpy.array(
+        [usages.get(match[2], 0) for match in matches], dtype=numpy.float64
+    )
+
+    scores = get_scores(
+        flags[:, :term_count].sum(axis=1),
+        flags[:, term_count : 2 * term_count].sum(axis=1),
+        flags[:, 2 * term_count :].sum(axis=1),
+        usage_counts,
+    )
+
+    candidates = numpy.arange(len(matches))
+    cursor_key_rank = get_cursor_key_rank(matches, cursor)
+    if cursor_key_rank is not None:
+        candidates = numpy.flatnonzero(
+            get_cursor_mask(scores, key_ranks, cursor[0], cursor_key_rank)
+        )
+        offset = 0
+
+    positions = rank(scores[candidates], key_ranks[candidates], offset, limit)
+
+    return [
+        (*matches[position][:4], float(scores[position]))
+        for position in candidates[positions]
+    ]
+
+
+def get_cursor_key_rank(matches, cursor):
+    """Get the key rank of the sticker in the cursor or `None`, if it doesn't match."""
+    if cursor is None:
+        return None
+
+    _, (_, cursor_file_unique_id) = cursor
+    for match in matches:
+        if match[2] == cursor_file_unique_id:
+            return match[4]
+
+    return None
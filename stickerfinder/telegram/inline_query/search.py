@@ -11,12 +11,29 @@ from telegram import (
 
 from stickerfinder.sentry import sentry
 
-from .cache import cache_stickers, get_cached_stickers, initialize_cache
+from .cache import (
+    cache_sticker_sets,
+    cache_stickers,
+    get_cached_sticker_sets,
+    get_cached_stickers,
+    get_cached_strict_matching_stickers,
+    initialize_cache,
+)
+from .concurrent import (
+    cancel_fuzzy_search,
+    get_fuzzy_search_result,
+    should_search_concurrently,
+    start_fuzzy_search,
+)
 from .context import Context
-from .offset import get_next_offset, get_next_set_offset
+from .deadline import has_time_for_fuzzy_search, search_within_deadline
+from .emoji_index import emoji_index
+from .offset import get_next_offset, get_next_set_offset, strip_cursor
+from .prefetch import schedule_prefetch, wait_for_prefetch
 from .sql_query import (
     get_favorite_stickers,
     get_fuzzy_matching_stickers,
+    get_sticker_set_previews,
     get_strict_matching_sticker_sets,
     get_strict_matching_stickers,
 )
@@ -36,6 +53,7 @@ def search_stickers(session, update, context, inline_query_request):
 
     if context.fuzzy_offset is not None:
         inline_query_request.fuzzy = True
+    inline_query_request.truncated = context.truncated
 
     # Calculate the next offset. 'done' means there are no more results.
     next_offset = get_next_offset(context, matching_stickers, fuzzy_matching_stickers)
@@ -43,7 +61,9 @@ def search_stickers(session, update, context, inline_query_request):
     # Track the duration how long the request took.
     inline_query_request.duration = duration
     inline_query_request.next_offset = (
-        next_offset.split(":", 1)[1] if next_offset != "done" else next_offset
+        strip_cursor(next_offset).split(":", 1)[1]
+        if next_offset != "done"
+        else next_offset
     )
 
     if (
@@ -51,7 +71,8 @@ def search_stickers(session, update, context, inline_query_request):
         and len(fuzzy_matching_stickers) == 0
         and update.inline_query.offset == ""
     ):
-        update.inline_query.answer(
+        context.answer(
+            update.inline_query,
             [],
             next_offset=next_offset,
             cache_time=1,
@@ -82,13 +103,17 @@ def search_stickers(session, update, context, inline_query_request):
             )
         )
 
-    update.inline_query.answer(
+    context.answer(
+        update.inline_query,
         results,
         next_offset=next_offset,
         cache_time=1,
         is_personal=True,
     )
 
+    # Start fetching the next results, before the user scrolls down
+    schedule_prefetch(context, next_offset)
+
 
 def search_sticker_sets(session, update, context, inline_query_request):
     """Query sticker sets."""
@@ -99,8 +124,11 @@ def search_sticker_sets(session, update, context, inline_query_request):
     next_offset = get_next_set_offset(context, matching_sets)
 
     inline_query_request.duration = duration
+    inline_query_request.truncated = context.truncated
     inline_query_request.next_offset = (
-        next_offset.split(":", 1)[1] if next_offset != "done" else next_offset
+        strip_cursor(next_offset).split(":", 1)[1]
+        if next_offset != "done"
+        else next_offset
     )
 
     # Stuff for debugging, since I need that all the time
@@ -111,10 +139,14 @@ def search_sticker_sets(session, update, context, inline_query_request):
         pprint.pprint(context.offset)
         pprint.pprint(matching_sets)
 
+    # Get the preview stickers of all sets at once
+    previews = get_sticker_set_previews(
+        session, [sticker_set.name for sticker_set, _ in matching_sets]
+    )
+
     # Create a result list of max 50 cached sticker objects
     results = []
-    for sticker_set in matching_sets:
-        sticker_set = sticker_set[0]
+    for sticker_set, _ in matching_sets:
         url = f"https://telegram.me/addstickers/{sticker_set.name}"
         input_message_content = InputTextMessageContent(url)
 
@@ -130,19 +162,20 @@ def search_sticker_sets(session, update, context, inline_query_request):
             )
         )
 
-        for index in range(0, 5):
-            if index < len(sticker_set.stickers):
-                sticker_id = sticker_set.stickers[index].id
-                file_id = sticker_set.stickers[index].file_id
-                results.append(
-                    InlineQueryResultCachedSticker(
-                        f"{context.inline_query_id}:{sticker_id}",
-                        sticker_file_id=file_id,
-                    )
+        for sticker_id, file_id in previews[sticker_set.name]:
+            results.append(
+                InlineQueryResultCachedSticker(
+                    f"{context.inline_query_id}:{sticker_id}",
+                    sticker_file_id=file_id,
                 )
+            )
 
-    update.inline_query.answer(
-        results, next_offset=next_offset, cache_time=1, is_personal=True
+    context.answer(
+        update.inline_query,
+        results,
+        next_offset=next_offset,
+        cache_time=1,
+        is_personal=True,
     )
 
 
@@ -171,21 +204,41 @@ def get_matching_stickers(session, context):
         matching_stickers = get_favorite_stickers(session, context)
     else:
         initialize_cache(context)
+        fuzzy_search = None
+        # Without the emoji index, emoji searches fall back to the normal search.
+        emoji_search = context.emoji and emoji_index.ready
         if context.fuzzy_offset is None:
             # Check if there are some cached stickers from the last request
             matching_stickers = get_cached_stickers(context)
+            if len(matching_stickers) < 50 and wait_for_prefetch(context):
+                matching_stickers = get_cached_stickers(context)
 
             if len(matching_stickers) == 0:
+                # We'll probably need fuzzy search for sparse tags. Start it right away.
+                if not emoji_search and should_search_concurrently(session, context):
+                    fuzzy_search = start_fuzzy_search(context)
+
                 # Get the actual stickers from the database
-                matching_stickers = get_strict_matching_stickers(session, context)
-                cache_stickers(context, matching_stickers)
+                matching_stickers = search_within_deadline(
+                    session, context, get_strict_matching_stickers
+                )
+                if matching_stickers is None:
+                    matching_stickers = []
+                else:
+                    cache_stickers(context, matching_stickers)
 
                 # Only take the first 50 results, since this is the limit for inline query responses
                 matching_stickers = matching_stickers[0:50]
 
         # Get the fuzzy matching sticker, if there are no more strictly matching stickers
         # We also know that we should be using fuzzy search, if the fuzzy offset is defined in the context
-        if context.fuzzy_offset is not None or len(matching_stickers) < 50:
+        # There's no time left for fuzzy search, if strict search already hit the deadline.
+        # Emojis don't have any similar tags, which is why they're never fuzzy searched.
+        if (
+            not context.truncated
+            and not emoji_search
+            and (context.fuzzy_offset is not None or len(matching_stickers) < 50)
+        ):
             # Set the switched_to_fuzzy flag in the context object.
             # This also sets a custom limit for fuzzy search (50-len(strict_matching))
             fuzzy_limit = 50
@@ -195,14 +248,39 @@ def get_matching_stickers(session, context):
 
             # Check if we can get some cached results from a previous request
             fuzzy_matching_stickers = get_cached_stickers(context, fuzzy=True)
+            if len(fuzzy_matching_stickers) < 50 and wait_for_prefetch(context):
+                fuzzy_matching_stickers = get_cached_stickers(context, fuzzy=True)
+
             if len(fuzzy_matching_stickers) == 0:
                 # We have no strict search results in the first search iteration.
                 # Directly jump to fuzzy search
-                fuzzy_matching_stickers = get_fuzzy_matching_stickers(session, context)
-                cache_stickers(context, fuzzy_matching_stickers, fuzzy=True)
+                if fuzzy_search is not None:
+                    fuzzy_matching_stickers = get_fuzzy_search_result(
+                        fuzzy_search,
+                        context,
+                        get_cached_strict_matching_stickers(context),
+                    )
+                elif has_time_for_fuzzy_search(context):
+                    fuzzy_matching_stickers = search_within_deadline(
+                        session, context, get_fuzzy_matching_stickers
+                    )
+                else:
+                    fuzzy_matching_stickers = None
 
-                # Only take the first 50 results, since this is the limit for inline query responses
-                fuzzy_matching_stickers = fuzzy_matching_stickers[0:fuzzy_limit]
+                if fuzzy_matching_stickers is None:
+                    # Fuzzy search would exceed the deadline.
+                    # Answer with the strict results we already have.
+                    context.truncated = True
+                    fuzzy_matching_stickers = []
+                else:
+                    cache_stickers(context, fuzzy_matching_stickers, fuzzy=True)
+
+                    # Only take the first 50 results, since this is the limit for inline query responses
+                    fuzzy_matching_stickers = fuzzy_matching_stickers[0:fuzzy_limit]
+
+        # We found enough strict stickers and don't need the fuzzy results.
+        if fuzzy_search is not None:
+            cancel_fuzzy_search(session, fuzzy_search)
 
     end = datetime.now()
 
@@ -227,8 +305,19 @@ def get_matching_sticker_sets(session, context):
     # Measure the db query time
     start = datetime.now()
 
-    # Get strict matching stickers
-    matching_stickers = get_strict_matching_sticker_sets(session, context)
+    # Check if the sets of this page have been cached by a previous request
+    initialize_cache(context)
+    matching_stickers = get_cached_sticker_sets(context)
+    if matching_stickers is None:
+        # Get strict matching sets
+        matching_stickers = search_within_deadline(
+            session, context, get_strict_matching_sticker_sets
+        )
+        if matching_stickers is None:
+            matching_stickers = []
+        else:
+            cache_sticker_sets(context, matching_stickers)
+            matching_stickers = get_cached_sticker_sets(context) or []
 
     end = datetime.now()
 
@@ -0,0 +1,94 @@
+"""Strict search results, which are shared between all users.
+
+Most of the strict score doesn't depend on the user. Only the usage score
+and the user's filter settings are personal.
+That's why the unpersonalized ranking of a search is cached once per set of
+tags and filter profile. Each user's usage score is then applied in python.
+"""
+
+import numpy
+
+from stickerfinder.caches import shared_result_cache
+
+from .scoring import get_usage_score, rank
+
+
+def get_shared_candidates(context):
+    """Get the cached candidates of a search.
+
+    Returns a tuple of the candidate rows and a flag, whether there are more
+    matching stickers than candidates. `None` is returned on a cache miss.
+    """
+    return shared_result_cache.get(get_cache_key(context))
+
+
+def cache_shared_candidates(context, candidates, truncated):
+    """Cache the candidates of a search for all users with the same filters."""
+    candidates = [tuple(candidate) for candidate in candidates]
+    shared_result_cache.put(get_cache_key(context), (candidates, truncated))
+
+    return candidates
+
+
+def rank_candidates(candidates, usages, offset, limit):
+    """Apply the usage score of the user and sort the candidates.
+
+    Each candidate consists of (id, file_id, file_unique_id, set name, score, key rank).
+    The key rank is the position of the candidate in the order of set name and file_unique_id.
+    `usages` maps the file_unique_ids of the user's used stickers to their usage count.
+    """
+    ranked = []
+    for candidate in candidates:
+        sticker_id, file_id, file_unique_id, name, score, _ = candidate
+        score = score + get_usage_score(usages.get(file_unique_id, 0))
+        ranked.append((sticker_id, file_id, file_unique_id, name, score))
+
+    # Equal decimal scores are equal floats, so the ties stay the same.
+    scores = numpy.array([float(candidate[4]) for candidate in ranked])
+    key_ranks = numpy.array([candidate[5] for candidate in candidates])
+
+    return [ranked[position] for position in rank(scores, key_ranks, offset, limit)]
+
+
+def may_reach_window(candidates, usages, end):
+    """Check whether a used sticker after the truncated candidates may rank in the window.
+
+    Stickers after the candidates score at most as much as the last candidate.
+    The usage score has to lift them at least to the unpersonalized score of the
+    candidate at the end of the window, since the usage score only raises that bound.
+    """
+    candidate_ids = set(candidate[2] for candidate in candidates)
+    max_usage = max(
+        (count for key, count in usages.items() if key not in candidate_ids),
+        default=0,
+    )
+    if max_usage == 0:
+        return False
+
+    last_score = candidates[-1][4]
+    window_score = candidates[end - 1][4]
+
+    return last_score + get_usage_score(max_usage) >= window_score
+
+
+def get_cache_key(context):
+    """Get the key of a search, which is shared by all users with the same filters."""
+    return (tuple(sorted(context.tags)), get_filter_profile(context))
+
+
+def get_filter_profile(context):
+    """Get the filters of a search, which result from the query and the user's settings."""
+    user = context.user
+
+    # Mirror the filters of `filter_search_docs`
+    if context.nsfw:
+        nsfw = True
+    else:
+        nsfw = False if user.nsfw is False else None
+
+    if context.furry:
+        furry = True
+    else:
+        furry = False if user.furry is False else None
+
+    return (context.animated, nsfw, furry, user.international, bool(user.deluxe))
@@ -0,0 +1,65 @@
+"""Look up tags that are similar to the search terms of a fuzzy search."""
+
+from sqlalchemy import func
+
+from stickerfinder.caches import tag_expansion_cache
+from stickerfinder.config import config
+from stickerfinder.models import Tag
+
+from .offload import run_cpu_bound
+from .trigram_index import trigram_index
+
+
+def get_similar_tags(session, terms, international, threshold, deferred=False):
+    """Get all tags that are similar to any of the terms.
+
+    Returns a list of (name, similarity) tuples, where similarity
+    is the greatest similarity of the tag to any of the terms.
+    International tags are only included for international users.
+    The trigram index of `deferred` searches is searched outside of the event loop.
+    """
+    similar_tags = {}
+    for term in terms:
+        for name, similarity, tag_international in get_similar_tags_of_term(
+            session, term, threshold, deferred
+        ):
+            if tag_international and not international:
+                continue
+
+            similar_tags[name] = max(similarity, similar_tags.get(name, 0))
+
+    return list(similar_tags.items())
+
+
+def get_similar_tags_of_term(session, term, threshold, deferred=False):
+    """Get all tags that are similar to a single term.
+
+    The result is shared between all users via the tag expansion cache.
+    Returns a list of (name, similarity, international) tuples.
+    """
+    use_cache = config["cache"]["tag_expansion_enabled"]
+    if use_cache:
+        similar_tags = tag_expansion_cache.get((term, threshold))
+        if similar_tags is not None:
+            return similar_tags
+
+    if config["mode"]["similar_tag_engine"] == "memory" and trigram_index.ready:
+        similar_tags = run_cpu_bound(
+            deferred, trigram_index.get_similar_tags_of_term, term, threshold
+        )
+    else:
+        similarity = func.similarity(Tag.name, term)
+        rows = (
+            session.query(Tag.name, similarity, Tag.international)
+            .filter(similarity >= threshold)
+            .all()
+        )
+        similar_tags = [
+            (name, float(similarity), international)
+            for name, similarity, international in rows
+        ]
+
+    if use_cache:
+        tag_expansion_cache.put((term, threshold), similar_tags)
+
+    return similar_tags
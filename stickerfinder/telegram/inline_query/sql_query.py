@@ -1,45 +1,129 @@
 """Query composition for inline search."""
 
+import copy
 from pprint import pprint
 
-from sqlalchemy import Numeric, and_, case, cast, func, or_
+from sqlalchemy import (
+    Float,
+    Integer,
+    Numeric,
+    String,
+    and_,
+    bindparam,
+    case,
+    cast,
+    column,
+    func,
+    literal,
+    or_,
+    true,
+    tuple_,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, array
 
 from stickerfinder.config import config
 from stickerfinder.db import greatest
-from stickerfinder.models import Sticker, StickerSet, StickerUsage, Tag, sticker_tag
+from stickerfinder.logic.usage import get_usage_counts, get_usages
+from stickerfinder.models import (
+    Sticker,
+    StickerSearchDoc,
+    StickerSet,
+    StickerUsage,
+    Tag,
+)
 
 from .cache import get_cached_strict_matching_stickers
+from .emoji_index import emoji_index
+from .favorites import cache_favorites, get_cached_favorites
+from .incremental import get_previous_search, merge_results, remember_search
+from .offload import run_cpu_bound
+from .scoring import (
+    CURSOR_EPSILON,
+    SET_SCORE,
+    TAG_SCORE,
+    TEXT_SCORE,
+    USAGE_SCORE,
+    rank_matches,
+)
+from .shared_cache import (
+    cache_shared_candidates,
+    get_filter_profile,
+    get_shared_candidates,
+    may_reach_window,
+    rank_candidates,
+)
+from .similar_tags import get_similar_tags
+from .statements import get_window_statement, statement_cache
+from .tag_index import tag_index
+from .trigram_index import trigram_index
+
+# Minimum trigram similarity of fuzzy matches
+FUZZY_THRESHOLD = 0.3
+
+# Cached usages of up to this many stickers are passed to the strict query as arrays
+MAX_USAGE_VALUES = 1000
 
 
 def get_favorite_stickers(session, context):
     """Get the most used stickers of a user."""
     limit = 50
+    if config["cache"]["favorites_enabled"]:
+        favorite_stickers = get_cached_favorites(context, context.offset, limit)
+        if favorite_stickers is not None:
+            return favorite_stickers
+
+        # Only the top favorites are cached. Pages after them are queried directly.
+        count = config["cache"]["favorites_count"]
+        if context.offset + limit <= count:
+            favorites = query_favorite_stickers(session, context, 0, count + 1)
+            favorites = cache_favorites(
+                context, favorites[:count], complete=len(favorites) <= count
+            )
+            favorite_stickers = favorites[context.offset : context.offset + limit]
+            return [favorite[:4] for favorite in favorite_stickers]
+
+    favorite_stickers = query_favorite_stickers(session, context, context.offset, limit)
+    return [favorite[:4] for favorite in favorite_stickers]
+
+
+def query_favorite_stickers(session, context, offset, limit):
+    """Query the most used stickers of a user.
+
+    Each favorite is a (sticker_id, file_id, file_unique_id, usage_count, updated_at) tuple.
+    """
+    if config["cache"]["usage_enabled"]:
+        return get_favorite_stickers_from_usages(session, context, offset, limit)
+
     favorite_stickers = (
         session.query(
-            Sticker.id,
-            Sticker.file_id,
-            Sticker.file_unique_id,
+            StickerSearchDoc.sticker_id,
+            StickerSearchDoc.file_id,
+            StickerSearchDoc.file_unique_id,
             StickerUsage.usage_count,
+            StickerUsage.updated_at,
+        )
+        .join(
+            StickerSearchDoc,
+            StickerUsage.sticker_file_unique_id == StickerSearchDoc.file_unique_id,
         )
-        .join(Sticker)
-        .join(Sticker.sticker_set)
-        .filter(StickerUsage.user == context.user)
-        .filter(Sticker.banned.is_(False))
-        .filter(StickerSet.banned.is_(False))
-        .filter(StickerSet.nsfw.is_(context.nsfw))
-        .filter(StickerSet.furry.is_(context.furry))
+        .filter(StickerUsage.user_id == context.user.id)
+        .filter(StickerSearchDoc.banned.is_(False))
+        .filter(StickerSearchDoc.nsfw.is_(context.nsfw))
+        .filter(StickerSearchDoc.furry.is_(context.furry))
     )
 
     # Animated stickers are included by default.
     # However we have to exclusively check for animated stickers, if a keyword is provided
     if context.animated:
-        favorite_stickers = favorite_stickers.filter(Sticker.animated.is_(True))
+        favorite_stickers = favorite_stickers.filter(
+            StickerSearchDoc.animated.is_(True)
+        )
 
     favorite_stickers = (
         favorite_stickers.order_by(
             StickerUsage.usage_count.desc(), StickerUsage.updated_at.desc()
         )
-        .offset(context.offset)
+        .offset(offset)
         .limit(limit)
         .all()
     )
@@ -47,18 +131,154 @@ def get_favorite_stickers(session, context):
     return favorite_stickers
 
 
+def get_favorite_stickers_from_usages(session, context, offset, limit):
+    """Get the most used stickers of a user from the cached usages.
+
+    Only the search documents of the used stickers are queried.
+    They're sorted the same way as in `query_favorite_stickers`.
+    """
+    usages = get_usages(session, context.user.id)
+    if len(usages) == 0:
+        return []
+
+    favorite_stickers = (
+        session.query(
+            StickerSearchDoc.sticker_id,
+            StickerSearchDoc.file_id,
+            StickerSearchDoc.file_unique_id,
+        )
+        .filter(StickerSearchDoc.file_unique_id.in_(list(usages.keys())))
+        .filter(StickerSearchDoc.banned.is_(False))
+        .filter(StickerSearchDoc.nsfw.is_(context.nsfw))
+        .filter(StickerSearchDoc.furry.is_(context.furry))
+    )
+
+    if context.animated:
+        favorite_stickers = favorite_stickers.filter(
+            StickerSearchDoc.animated.is_(True)
+        )
+
+    favorite_stickers = [
+        (sticker_id, file_id, file_unique_id, *usages[file_unique_id])
+        for sticker_id, file_id, file_unique_id in favorite_stickers.all()
+    ]
+    favorite_stickers.sort(
+        key=lambda sticker: usages[sticker[2]],
+        reverse=True,
+    )
+
+    return favorite_stickers[offset : offset + limit]
+
+
 def get_strict_matching_stickers(session, context):
     """Query all strictly matching stickers for given tags."""
-    matching_stickers = get_strict_matching_query(session, context)
-
     limit = config["mode"]["inline_cache_size"]
-    matching_stickers = matching_stickers.offset(context.offset).limit(limit)
+
+    # Answer pure emoji searches from the emoji index, if it's enabled and already built.
+    if context.emoji and emoji_index.ready:
+        return emoji_index.get_matching_stickers(
+            session, context, context.offset, limit
+        )
+
+    # Only the first window of a search can be computed incrementally.
+    incremental = config["mode"]["incremental_search"]
+    if not incremental or context.offset != 0 or context.cursor is not None:
+        return search_strict_matching_stickers(session, context, limit)
+
+    matching_stickers = get_incremental_matching_stickers(session, context, limit)
+    if matching_stickers is None:
+        matching_stickers = search_strict_matching_stickers(session, context, limit)
+
+    # Only complete results can be extended by the user's next search.
+    if len(matching_stickers) < limit:
+        remember_search(context, matching_stickers)
+
+    return matching_stickers
+
+
+def get_incremental_matching_stickers(session, context, limit):
+    """Compute the strict results from the user's previous search.
+
+    Returns `None`, if the current search doesn't extend the previous one or
+    if there are too many stickers matching the added tags.
+    """
+    previous_search = get_previous_search(context)
+    if previous_search is None:
+        return None
+
+    results, added_tags = previous_search
+    added_context = copy.copy(context)
+    added_context.tags = added_tags
+    added_results = get_strict_score_query(session, added_context)
+    added_results = added_results.limit(limit + 1).all()
+    if len(added_results) > limit:
+        return None
+
+    usages = get_usage_counts(session, context.user.id)
+    file_unique_ids = {result[2] for result in results + added_results}
+    key_ranks = get_key_ranks(session, file_unique_ids)
+    matching_stickers = run_cpu_bound(
+        context.deferred, merge_results, results, added_results, usages, key_ranks
+    )
+
+    if config["logging"]["debug"]:
+        pprint(f"Incremental results for added tags {added_tags}:")
+        pprint(matching_stickers)
+
+    return matching_stickers[:limit]
+
+
+def search_strict_matching_stickers(session, context, limit):
+    """Search all strictly matching stickers from the current offset on."""
+    # Answer from the in-memory tag index, if it's enabled and already built.
+    if config["mode"]["search_engine"] == "memory" and tag_index.ready:
+        return tag_index.get_strict_matching_stickers(
+            session, context, context.offset, limit
+        )
+
+    # Only fetch the matches and rank them in python.
+    if config["mode"]["search_engine"] == "numpy":
+        return get_ranked_strict_matching_stickers(session, context, limit)
+
+    # Use the candidates, which are shared between all users.
+    if config["cache"]["shared_results_enabled"]:
+        matching_stickers = get_shared_strict_matching_stickers(
+            session, context, context.offset, limit
+        )
+        if matching_stickers is not None:
+            return matching_stickers
+
+    # Continue right after the last result, if we know it. Otherwise fall back to the offset.
+    cursor = get_sticker_cursor(session, context)
+    usage = get_usage_params(session, context)
+
+    params = {**get_tag_params(context), **usage[1], "limit": limit}
+    if cursor is None:
+        params["offset"] = context.offset
+    else:
+        params.update(get_cursor_params(cursor))
+
+    # The statement only needs to be built once for each shape of search.
+    shape = (
+        "strict",
+        len(context.tags),
+        get_filter_profile(context),
+        usage[0],
+        cursor is None,
+    )
+    statement = statement_cache.get(
+        shape,
+        lambda: get_window_statement(
+            get_strict_matching_query(session, context, cursor=cursor, usage=usage),
+            cursor is None,
+        ),
+    )
 
     #    if config['logging']['debug']:
-    #        print(matching_stickers.statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
-    #        print(matching_stickers.statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}).params)
+    #        print(statement.compile(dialect=postgresql.dialect()))
+    #        print(params)
 
-    matching_stickers = matching_stickers.all()
+    matching_stickers = session.execute(statement, params).all()
 
     if config["logging"]["debug"]:
         pprint("Strict results:")
@@ -67,6 +287,27 @@ def get_strict_matching_stickers(session, context):
     return matching_stickers
 
 
+def get_ranked_strict_matching_stickers(session, context, limit):
+    """Get the strictly matching stickers, which are scored and ranked in python."""
+    shape = ("strict_matches", len(context.tags), get_filter_profile(context))
+    statement = statement_cache.get(
+        shape, lambda: get_strict_match_query(session, context).statement
+    )
+    matches = session.execute(statement, get_tag_params(context)).all()
+
+    usages = get_usage_counts(session, context.user.id)
+    cursor = get_sticker_cursor(session, context)
+    matching_stickers = rank_matches(
+        matches, len(context.tags), usages, context.offset, limit, cursor
+    )
+
+    if config["logging"]["debug"]:
+        pprint("Ranked strict results:")
+        pprint(matching_stickers)
+
+    return matching_stickers
+
+
 def get_fuzzy_matching_stickers(session, context):
     """Get fuzzy matching stickers."""
 
@@ -79,80 +320,437 @@ def get_fuzzy_matching_stickers(session, context):
     if context.limit is not None:
         limit += context.limit
 
-    matching_stickers = (
-        get_fuzzy_matching_query(session, context)
-        .offset(context.fuzzy_offset)
-        .limit(limit)
+    # The cursor only belongs to fuzzy search, if we were already fuzzy searching.
+    cursor = None
+    if not context.switched_to_fuzzy:
+        cursor = get_sticker_cursor(session, context)
+
+    fuzzy_params = get_fuzzy_params(session, context)
+    similar_tag_kind, params = fuzzy_params
+    params = {**params, "limit": limit}
+    if cursor is None:
+        params["offset"] = context.fuzzy_offset
+    else:
+        params.update(get_cursor_params(cursor))
+
+    # The statement only needs to be built once for each shape of search.
+    shape = (
+        "fuzzy",
+        len(context.tags),
+        get_filter_profile(context),
+        similar_tag_kind,
+        cursor is None,
+    )
+    statement = statement_cache.get(
+        shape,
+        lambda: get_window_statement(
+            get_fuzzy_matching_query(
+                session, context, cursor=cursor, fuzzy_params=fuzzy_params
+            ),
+            cursor is None,
+        ),
     )
 
     #    if config['logging']['debug']:
-    #        print(matching_stickers.statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
-    #        print(matching_stickers.statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}).params)
+    #        print(statement.compile(dialect=postgresql.dialect()))
+    #        print(params)
 
-    matching_stickers = matching_stickers.all()
+    matching_stickers = session.execute(statement, params).all()
     if config["logging"]["debug"]:
         pprint("Fuzzy results:")
         pprint(matching_stickers)
     return matching_stickers
 
 
+def get_shared_strict_matching_stickers(session, context, offset, limit):
+    """Get the strictly matching stickers from the shared candidates.
+
+    Returns `None`, if the requested window isn't covered by the candidates.
+    """
+    cached = get_shared_candidates(context)
+    if cached is None:
+        candidate_limit = config["cache"]["shared_results_candidates"]
+        rows = get_strict_candidate_query(session, context).limit(candidate_limit + 1)
+        rows = rows.all()
+        truncated = len(rows) > candidate_limit
+        candidates = cache_shared_candidates(context, rows[:candidate_limit], truncated)
+    else:
+        candidates, truncated = cached
+
+    # Stickers after the candidates could be pushed into the window by the user's usage score.
+    # Those aren't known, which is why we need the full query in this case.
+    if truncated and offset + limit > len(candidates):
+        return None
+
+    usages = get_usage_counts(session, context.user.id)
+    if truncated and may_reach_window(candidates, usages, offset + limit):
+        return None
+
+    return run_cpu_bound(
+        context.deferred, rank_candidates, candidates, usages, offset, limit
+    )
+
+
 def get_strict_matching_sticker_sets(session, context):
-    """Get all sticker sets by accumulated score for strict search."""
+    """Get all sticker sets by accumulated score for strict search.
+
+    Several pages of sets are fetched at once, which are then cached for the next requests.
+    """
+    limit = 8 * config["mode"]["inline_set_cache_pages"]
     strict_subquery = get_strict_matching_query(
         session, context, sticker_set=True
     ).subquery("strict_sticker_subq")
 
     score = func.sum(strict_subquery.c.score_with_usage).label("score")
+    # The hash of the set name is used as tie-breaker (see `get_sticker_set_key`).
+    set_key = func.left(func.md5(StickerSet.name), 16)
     matching_sets = (
         session.query(StickerSet, score)
         .join(strict_subquery, StickerSet.name == strict_subquery.c.name)
         .group_by(StickerSet)
-        .order_by(score.desc())
-        .limit(8)
-        .offset(context.offset)
-        .all()
     )
 
+    # Continue right after the last set, if we know it. Otherwise fall back to the offset.
+    if context.cursor is not None:
+        cursor_score, cursor_key = context.cursor
+        matching_sets = matching_sets.having(
+            get_cursor_condition(score, [set_key], (cursor_score, [cursor_key]))
+        )
+    else:
+        matching_sets = matching_sets.offset(context.offset)
+
+    matching_sets = matching_sets.order_by(score.desc(), set_key).limit(limit).all()
+
     return matching_sets
 
 
-def get_strict_matching_query(session, context, sticker_set=False):
+def get_sticker_set_previews(session, names):
+    """Get the first five stickers of each sticker set in a single query.
+
+    The stickers are in the same order as `StickerSet.stickers`.
+    Returns a dict of set names to a list of (sticker_id, file_id) tuples.
+    """
+    if len(names) == 0:
+        return {}
+
+    position = func.row_number().over(
+        partition_by=Sticker.sticker_set_name,
+        order_by=Sticker.file_unique_id.desc(),
+    )
+    stickers = (
+        session.query(
+            Sticker.sticker_set_name,
+            Sticker.id,
+            Sticker.file_id,
+            position.label("position"),
+        )
+        .filter(Sticker.sticker_set_name.in_(names))
+        .subquery("stickers")
+    )
+    previews = (
+        session.query(stickers.c.sticker_set_name, stickers.c.id, stickers.c.file_id)
+        .filter(stickers.c.position <= 5)
+        .order_by(stickers.c.sticker_set_name, stickers.c.position)
+        .all()
+    )
+
+    previews_by_set = {name: [] for name in names}
+    for name, sticker_id, file_id in previews:
+        previews_by_set[name].append((sticker_id, file_id))
+
+    return previews_by_set
+
+
+def get_sticker_cursor(session, context):
+    """Get the sort key of the sticker in the offset cursor.
+
+    Returns a (score, [set_name, file_unique_id]) tuple or `None`,
+    if there's no cursor or the sticker can no longer be found.
+    """
+    if context.cursor is None:
+        return None
+
+    score, sticker_id = context.cursor
+    doc = (
+        session.query(StickerSearchDoc.set_name, StickerSearchDoc.file_unique_id)
+        .filter(StickerSearchDoc.sticker_id == int(sticker_id))
+        .one_or_none()
+    )
+    if doc is None:
+        return None
+
+    return score, [doc.set_name, doc.file_unique_id]
+
+
+def get_cursor_condition(score, keys, cursor):
+    """Get the condition for all results after the cursor.
+
+    The results are ordered by score descending and afterwards by the keys ascending.
+    Scores are compared with a small epsilon, since the score in the cursor is rounded.
+    """
+    params = get_cursor_params(cursor)
+    cursor_keys = [
+        bindparam(f"cursor_key_{position}", params[f"cursor_key_{position}"])
+        for position in range(len(keys))
+    ]
+    return or_(
+        score < bindparam("cursor_min", params["cursor_min"]),
+        and_(
+            score <= bindparam("cursor_max", params["cursor_max"]),
+            tuple_(*keys) > tuple_(*cursor_keys),
+        ),
+    )
+
+
+def get_cursor_params(cursor):
+    """Get the bind parameters of the cursor condition."""
+    cursor_score, cursor_keys = cursor
+    params = {
+        "cursor_min": cursor_score - CURSOR_EPSILON,
+        "cursor_max": cursor_score + CURSOR_EPSILON,
+    }
+    for position, key in enumerate(cursor_keys):
+        params[f"cursor_key_{position}"] = key
+
+    return params
+
+
+def filter_search_docs(query, context):
+    """Filter search documents by the sticker set flags and the user's settings."""
+    user = context.user
+
+    query = (
+        query.filter(StickerSearchDoc.deleted.is_(False))
+        .filter(StickerSearchDoc.banned.is_(False))
+        .filter(StickerSearchDoc.reviewed.is_(True))
+    )
+
+    # Handle special flags
+    if context.animated:
+        query = query.filter(StickerSearchDoc.animated.is_(True))
+
+    if context.nsfw:
+        query = query.filter(StickerSearchDoc.nsfw.is_(True))
+    elif user.nsfw is False:
+        query = query.filter(StickerSearchDoc.nsfw.is_(False))
+
+    if context.furry:
+        query = query.filter(StickerSearchDoc.furry.is_(True))
+    elif user.furry is False:
+        query = query.filter(StickerSearchDoc.furry.is_(False))
+
+    # Only query default language sticker sets
+    if user.international is False:
+        query = query.filter(StickerSearchDoc.international.is_(False))
+
+    # Only query deluxe sticker sets
+    if user.deluxe:
+        query = query.filter(StickerSearchDoc.deluxe.is_(True))
+
+    return query
+
+
+def get_strict_matching_query(
+    session, context, sticker_set=False, cursor=None, usage=None
+):
     """Get the query for strict tag matching.
 
     The stickers are sorted by score, StickerSet.name and Sticker.file_unique_id in this respective order.
 
-    Score is calculated like this:
+    Score is calculated like this (see `scoring` for the weights):
     + 1 for each exactly matching tag
     + 0.75 if a tag is contained in StickerSet name or title
     + 0.4 if tag is contained in OCR text
     + 0.05 for each usage of a specific sticker (Only applied to stickers that match at least one of the above criteria)
+
+    If a cursor is given, only stickers after the cursor are returned.
+    The usage join can be passed, if it has already been determined (see `get_usage_params`).
+    """
+    if usage is None:
+        usage = get_usage_params(session, context)
+
+    matching_stickers = get_strict_score_query(session, context)
+    matching_stickers = matching_stickers.subquery("matching_stickers")
+
+    # We got all stickers that are matching to the tags/sticker set names, but now we want to include the usage pattern of the user
+    # into the search. For this purpose we join StickerUsage on all matching stickers and include the count into the score
+    # Afterwards we order by the newly calculated count.
+    #
+    # We also order by the name of the set and the file_unique_id to get a deterministic sorting in the search.
+    usage_join = get_usage_join(usage, matching_stickers.c.file_unique_id)
+    if usage_join is None:
+        score_with_usage = matching_stickers.c.score
+    else:
+        usage_count, usage_target, usage_condition = usage_join
+        score_with_usage = cast(func.coalesce(usage_count, 0), Numeric) * USAGE_SCORE
+        score_with_usage = score_with_usage + matching_stickers.c.score
+    score_with_usage = score_with_usage.label("score_with_usage")
+    matching_stickers_with_usage = session.query(
+        matching_stickers.c.id,
+        matching_stickers.c.file_id,
+        matching_stickers.c.file_unique_id,
+        matching_stickers.c.name,
+        score_with_usage,
+    )
+    if usage_join is not None:
+        matching_stickers_with_usage = matching_stickers_with_usage.outerjoin(
+            usage_target, usage_condition
+        )
+
+    if cursor is not None:
+        matching_stickers_with_usage = matching_stickers_with_usage.filter(
+            get_cursor_condition(
+                score_with_usage,
+                [matching_stickers.c.name, matching_stickers.c.file_unique_id],
+                cursor,
+            )
+        )
+
+    matching_stickers_with_usage = matching_stickers_with_usage.order_by(
+        score_with_usage.desc(),
+        matching_stickers.c.name,
+        matching_stickers.c.file_unique_id,
+    )
+
+    return matching_stickers_with_usage
+
+
+def get_usage_params(session, context):
+    """Determine how the usages of the current user are joined in strict search.
+
+    Returns a tuple of the kind of usage join and its bind parameters:
+    - "table": The `sticker_usage` table is joined.
+    - "array": The cached usages of the user are passed as arrays.
+    - `None`: The user didn't use any stickers yet, so nothing needs to be joined.
     """
     user = context.user
-    tags = context.tags
-    animated = context.animated
-    nsfw = context.nsfw
-    furry = context.furry
-
-    tag_count = func.count(sticker_tag.c.tag_name).label("tag_count")
-    tag_subq = (
-        session.query(sticker_tag.c.sticker_file_unique_id, tag_count)
-        .join(Tag, sticker_tag.c.tag_name == Tag.name)
-        .filter(
-            or_(Tag.international == user.international, Tag.international.is_(False))
+    if config["cache"]["usage_enabled"]:
+        usages = get_usages(session, user.id)
+        if len(usages) == 0:
+            return None, {}
+
+        # Huge arrays are slower than the indexed usage table.
+        if len(usages) <= MAX_USAGE_VALUES:
+            return "array", {
+                "usage_file_unique_ids": list(usages.keys()),
+                "usage_counts": [usage_count for usage_count, _ in usages.values()],
+            }
+
+    return "table", {"user_id": user.id}
+
+
+def get_usage_join(usage, file_unique_id):
+    """Get the usage counts of the current user for the strict matching query.
+
+    Returns a (usage_count, join target, join condition) tuple or `None`,
+    if there's nothing to join.
+    """
+    usage_kind, params = usage
+    if usage_kind is None:
+        return None
+
+    if usage_kind == "array":
+        usages = (
+            func.unnest(
+                bindparam(
+                    "usage_file_unique_ids",
+                    params["usage_file_unique_ids"],
+                    type_=ARRAY(String),
+                ),
+                bindparam("usage_counts", params["usage_counts"], type_=ARRAY(Integer)),
+            )
+            .table_valued(
+                column("file_unique_id", String),
+                column("usage_count", Integer),
+            )
+            .render_derived(name="usages")
+        )
+        return (
+            usages.c.usage_count,
+            usages,
+            file_unique_id == usages.c.file_unique_id,
         )
-        .filter(sticker_tag.c.tag_name.in_(tags))
-        .group_by(sticker_tag.c.sticker_file_unique_id)
-        .subquery("tag_subq")
+
+    return (
+        StickerUsage.usage_count,
+        StickerUsage,
+        and_(
+            file_unique_id == StickerUsage.sticker_file_unique_id,
+            StickerUsage.user_id == bindparam("user_id", params["user_id"]),
+        ),
+    )
+
+
+def get_strict_candidate_query(session, context):
+    """Get the query for the unpersonalized strict candidates.
+
+    Additionally to the strict score, the position of each sticker in the order of
+    set name and file_unique_id is returned as key rank.
+    """
+    matching_stickers = get_strict_score_query(session, context).subquery(
+        "matching_stickers"
+    )
+    key_rank = func.row_number().over(
+        order_by=(matching_stickers.c.name, matching_stickers.c.file_unique_id)
+    )
+    return session.query(
+        matching_stickers.c.id,
+        matching_stickers.c.file_id,
+        matching_stickers.c.file_unique_id,
+        matching_stickers.c.name,
+        matching_stickers.c.score,
+        key_rank.label("key_rank"),
+    ).order_by(
+        matching_stickers.c.score.desc(),
+        matching_stickers.c.name,
+        matching_stickers.c.file_unique_id,
     )
 
+
+def get_key_ranks(session, file_unique_ids):
+    """Get the position of each sticker in the order of set name and file_unique_id.
+
+    The names are compared with the collation of the database, like in all sql queries.
+    Returns a dict of file_unique_id to key rank.
+    """
+    key_rank = func.row_number().over(
+        order_by=(StickerSearchDoc.set_name, StickerSearchDoc.file_unique_id)
+    )
+    rows = (
+        session.query(StickerSearchDoc.file_unique_id, key_rank)
+        .filter(StickerSearchDoc.file_unique_id.in_(file_unique_ids))
+        .all()
+    )
+
+    return dict(rows)
+
+
+def get_strict_score_query(session, context):
+    """Get the query for the strict score of all matching stickers.
+
+    This is the user independent part of the strict matching query without the usage score.
+    Only the user's settings are applied.
+    """
+    user = context.user
+    tags, patterns = get_tag_bindparams(context)
+
+    # Condition for exactly matching tags.
+    # International tags are only searched by international users.
+    tag_conditions = []
+    for tag in tags:
+        condition = StickerSearchDoc.tags.any(tag)
+        if user.international:
+            condition = or_(condition, StickerSearchDoc.international_tags.any(tag))
+        tag_conditions.append(case([(condition, TAG_SCORE)], else_=0))
+
     # Condition for matching sticker set names and titles
     set_conditions = []
-    for tag in tags:
+    for pattern in patterns:
         set_conditions.append(
             case(
                 [
-                    (StickerSet.name.like(f"%{tag}%"), 0.75),
-                    (StickerSet.title.like(f"%{tag}%"), 0.75),
+                    (StickerSearchDoc.set_name.like(pattern), SET_SCORE),
+                    (StickerSearchDoc.set_title.like(pattern), SET_SCORE),
                 ],
                 else_=0,
             )
@@ -160,94 +758,128 @@ def get_strict_matching_query(session, context, sticker_set=False):
 
     # Condition for matching sticker text
     text_conditions = []
-    for tag in tags:
-        text_conditions.append(case([(Sticker.text.like(f"%{tag}%"), 0.40)], else_=0))
+    for pattern in patterns:
+        text_conditions.append(
+            case([(StickerSearchDoc.text.like(pattern), TEXT_SCORE)], else_=0)
+        )
 
     # Compute the matching tags score for all stickers
-    score = cast(func.coalesce(tag_subq.c.tag_count, 0), Numeric)
+    score = cast(sum(tag_conditions[1:], tag_conditions[0]), Numeric)
     for condition in set_conditions + text_conditions:
         score = score + condition
     score = score.label("score")
 
-    # Query the whole sticker set in case we actually want to query sticker sets
     matching_stickers = session.query(
-        Sticker.id, Sticker.file_id, Sticker.file_unique_id, StickerSet.name, score
-    )
+        StickerSearchDoc.sticker_id.label("id"),
+        StickerSearchDoc.file_id,
+        StickerSearchDoc.file_unique_id,
+        StickerSearchDoc.set_name.label("name"),
+        score,
+    ).filter(score > 0)
 
-    # Compute the score for all stickers and filter nsfw stuff
-    matching_stickers = (
-        matching_stickers.outerjoin(
-            tag_subq, Sticker.file_unique_id == tag_subq.c.sticker_file_unique_id
+    # Filter nsfw stuff and apply the user's settings
+    matching_stickers = filter_search_docs(matching_stickers, context)
+
+    return matching_stickers
+
+
+def get_strict_match_query(session, context):
+    """Get the query for all strictly matching stickers without their score.
+
+    Instead of the score, the flags of each kind of match are returned for every term:
+    Whether a tag matches exactly, whether the term is contained in the set name or title
+    and whether it's contained in the text. See `scoring` for the ranking.
+    Ties are ranked in python by the position of each sticker in the order of
+    set name and file_unique_id, which is returned as key rank.
+    """
+    user = context.user
+    tags, patterns = get_tag_bindparams(context)
+
+    # International tags are only searched by international users.
+    tag_matches = []
+    for tag in tags:
+        condition = StickerSearchDoc.tags.any(tag)
+        if user.international:
+            condition = or_(condition, StickerSearchDoc.international_tags.any(tag))
+        tag_matches.append(condition)
+
+    set_matches = [
+        or_(
+            StickerSearchDoc.set_name.like(pattern),
+            StickerSearchDoc.set_title.like(pattern),
         )
-        .join(Sticker.sticker_set)
-        .filter(Sticker.banned.is_(False))
-        .filter(StickerSet.deleted.is_(False))
-        .filter(StickerSet.banned.is_(False))
-        .filter(StickerSet.reviewed.is_(True))
-        .filter(score > 0)
+        for pattern in patterns
+    ]
+    text_matches = [StickerSearchDoc.text.like(pattern) for pattern in patterns]
+
+    matches = tag_matches + set_matches + text_matches
+    key_rank = func.row_number().over(
+        order_by=(StickerSearchDoc.set_name, StickerSearchDoc.file_unique_id)
     )
+    matching_stickers = session.query(
+        StickerSearchDoc.sticker_id.label("id"),
+        StickerSearchDoc.file_id,
+        StickerSearchDoc.file_unique_id,
+        StickerSearchDoc.set_name.label("name"),
+        key_rank.label("key_rank"),
+        *[match.label(f"match_{position}") for position, match in enumerate(matches)],
+    ).filter(or_(*matches))
 
-    # Handle special flags
-    if animated:
-        matching_stickers = matching_stickers.filter(Sticker.animated.is_(True))
+    # Filter nsfw stuff and apply the user's settings
+    matching_stickers = filter_search_docs(matching_stickers, context)
 
-    if nsfw:
-        matching_stickers = matching_stickers.filter(StickerSet.nsfw.is_(True))
-    elif user.nsfw is False:
-        matching_stickers = matching_stickers.filter(StickerSet.nsfw.is_(False))
+    return matching_stickers
 
-    if furry:
-        matching_stickers = matching_stickers.filter(StickerSet.furry.is_(True))
-    elif user.furry is False:
-        matching_stickers = matching_stickers.filter(StickerSet.furry.is_(False))
 
-    # Only query default language
-    if user.international is False:
-        matching_stickers = matching_stickers.filter(
-            StickerSet.international.is_(False)
+def get_tag_params(context):
+    """Get the bind parameters of the search terms.
+
+    Each term is bound on its own for exact and similarity matching,
+    as pattern for LIKE matching and all terms together as an array.
+    """
+    params = {"tags": list(context.tags)}
+    for position, tag in enumerate(context.tags):
+        params[f"tag_{position}"] = tag
+        params[f"tag_pattern_{position}"] = f"%{tag}%"
+
+    return params
+
+
+def get_tag_bindparams(context):
+    """Get the bind parameters of all search terms and their LIKE patterns."""
+    params = get_tag_params(context)
+    tags = []
+    patterns = []
+    for position in range(len(context.tags)):
+        tags.append(bindparam(f"tag_{position}", params[f"tag_{position}"]))
+        patterns.append(
+            bindparam(f"tag_pattern_{position}", params[f"tag_pattern_{position}"])
         )
 
-    # Only query deluxe
-    if user.deluxe:
-        matching_stickers = matching_stickers.filter(StickerSet.deluxe.is_(True))
+    return tags, patterns
 
-    matching_stickers = matching_stickers.subquery("matching_stickers")
 
-    # We got all stickers that are matching to the tags/sticker set names, but now we want to include the usage pattern of the user
-    # into the search. For this purpose we join StickerUsage on all matching stickers and include the count into the score
-    # Afterwards we order by the newly calculated count.
-    #
-    # We also order by the name of the set and the file_unique_id to get a deterministic sorting in the search.
-    score_with_usage = cast(func.coalesce(StickerUsage.usage_count, 0), Numeric) * 0.05
-    score_with_usage = score_with_usage + matching_stickers.c.score
-    score_with_usage = score_with_usage.label("score_with_usage")
-    matching_stickers_with_usage = (
-        session.query(
-            matching_stickers.c.id,
-            matching_stickers.c.file_id,
-            matching_stickers.c.file_unique_id,
-            matching_stickers.c.name,
-            score_with_usage,
-        )
-        .outerjoin(
-            StickerUsage,
-            and_(
-                matching_stickers.c.file_unique_id
-                == StickerUsage.sticker_file_unique_id,
-                StickerUsage.user_id == user.id,
-            ),
-        )
-        .order_by(
-            score_with_usage.desc(),
-            matching_stickers.c.name,
-            matching_stickers.c.file_unique_id,
-        )
-    )
+def get_fuzzy_params(session, context, strict_file_unique_ids=None):
+    """Get the kind of similar tag query and all bind parameters of the fuzzy query.
 
-    return matching_stickers_with_usage
+    The strictly matching stickers are taken from the inline query cache,
+    unless they're explicitly passed.
+    """
+    similar_tag_kind, params = get_similar_tag_params(session, context)
+    params.update(get_tag_params(context))
+
+    # Get all strictly matched stickers from the inline query cache.
+    # This way we avoid having to issue the strict query again.
+    if strict_file_unique_ids is None:
+        strict_file_unique_ids = get_cached_strict_matching_stickers(context)
+    params["strict_file_unique_ids"] = list(strict_file_unique_ids)
+
+    return similar_tag_kind, params
 
 
-def get_fuzzy_matching_query(session, context):
+def get_fuzzy_matching_query(
+    session, context, cursor=None, strict_file_unique_ids=None, fuzzy_params=None
+):
     """Get the query for fuzzy tag matching.
 
     All stickers that have been found in strict search are excluded via left outer join.
@@ -257,160 +889,223 @@ def get_fuzzy_matching_query(session, context):
     + 'similarity_value' (0-1) for each similar tags
     + 'similarity_value' (0-1) 0.75 if a similar tag is contained in StickerSet name or title
     + 0.3 if text similar to a tag found in OCR text
+
+    If a cursor is given, only stickers after the cursor are returned.
+    The strictly matching stickers are taken from the inline query cache,
+    unless they're explicitly passed.
+    The parameters can be passed, if they have already been determined (see `get_fuzzy_params`).
     """
     user = context.user
-    tags = context.tags
-    animated = context.animated
-    nsfw = context.nsfw
-    furry = context.furry
+    tags, _ = get_tag_bindparams(context)
+    threshold = FUZZY_THRESHOLD
 
-    threshold = 0.3
-    # Create a query for each tag, which fuzzy matches all tags and computes the distance
-    # Todo:
-    # 1. Fuzzy check on tag table
-    # 2. Join with similarity sum on sticker
-    similarities = []
-    threshold_check = []
-    for tag in tags:
-        similarities.append(func.similarity(Tag.name, tag))
-        threshold_check.append(func.similarity(Tag.name, tag) >= threshold)
+    if fuzzy_params is None:
+        fuzzy_params = get_fuzzy_params(session, context, strict_file_unique_ids)
+    similar_tag_kind, params = fuzzy_params
 
-    tag_query = (
-        session.query(
-            Tag.name,
-            greatest(*similarities).label("tag_similarity"),
-        )
-        .filter(or_(*threshold_check))
-        .filter(
-            or_(Tag.international == user.international, Tag.international.is_(False))
-        )
-        .group_by(Tag.name)
-        .subquery("tag_query")
-    )
+    tag_query = get_similar_tags_query(session, context, similar_tag_kind, params)
 
     # Get all stickers which match a tag, together with the accumulated score of the fuzzy matched tags.
-    tag_score = func.avg(tag_query.c.tag_similarity).label("tag_score")
-    tag_score_subq = (
-        session.query(sticker_tag.c.sticker_file_unique_id, tag_score)
-        .join(tag_query, sticker_tag.c.tag_name == tag_query.c.name)
-        .group_by(sticker_tag.c.sticker_file_unique_id)
-        .subquery("tag_score_subq")
-    )
-
-    # Condition for matching sticker set names and titles
-    # Create a subquery which get's the greatest similarity for name and title
-    # Default to 0 if no element is found
-    sticker_set_score = []
-    sticker_set_subqs = []
-    for tag in tags:
-        set_score_subq = (
-            session.query(
-                greatest(
-                    func.similarity(StickerSet.name, tag),
-                    func.similarity(StickerSet.title, tag),
-                ).label("set_score"),
-                StickerSet.name,
-            )
-            .filter(
-                or_(
-                    func.similarity(StickerSet.name, tag) >= threshold,
-                    func.similarity(StickerSet.title, tag) >= threshold,
-                )
+    # International tags are only part of the tag query for international users.
+    tag_score_subq = None
+    if tag_query is not None:
+        tag_condition = StickerSearchDoc.tags.contains(array([tag_query.c.name]))
+        if user.international:
+            tag_condition = or_(
+                tag_condition,
+                StickerSearchDoc.international_tags.contains(array([tag_query.c.name])),
             )
-            .filter(StickerSet.deleted.is_(False))
-            .filter(StickerSet.banned.is_(False))
-            .filter(StickerSet.reviewed.is_(True))
-        )
 
-        if nsfw:
-            set_score_subq = set_score_subq.filter(StickerSet.nsfw.is_(True))
-        elif user.nsfw is False:
-            set_score_subq = set_score_subq.filter(StickerSet.nsfw.is_(False))
+        tag_score = func.avg(tag_query.c.tag_similarity).label("tag_score")
+        tag_score_subq = session.query(StickerSearchDoc.file_unique_id, tag_score).join(
+            tag_query, tag_condition
+        )
 
-        if furry:
-            set_score_subq = set_score_subq.filter(StickerSet.furry.is_(True))
-        elif user.furry is False:
-            set_score_subq = set_score_subq.filter(StickerSet.furry.is_(False))
+        # If we already know the similar tags, only look at documents that contain any of them.
+        if similar_tag_kind == "array":
+            names = bindparam(
+                "similar_tag_names", params["similar_tag_names"], type_=ARRAY(String)
+            )
+            name_filter = StickerSearchDoc.tags.overlap(names)
+            if user.international:
+                name_filter = or_(
+                    name_filter, StickerSearchDoc.international_tags.overlap(names)
+                )
+            tag_score_subq = tag_score_subq.filter(name_filter)
 
-        set_score_subq = set_score_subq.subquery()
+        tag_score_subq = tag_score_subq.group_by(
+            StickerSearchDoc.file_unique_id
+        ).subquery("tag_score_subq")
 
-        sticker_set_subqs.append(set_score_subq)
-        sticker_set_score.append(func.coalesce(set_score_subq.c.set_score, 0))
+    # Condition for matching sticker set names and titles
+    # All search terms are checked against each sticker set in a single pass over the
+    # unnested term array. The score of a set is the sum of the greatest similarity of
+    # name and title for each term. Defaults to 0 if no set is found.
+    # The sticker set flags are checked on the documents in the outer query.
+    terms = (
+        func.unnest(bindparam("tags", params["tags"], type_=ARRAY(String)))
+        .table_valued("term")
+        .render_derived(name="terms")
+    )
+    name_similarity = func.similarity(StickerSet.name, terms.c.term)
+    title_similarity = func.similarity(StickerSet.title, terms.c.term)
+    set_score = func.sum(greatest(name_similarity, title_similarity)).label("set_score")
+    set_score_subq = (
+        session.query(StickerSet.name, set_score)
+        .join(terms, true())
+        .filter(
+            or_(
+                name_similarity >= threshold,
+                title_similarity >= threshold,
+            )
+        )
+        .group_by(StickerSet.name)
+        .subquery("set_score_subq")
+    )
 
     # Condition for matching sticker text
     text_score = []
     for tag in tags:
         text_score.append(
             case(
-                [(func.similarity(Sticker.text, tag) >= threshold, threshold)], else_=0
+                [(func.similarity(StickerSearchDoc.text, tag) >= threshold, threshold)],
+                else_=0,
             )
         )
 
     # Compute the whole score
-    score = cast(func.coalesce(tag_score_subq.c.tag_score, 0), Numeric)
-    for condition in sticker_set_score + text_score:
+    if tag_score_subq is not None:
+        score = cast(func.coalesce(tag_score_subq.c.tag_score, 0), Numeric)
+    else:
+        score = cast(literal(0), Numeric)
+    score = score + func.coalesce(set_score_subq.c.set_score, 0)
+    for condition in text_score:
         score = score + condition
     score = score.label("score")
 
     # Compute the score for all stickers and filter nsfw stuff
     # We do the score computation in a subquery, since it would otherwise be recomputed for statement.
-    matching_stickers = (
-        session.query(
-            Sticker.id, Sticker.file_id, Sticker.file_unique_id, StickerSet.name, score
-        )
-        .outerjoin(
+    matching_stickers = session.query(
+        StickerSearchDoc.sticker_id.label("id"),
+        StickerSearchDoc.file_id,
+        StickerSearchDoc.file_unique_id,
+        StickerSearchDoc.set_name.label("name"),
+        score,
+    )
+    if tag_score_subq is not None:
+        matching_stickers = matching_stickers.outerjoin(
             tag_score_subq,
-            Sticker.file_unique_id == tag_score_subq.c.sticker_file_unique_id,
+            StickerSearchDoc.file_unique_id == tag_score_subq.c.file_unique_id,
         )
-        .join(Sticker.sticker_set)
-    )
 
     # Add the sticker sets with matching name/title via outer join (performance)
-    for subq in sticker_set_subqs:
-        matching_stickers = matching_stickers.outerjoin(
-            subq, Sticker.sticker_set_name == subq.c.name
+    matching_stickers = matching_stickers.outerjoin(
+        set_score_subq, StickerSearchDoc.set_name == set_score_subq.c.name
+    )
+
+    # Exclude all strictly matched stickers
+    strict_file_unique_ids = bindparam(
+        "strict_file_unique_ids", params["strict_file_unique_ids"], expanding=True
+    )
+    matching_stickers = matching_stickers.filter(
+        StickerSearchDoc.file_unique_id.notin_(strict_file_unique_ids)
+    ).filter(score > 0)
+
+    # Filter nsfw stuff and apply the user's settings
+    matching_stickers = filter_search_docs(matching_stickers, context)
+
+    if cursor is not None:
+        matching_stickers = matching_stickers.filter(
+            get_cursor_condition(
+                score,
+                [StickerSearchDoc.set_name, StickerSearchDoc.file_unique_id],
+                cursor,
+            )
         )
 
-    # Get all strictly matched stickers from the inline query cache.
-    # This way we avoid having to issue the strict query again.
-    strict_file_unique_ids = get_cached_strict_matching_stickers(context)
+    matching_stickers = matching_stickers.order_by(
+        score.desc(), StickerSearchDoc.set_name, StickerSearchDoc.file_unique_id
+    )
 
-    matching_stickers = (
-        matching_stickers.filter(Sticker.banned.is_(False))
-        .filter(Sticker.file_unique_id.notin_(strict_file_unique_ids))
-        .filter(StickerSet.deleted.is_(False))
-        .filter(StickerSet.banned.is_(False))
-        .filter(StickerSet.reviewed.is_(True))
-        .filter(score > 0)
+    return matching_stickers
+
+
+def get_similar_tag_params(session, context):
+    """Look up the tags that are similar to the searched tags, if possible.
+
+    Returns a tuple of the kind of similar tag query and its bind parameters:
+    - "array": The similar tags are known from the trigram index or the tag expansion cache.
+    - "sql": The similar tags are computed by the fuzzy query itself.
+    - `None`: There are no similar tags.
+    """
+    use_index = config["mode"]["similar_tag_engine"] == "memory" and trigram_index.ready
+    if not use_index and not config["cache"]["tag_expansion_enabled"]:
+        return "sql", {}
+
+    similar_tags = get_similar_tags(
+        session,
+        context.tags,
+        context.user.international,
+        FUZZY_THRESHOLD,
+        deferred=context.deferred,
     )
+    if len(similar_tags) == 0:
+        return None, {}
 
-    # Handle special flags
-    if animated:
-        matching_stickers = matching_stickers.filter(Sticker.animated.is_(True))
+    return "array", {
+        "similar_tag_names": [name for name, _ in similar_tags],
+        "similar_tag_similarities": [similarity for _, similarity in similar_tags],
+    }
 
-    # Handle default nsfw/furry stuff search
-    if nsfw:
-        matching_stickers = matching_stickers.filter(StickerSet.nsfw.is_(True))
-    elif user.nsfw is False:
-        matching_stickers = matching_stickers.filter(StickerSet.nsfw.is_(False))
 
-    if furry:
-        matching_stickers = matching_stickers.filter(StickerSet.furry.is_(True))
-    elif user.furry is False:
-        matching_stickers = matching_stickers.filter(StickerSet.furry.is_(False))
+def get_similar_tags_query(session, context, similar_tag_kind, params):
+    """Get a selectable of all tags that are similar to the searched tags.
 
-    # Only query default language sticker sets
-    if not user.international:
-        matching_stickers = matching_stickers.filter(
-            StickerSet.international.is_(False)
+    The selectable has a `name` and a `tag_similarity` column.
+    In case there are no similar tags, `None` is returned.
+    """
+    user = context.user
+
+    if similar_tag_kind is None:
+        return None
+
+    if similar_tag_kind == "array":
+        return (
+            func.unnest(
+                bindparam(
+                    "similar_tag_names",
+                    params["similar_tag_names"],
+                    type_=ARRAY(String),
+                ),
+                bindparam(
+                    "similar_tag_similarities",
+                    params["similar_tag_similarities"],
+                    type_=ARRAY(Float),
+                ),
+            )
+            .table_valued(column("name", String), column("tag_similarity", Float))
+            .render_derived(name="tag_query")
         )
 
-    # Only query deluxe sticker sets
-    if user.deluxe:
-        matching_stickers = matching_stickers.filter(StickerSet.deluxe.is_(True))
+    # Create a query for each tag, which fuzzy matches all tags and computes the distance
+    tags, _ = get_tag_bindparams(context)
+    similarities = []
+    threshold_check = []
+    for tag in tags:
+        similarities.append(func.similarity(Tag.name, tag))
+        threshold_check.append(func.similarity(Tag.name, tag) >= FUZZY_THRESHOLD)
 
-    matching_stickers = matching_stickers.order_by(
-        score.desc(), StickerSet.name, Sticker.file_unique_id
+    tag_query = (
+        session.query(
+            Tag.name,
+            greatest(*similarities).label("tag_similarity"),
+        )
+        .filter(or_(*threshold_check))
+        .filter(
+            or_(Tag.international == user.international, Tag.international.is_(False))
+        )
+        .group_by(Tag.name)
+        .subquery("tag_query")
     )
 
-    return matching_stickers
+    return tag_query
@@ -0,0 +1,55 @@
+"""Cache of prebuilt search statements.
+
+Building the strict and fuzzy search statements is measurable CPU time on every request,
+since they contain expressions for every single search term.
+However, the statements only depend on the shape of a search, e.g. the amount of terms
+and the user's filters. All request specific values are named bind parameters.
+
+That's why each statement is built once per shape and reused afterwards.
+Each request only binds its own parameters. Since the statements are reused,
+sqlalchemy's compiled cache also reliably hits for them.
+"""
+
+from sqlalchemy import bindparam
+
+
+class StatementCache:
+    """Mapping of search shapes to prebuilt statements."""
+
+    def __init__(self):
+        """Create a new empty statement cache."""
+        self.statements = {}
+
+    def __len__(self):
+        """Return the amount of cached statements."""
+        return len(self.statements)
+
+    def get(self, shape, build):
+        """Get the statement of a shape and build it, if it isn't cached yet.
+
+        Building the same statement twice in concurrent threads is harmless,
+        which is why there's no need for locking.
+        """
+        statement = self.statements.get(shape)
+        if statement is None:
+            statement = self.statements.setdefault(shape, build())
+
+        return statement
+
+    def clear(self):
+        """Remove all statements."""
+        self.statements.clear()
+
+
+def get_window_statement(query, with_offset):
+    """Get the statement of a search query, which is limited to a window of results.
+
+    The offset is only needed, if results aren't paginated by cursor.
+    """
+    if with_offset:
+        query = query.offset(bindparam("offset"))
+
+    return query.limit(bindparam("limit")).statement
+
+
+statement_cache = StatementCache()
@@ -0,0 +1,366 @@
+"""In-memory inverted tag index for strict inline search.
+
+The strict search query has to group all `sticker_tag` rows of the searched tags and
+join them with stickers, sticker sets and sticker usages on every single request.
+The tag index holds the same information in memory:
+
+- A posting list of sticker positions for every tag.
+- A flag bitmap for every sticker, which contains the sticker and sticker set flags.
+- Substring indices of the sticker set names and titles and of the sticker texts.
+
+The index is rebuilt periodically by a job and swapped atomically, which is why
+readers never have to lock anything.
+"""
+
+from functools import reduce
+
+import numpy
+
+from stickerfinder.helper.lru_cache import LRUCache
+from stickerfinder.logic.usage import get_usage_counts
+from stickerfinder.models import StickerSearchDoc
+
+from .offload import run_cpu_bound
+from .scoring import SET_SCORE, TAG_SCORE, TEXT_SCORE, USAGE_SCORE, rank, round_scores
+
+# Flags in the per-sticker bitmap
+BANNED = 1 << 0
+NSFW = 1 << 1
+FURRY = 1 << 2
+INTERNATIONAL = 1 << 3
+DELUXE = 1 << 4
+ANIMATED = 1 << 5
+REVIEWED = 1 << 6
+DELETED = 1 << 7
+
+# The amount of search terms, whose substring matches are remembered per snapshot
+SUBSTRING_MATCHES_SIZE = 10000
+
+
+class SubstringIndex:
+    """Index of the texts, which contain a search term.
+
+    Each text is indexed by all of its character trigrams. A term with at least three
+    characters can only be contained in texts, which contain all of its trigrams.
+    Only those candidates are checked. Shorter terms need a scan over all texts.
+    The matches of each term are remembered, since popular terms are searched over
+    and over again.
+    """
+
+    def __init__(self, texts):
+        """Build the trigram posting lists of the texts."""
+        self.texts = texts
+        postings = {}
+        for position, text in enumerate(texts):
+            for trigram in get_substring_trigrams(text):
+                postings.setdefault(trigram, []).append(position)
+
+        self.postings = {
+            trigram: numpy.array(positions, dtype=numpy.int32)
+            for trigram, positions in postings.items()
+        }
+        self.matches = LRUCache(SUBSTRING_MATCHES_SIZE, 24 * 60 * 60)
+
+    def find(self, term):
+        """Get the sorted positions of all texts, which contain the term."""
+        matches = self.matches.get(term)
+        if matches is not None:
+            return matches
+
+        if len(term) >= 3:
+            postings = [
+                self.postings.get(trigram) for trigram in get_substring_trigrams(term)
+            ]
+            if any(positions is None for positions in postings):
+                candidates = []
+            else:
+                postings.sort(key=len)
+                candidates = reduce(numpy.intersect1d, postings)
+        else:
+            candidates = range(len(self.texts))
+
+        matches = numpy.array(
+            [position for position in candidates if term in self.texts[position]],
+            dtype=numpy.int32,
+        )
+        self.matches.put(term, matches)
+
+        return matches
+
+
+def get_substring_trigrams(text):
+    """Get the set of all three character substrings of a text."""
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+class TagIndexSnapshot:
+    """An immutable snapshot of all searchable stickers."""
+
+    def __init__(self, stickers, sticker_tags):
+        """Build the index from sticker rows and (file_unique_id, tag, international) rows.
+
+        The sticker rows have to be sorted by sticker set name and file_unique_id.
+        The position of a sticker in this list is used as its tie-breaker in the ordering.
+        """
+        count = len(stickers)
+        self.ids = numpy.zeros(count, dtype=numpy.int64)
+        self.flags = numpy.zeros(count, dtype=numpy.uint16)
+        self.set_positions = numpy.zeros(count, dtype=numpy.int32)
+        self.file_ids = []
+        self.file_unique_ids = []
+        self.set_names = []
+        self.set_titles = []
+
+        self.position_by_file_unique_id = {}
+        text_positions = []
+        self.texts = []
+
+        for position, sticker in enumerate(stickers):
+            self.ids[position] = sticker.id
+            self.file_ids.append(sticker.file_id)
+            self.file_unique_ids.append(sticker.file_unique_id)
+            self.position_by_file_unique_id[sticker.file_unique_id] = position
+
+            # Stickers are sorted by set name, so we only need to compare with the last set.
+            if len(self.set_names) == 0 or self.set_names[-1] != sticker.set_name:
+                self.set_names.append(sticker.set_name)
+                self.set_titles.append(sticker.set_title or "")
+            self.set_positions[position] = len(self.set_names) - 1
+
+            if sticker.text:
+                text_positions.append(position)
+                self.texts.append(sticker.text)
+
+            self.flags[position] = get_flags(sticker)
+
+        self.text_positions = numpy.array(text_positions, dtype=numpy.int32)
+
+        # Search terms can't contain line breaks, so they never match across both.
+        self.set_index = SubstringIndex(
+            [f"{name}\n{title}" for name, title in zip(self.set_names, self.set_titles)]
+        )
+        self.text_index = SubstringIndex(self.texts)
+
+        # Build the posting lists
+        postings = {}
+        self.international_tags = set()
+        for file_unique_id, tag_name, international in sticker_tags:
+            position = self.position_by_file_unique_id.get(file_unique_id)
+            if position is None:
+                continue
+
+            if tag_name not in postings:
+                postings[tag_name] = []
+            postings[tag_name].append(position)
+
+            if international:
+                self.international_tags.add(tag_name)
+
+        self.postings = {
+            name: numpy.array(positions, dtype=numpy.int32)
+            for name, positions in postings.items()
+        }
+
+    def __len__(self):
+        """Return the amount of indexed stickers."""
+        return len(self.ids)
+
+    def get_document_frequency(self, tags, international):
+        """Get the amount of stickers, which are tagged with any of the tags."""
+        postings = []
+        for tag in tags:
+            if tag in self.international_tags and not international:
+                continue
+            if tag in self.postings:
+                postings.append(self.postings[tag])
+
+        if len(postings) == 0:
+            return 0
+
+        return len(numpy.unique(numpy.concatenate(postings)))
+
+    def get_filter_mask(self, context):
+        """Get a boolean mask of all stickers that may be shown for this search."""
+        return get_filter_mask(self.flags, context)
+
+    def get_scores(self, context):
+        """Compute the strict search score of every sticker.
+
+        This is the same score as in `get_strict_matching_query`, without the usage part.
+        """
+        scores = numpy.zeros(len(self), dtype=numpy.float64)
+
+        for tag in context.tags:
+            positions = self.postings.get(tag)
+            if positions is None:
+                continue
+            # International tags only count for international users
+            if tag in self.international_tags and not context.user.international:
+                continue
+            scores[positions] += TAG_SCORE
+
+        for tag in context.tags:
+            # Sticker set names and titles are matched once per set
+            set_matches = self.set_index.find(tag)
+            if len(set_matches) > 0:
+                matching_sets = numpy.zeros(len(self.set_names), dtype=numpy.bool_)
+                matching_sets[set_matches] = True
+                scores += matching_sets[self.set_positions] * SET_SCORE
+
+            text_matches = self.text_index.find(tag)
+            if len(text_matches) > 0:
+                scores[self.text_positions[text_matches]] += TEXT_SCORE
+
+        return scores
+
+    def get_strict_matching_stickers(self, context, usages, offset, limit):
+        """Get the strictly matching stickers in the same order as the sql query.
+
+        `usages` is an iterable of (file_unique_id, usage_count) tuples of the current user.
+        """
+        scores = self.get_scores(context)
+        mask = self.get_filter_mask(context) & (scores > 0)
+
+        # The usage is only applied to stickers that match any other criteria
+        for file_unique_id, usage_count in usages:
+            position = self.position_by_file_unique_id.get(file_unique_id)
+            if position is not None and mask[position]:
+                scores[position] += USAGE_SCORE * usage_count
+
+        scores = round_scores(scores)
+
+        # The position already represents the order of the set name and file_unique_id.
+        candidates = numpy.flatnonzero(mask)
+        candidates = candidates[rank(scores[candidates], candidates, offset, limit)]
+
+        return [
+            (
+                int(self.ids[position]),
+                self.file_ids[position],
+                self.file_unique_ids[position],
+                self.set_names[self.set_positions[position]],
+                float(scores[position]),
+            )
+            for position in candidates
+        ]
+
+
+def get_filter_mask(flags, context):
+    """Get a boolean mask of all flag bitmaps that may be shown for this search."""
+    user = context.user
+
+    mask = (flags & (BANNED | DELETED)) == 0
+    mask &= (flags & REVIEWED) != 0
+
+    if context.animated:
+        mask &= (flags & ANIMATED) != 0
+
+    if context.nsfw:
+        mask &= (flags & NSFW) != 0
+    elif user.nsfw is False:
+        mask &= (flags & NSFW) == 0
+
+    if context.furry:
+        mask &= (flags & FURRY) != 0
+    elif user.furry is False:
+        mask &= (flags & FURRY) == 0
+
+    if user.international is False:
+        mask &= (flags & INTERNATIONAL) == 0
+
+    if user.deluxe:
+        mask &= (flags & DELUXE) != 0
+
+    return mask
+
+
+def get_flags(sticker):
+    """Compute the flag bitmap of a sticker row."""
+    flags = 0
+    if sticker.banned:
+        flags |= BANNED
+    if sticker.nsfw:
+        flags |= NSFW
+    if sticker.furry:
+        flags |= FURRY
+    if sticker.international:
+        flags |= INTERNATIONAL
+    if sticker.deluxe:
+        flags |= DELUXE
+    if sticker.animated:
+        flags |= ANIMATED
+    if sticker.reviewed:
+        flags |= REVIEWED
+    if sticker.deleted:
+        flags |= DELETED
+
+    return flags
+
+
+class TagIndex:
+    """Holder of the current tag index snapshot."""
+
+    def __init__(self):
+        """Create a new empty tag index."""
+        self.snapshot = None
+
+    @property
+    def ready(self):
+        """Check whether the index has been built at least once."""
+        return self.snapshot is not None
+
+    def rebuild(self, session):
+        """Load all search documents from the database and swap the snapshot."""
+        stickers = (
+            session.query(
+                StickerSearchDoc.sticker_id.label("id"),
+                StickerSearchDoc.file_id,
+                StickerSearchDoc.file_unique_id,
+                StickerSearchDoc.text,
+                StickerSearchDoc.animated,
+                StickerSearchDoc.tags,
+                StickerSearchDoc.international_tags,
+                StickerSearchDoc.set_name,
+                StickerSearchDoc.set_title,
+                StickerSearchDoc.banned,
+                StickerSearchDoc.nsfw,
+                StickerSearchDoc.furry,
+                StickerSearchDoc.international,
+                StickerSearchDoc.deluxe,
+                StickerSearchDoc.reviewed,
+                StickerSearchDoc.deleted,
+            )
+            .order_by(StickerSearchDoc.set_name, StickerSearchDoc.file_unique_id)
+            .all()
+        )
+
+        sticker_tags = []
+        for sticker in stickers:
+            for name in sticker.tags:
+                sticker_tags.append((sticker.file_unique_id, name, False))
+            for name in sticker.international_tags:
+                sticker_tags.append((sticker.file_unique_id, name, True))
+
+        self.snapshot = TagIndexSnapshot(stickers, sticker_tags)
+
+    def get_strict_matching_stickers(self, session, context, offset, limit):
+        """Answer a strict search from the current snapshot."""
+        snapshot = self.snapshot
+
+        usages = get_usage_counts(session, context.user.id).items()
+
+        return run_cpu_bound(
+            context.deferred,
+            snapshot.get_strict_matching_stickers,
+            context.detach(),
+            usages,
+            offset,
+            limit,
+        )
+
+    def get_document_frequency(self, tags, international):
+        """Get the amount of stickers with any of the tags from the current snapshot."""
+        return self.snapshot.get_document_frequency(tags, international)
+
+
+tag_index = TagIndex()
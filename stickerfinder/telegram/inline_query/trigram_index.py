@@ -0,0 +1,113 @@
+"""In-memory trigram index over the tag vocabulary for fuzzy search.
+
+Fuzzy search needs all tags that are similar to the search terms.
+Computing `similarity(tag.name, term)` in postgres requires a full scan of the tag table
+for every single request. The tag vocabulary is small, which is why we keep
+a trigram index of all tags in memory instead:
+
+- A posting list of tag positions for every trigram.
+- The amount of distinct trigrams for every tag.
+
+The similarity is computed the same way pg_trgm does it.
+Just like the tag index, it's rebuilt periodically and swapped atomically.
+"""
+
+import numpy
+
+from stickerfinder.helper.trigram import get_trigrams
+from stickerfinder.models import Tag
+
+
+class TrigramIndexSnapshot:
+    """An immutable snapshot of the trigrams of all tags."""
+
+    def __init__(self, tags):
+        """Build the index from (name, international) tag rows."""
+        count = len(tags)
+        self.names = []
+        self.international = numpy.zeros(count, dtype=numpy.bool_)
+        self.trigram_counts = numpy.zeros(count, dtype=numpy.int32)
+
+        postings = {}
+        for position, tag in enumerate(tags):
+            self.names.append(tag.name)
+            self.international[position] = tag.international
+
+            trigrams = get_trigrams(tag.name)
+            self.trigram_counts[position] = len(trigrams)
+            for trigram in trigrams:
+                if trigram not in postings:
+                    postings[trigram] = []
+                postings[trigram].append(position)
+
+        self.postings = {
+            trigram: numpy.array(positions, dtype=numpy.int32)
+            for trigram, positions in postings.items()
+        }
+
+    def __len__(self):
+        """Return the amount of indexed tags."""
+        return len(self.names)
+
+    def get_similarities(self, term):
+        """Compute the similarity of a term to all tags."""
+        trigrams = get_trigrams(term)
+        similarities = numpy.zeros(len(self), dtype=numpy.float64)
+
+        positions = [
+            self.postings[trigram] for trigram in trigrams if trigram in self.postings
+        ]
+        if len(positions) == 0:
+            return similarities
+
+        # Count the shared trigrams of each tag
+        shared = numpy.bincount(numpy.concatenate(positions), minlength=len(self))
+        matching = numpy.flatnonzero(shared)
+        union = self.trigram_counts[matching] + len(trigrams) - shared[matching]
+        similarities[matching] = shared[matching] / union
+
+        return similarities
+
+    def get_similar_tags_of_term(self, term, threshold):
+        """Get all tags that are similar to a single term.
+
+        Returns a list of (name, similarity, international) tuples.
+        """
+        if len(self) == 0:
+            return []
+
+        similarities = self.get_similarities(term)
+        return [
+            (
+                self.names[position],
+                float(similarities[position]),
+                bool(self.international[position]),
+            )
+            for position in numpy.flatnonzero(similarities >= threshold)
+        ]
+
+
+class TrigramIndex:
+    """Holder of the current trigram index snapshot."""
+
+    def __init__(self):
+        """Create a new empty trigram index."""
+        self.snapshot = None
+
+    @property
+    def ready(self):
+        """Check whether the index has been built at least once."""
+        return self.snapshot is not None
+
+    def rebuild(self, session):
+        """Load all tags from the database and swap the snapshot."""
+        tags = session.query(Tag.name, Tag.international).order_by(Tag.name).all()
+
+        self.snapshot = TrigramIndexSnapshot(tags)
+
+    def get_similar_tags_of_term(self, term, threshold):
+        """Get all tags that are similar to a single term from the current snapshot."""
+        return self.snapshot.get_similar_tags_of_term(term, threshold)
+
+
+trigram_index = TrigramIndex()
@@ -0,0 +1,181 @@
+"""Write-behind buffer for the sticker usages of chosen inline results.
+
+Each chosen result increments the usage count of the sticker for the user and
+remembers the sticker on its inline query. Doing this per result takes several round
+trips and the increment in python races with concurrent results of the same user.
+
+Instead, chosen results are aggregated in memory and applied periodically.
+All usages of a batch are upserted with a single statement, which increments the
+usage counts in the database. The chosen stickers of the inline queries are
+updated with a single statement as well.
+
+The usages of a failed batch are merged back into the buffer and retried with the
+next batch. They're only dropped after several failed flushes in a row.
+"""
+
+import logging
+import traceback
+from collections import Counter
+
+from sqlalchemy import BigInteger, String, column, func, update, values
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import joinedload
+
+from stickerfinder.config import config
+from stickerfinder.db import get_session
+from stickerfinder.helper.write_behind import WriteBehindBuffer
+from stickerfinder.logic.usage import record_usage
+from stickerfinder.models import InlineQuery, Sticker, StickerUsage
+from stickerfinder.sentry import sentry
+
+from .analytics import analytics_buffer
+from .favorites import record_favorite
+from .incremental import forget_search
+
+# Failed batches are requeued, until this many flushes in a row have failed
+MAX_FAILED_FLUSHES = 5
+
+
+class UsageBuffer(WriteBehindBuffer):
+    """Buffer of chosen inline results, which are applied in batches."""
+
+    def __init__(self):
+        """Create a new empty buffer."""
+        super().__init__("usages", "usage_flush_seconds")
+
+        self.usages = Counter()
+        self.chosen = {}
+        self.failed_flushes = 0
+
+    def add(self, user_id, inline_query_id, sticker_id):
+        """Add a chosen inline result to the buffer."""
+        with self.lock:
+            self.usages[(user_id, sticker_id)] += 1
+            self.chosen[inline_query_id] = sticker_id
+
+    def flush(self):
+        """Apply all buffered usages and chosen results.
+
+        The usages of a failed batch are requeued.
+        """
+        with self.flush_lock:
+            with self.lock:
+                usages, self.usages = self.usages, Counter()
+                chosen, self.chosen = self.chosen, {}
+
+            if len(usages) == 0:
+                return
+
+            # The inline queries of the chosen results might still be buffered
+            if config["mode"]["buffered_analytics"]:
+                analytics_buffer.flush()
+
+            session = get_session()
+            try:
+                apply_usages(session, usages, chosen)
+                self.failed_flushes = 0
+            except Exception:
+                session.rollback()
+                traceback.print_exc()
+                sentry.capture_exception(tags={"handler": "usages"})
+
+                self.requeue(usages, chosen)
+            finally:
+                session.close()
+
+    def requeue(self, usages, chosen):
+        """Merge the usages and chosen results of a failed batch back into the buffer.
+
+        The batch is dropped, if the buffer has been stopped or
+        if too many flushes failed in a row.
+        """
+        self.failed_flushes += 1
+        if not self.running or self.failed_flushes >= MAX_FAILED_FLUSHES:
+            logging.getLogger().error(
+                f"Dropped {sum(usages.values())} sticker usages of "
+                f"{len({user_id for user_id, _ in usages})} users "
+                f"after {self.failed_flushes} failed flushes."
+            )
+            self.failed_flushes = 0
+            return
+
+        with self.lock:
+            self.usages.update(usages)
+            # Results, which have been chosen in the meantime, are newer
+            self.chosen = {**chosen, **self.chosen}
+
+
+def apply_usages(session, usages, chosen):
+    """Upsert aggregated usages and update the cached usages and favorites.
+
+    `usages` maps (user_id, sticker_id) to the amount of usages and
+    `chosen` maps inline query ids to the chosen sticker id.
+    """
+    sticker_ids = {sticker_id for _, sticker_id in usages}
+    stickers = (
+        session.query(Sticker)
+        .options(joinedload(Sticker.sticker_set))
+        .filter(Sticker.id.in_(sticker_ids))
+        .all()
+    )
+    # Detached stickers keep their attributes after the commit.
+    session.expunge_all()
+    stickers = {sticker.id: sticker for sticker in stickers}
+
+    # Stickers might have been deleted in the meantime.
+    rows = [
+        {
+            "sticker_file_unique_id": stickers[sticker_id].file_unique_id,
+            "user_id": user_id,
+            "usage_count": count,
+        }
+        for (user_id, sticker_id), count in usages.items()
+        if sticker_id in stickers
+    ]
+    chosen = [
+        (inline_query_id, stickers[sticker_id].file_unique_id)
+        for inline_query_id, sticker_id in chosen.items()
+        if sticker_id in stickers
+    ]
+    if len(rows) == 0:
+        return
+
+    statement = insert(StickerUsage.__table__).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=["sticker_file_unique_id", "user_id"],
+        set_={
+            "usage_count": StickerUsage.usage_count + statement.excluded.usage_count,
+            "updated_at": func.now(),
+        },
+    ).returning(
+        StickerUsage.sticker_file_unique_id,
+        StickerUsage.user_id,
+        StickerUsage.usage_count,
+        StickerUsage.updated_at,
+    )
+    sticker_usages = session.execute(statement).all()
+
+    chosen_values = values(
+        column("id", BigInteger),
+        column("file_unique_id", String),
+        name="chosen",
+    ).data(chosen)
+    session.execute(
+        update(InlineQuery.__table__)
+        .where(InlineQuery.__table__.c.id == chosen_values.c.id)
+        .values(sticker_file_unique_id=chosen_values.c.file_unique_id)
+    )
+
+    session.commit()
+
+    stickers = {sticker.file_unique_id: sticker for sticker in stickers.values()}
+    for sticker_usage in sticker_usages:
+        record_usage(sticker_usage)
+        record_favorite(stickers[sticker_usage.sticker_file_unique_id], sticker_usage)
+
+    # The scores of the latest search don't include these usages
+    for user_id in {sticker_usage.user_id for sticker_usage in sticker_usages}:
+        forget_search(user_id)
+
+
+usage_buffer = UsageBuffer()
@@ -4,12 +4,21 @@ from datetime import datetime, timedelta
 
 from sqlalchemy import and_, func
 
+from stickerfinder.caches import tag_expansion_cache, user_profile_invalidations
 from stickerfinder.config import config
 from stickerfinder.logic.cleanup import full_cleanup
 from stickerfinder.logic.maintenance import distribute_newsfeed_tasks, distribute_tasks
 from stickerfinder.logic.sticker_set import refresh_stickers
 from stickerfinder.models import Change, Report, StickerSet, Task, User
 from stickerfinder.session import job_wrapper
+from stickerfinder.telegram.inline_query.cache import (
+    inline_query_cache,
+    prune_sticker_files,
+)
+from stickerfinder.telegram.inline_query.emoji_index import emoji_index
+from stickerfinder.telegram.inline_query.prefetch import prune_prefetches
+from stickerfinder.telegram.inline_query.tag_index import tag_index
+from stickerfinder.telegram.inline_query.trigram_index import trigram_index
 
 
 @job_wrapper
@@ -24,25 +33,34 @@ def newsfeed_job(context, session):
 
 @job_wrapper
 def free_cache(context, session):
-    """This job removes all inline query cache entries that are older than a specified threshold.
+    """This job removes all expired inline query cache entries.
 
-    We do this to preserve memory, since there's virtually no limit to the PTB cache size.
+    Expired entries are otherwise only removed, once they're accessed or evicted.
+    Afterwards, the file ids of stickers that aren't cached anymore are removed as well.
+    Expired profile invalidations of forked bot processes are removed as well.
     """
-    if "query_cache" not in context.bot_data:
-        context.bot_data["query_cache"] = {}
+    inline_query_cache.expire()
+    if user_profile_invalidations is not None:
+        user_profile_invalidations.expire()
+    prune_sticker_files()
+    prune_prefetches()
 
-    query_cache = context.bot_data["query_cache"]
+    return
 
-    keys = list(query_cache.keys())
-    for key in keys:
-        if key == "exceptions":
-            continue
 
-        creation_time = query_cache[key]["time"]
-        # A threshold of 10 minutes should be more than enough.
-        threshold = datetime.now() - timedelta(minutes=20)
-        if creation_time < threshold:
-            del query_cache[key]
+@job_wrapper
+def refresh_search_index_job(context, session):
+    """Rebuild the in-memory indices for strict, fuzzy and emoji search."""
+    if config["mode"]["search_engine"] == "memory":
+        tag_index.rebuild(session)
+
+    if config["mode"]["similar_tag_engine"] == "memory":
+        trigram_index.rebuild(session)
+        # The cached expansions don't include the tags, which have been created since.
+        tag_expansion_cache.clear()
+
+    if config["mode"]["emoji_index"]:
+        emoji_index.rebuild(session)
 
     return
 
@@ -0,0 +1,78 @@
+"""Test the LRU cache."""
+from stickerfinder.helper.lru_cache import LRUCache
+
+
+def test_lru_eviction():
+    """The least recently used entry is evicted first."""
+    cache = LRUCache(2, 60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+
+    # Mark `a` as recently used
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.hits == 3
+    assert cache.misses == 1
+
+
+def test_lru_expiry():
+    """Entries expire after their ttl."""
+    cache = LRUCache(2, 0)
+    cache.put("a", 1)
+
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_lru_byte_budget():
+    """Entries are evicted as soon as their accumulated size exceeds the budget."""
+    cache = LRUCache(10, 60, max_bytes=10, size_of=len)
+    cache.put("a", "1234")
+    cache.put("b", "1234")
+    assert cache.bytes == 8
+
+    cache.put("c", "1234")
+    assert cache.get("a") is None
+    assert cache.bytes == 8
+
+    # Growing entries are accounted as well
+    cache.update("c", lambda value: value + "12345")
+    assert cache.get("b") is None
+    assert cache.get("c") == "123412345"
+    assert cache.bytes == 9
+
+
+def test_lru_eviction_callback():
+    """Evicted and expired entries are counted and passed to the callback."""
+    evicted = []
+    cache = LRUCache(1, 60, on_evict=evicted.append)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert evicted == [1]
+
+    # Removed entries aren't evicted
+    assert cache.pop("b") == 2
+    assert cache.pop("b") is None
+
+    cache.ttl = 0
+    cache.put("c", 3)
+    cache.expire()
+    assert evicted == [1, 3]
+    assert cache.evictions == 2
+    assert len(cache) == 0
+
+
+def test_setdefault():
+    """Existing entries are returned, otherwise the value is stored."""
+    cache = LRUCache(2, 60)
+
+    assert cache.setdefault("a", 1) == 1
+    assert cache.setdefault("a", 2) == 1
+
+    cache.ttl = -1
+    assert cache.setdefault("a", 3) == 3
+    assert cache.evictions == 1
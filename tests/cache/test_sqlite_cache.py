@@ -0,0 +1,69 @@
+"""Test the SQLite cache, which is shared between processes."""
+from stickerfinder.helper.sqlite_cache import SQLiteCache
+
+
+def test_entries_are_shared(tmp_path):
+    """Entries of one process are visible to other processes."""
+    path = str(tmp_path / "cache.sqlite")
+    first = SQLiteCache(path, 10, 60)
+    second = SQLiteCache(path, 10, 60)
+
+    first.put(1, [1, 2])
+    second.update(1, lambda value: [*value, 3])
+    assert first.get(1) == [1, 2, 3]
+
+    # Updates of missing entries are ignored
+    second.update(2, lambda value: [*value, 3])
+    assert first.get(2) is None
+
+    assert second.pop(1) == [1, 2, 3]
+    assert first.get(1) is None
+    assert first.hits == 1
+    assert first.misses == 2
+
+
+def test_expire(tmp_path):
+    """Expired entries and the oldest entries beyond the maximum size are removed."""
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite"), 2, 60)
+    for key in range(3):
+        cache.put(key, key)
+
+    cache.expire()
+    assert len(cache) == 2
+    assert cache.get(0) is None
+
+    cache.ttl = -1
+    assert cache.get(1) is None
+
+    cache.expire()
+    assert len(cache) == 0
+    assert cache.evictions == 3
+
+
+def test_setdefault_keeps_entries_of_other_processes(tmp_path):
+    """An entry, which another process created in the meantime, isn't replaced."""
+    path = str(tmp_path / "cache.sqlite")
+    first = SQLiteCache(path, 10, 60)
+    second = SQLiteCache(path, 10, 60)
+
+    assert first.setdefault(1, []) == []
+    first.update(1, lambda value: [*value, 1])
+
+    assert second.setdefault(1, []) == [1]
+    assert first.get(1) == [1]
+
+    # Expired entries are replaced
+    second.ttl = -1
+    assert second.setdefault(1, []) == []
+
+
+def test_max_bytes(tmp_path):
+    """The oldest entries beyond the maximum bytes are evicted."""
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite"), 10, 60, max_bytes=250)
+    for key in range(3):
+        cache.put(key, b"x" * 100)
+
+    cache.expire()
+    assert len(cache) == 2
+    assert cache.get(0) is None
+    assert cache.evictions == 1
@@ -2,8 +2,10 @@
 import pytest
 from tests.factories import user_factory, sticker_set_factory, sticker_factory
 
+from stickerfinder.logic.search_doc import rebuild_search_docs
 from stickerfinder.logic.tag import tag_sticker
 from stickerfinder.models import Sticker
+from stickerfinder.telegram.inline_query.cache import inline_query_cache
 
 
 @pytest.fixture(scope="function")
@@ -37,6 +39,7 @@ class TgContext:
 @pytest.fixture(scope="function")
 def tg_context():
     """Create a stub telegram context"""
+    inline_query_cache.clear()
     return TgContext()
 
 
@@ -67,6 +70,9 @@ def strict_inline_search(session):
         sticker_set_2.stickers.append(sticker)
     session.commit()
 
+    rebuild_search_docs(session)
+    session.commit()
+
     return [sticker_set_1, sticker_set_2]
 
 
@@ -91,4 +97,7 @@ def fuzzy_inline_search(session):
         sticker_set_2.stickers.append(sticker)
     session.commit()
 
+    rebuild_search_docs(session)
+    session.commit()
+
     return [sticker_set_1, sticker_set_2]
@@ -0,0 +1,74 @@
+"""Test the buffered analytics of inline queries."""
+from types import SimpleNamespace
+
+from stickerfinder.models import InlineQuery, InlineQueryRequest
+from stickerfinder.telegram.inline_query.analytics import AnalyticsBuffer
+from stickerfinder.telegram.inline_query.context import Context
+
+
+def get_user():
+    """Create a detached user with default settings."""
+    return SimpleNamespace(
+        id=2, nsfw=False, furry=False, international=False, deluxe=False
+    )
+
+
+def test_duplicate_offsets_are_rejected():
+    """A request with an offset, which has already been requested, isn't answered."""
+    buffer = AnalyticsBuffer()
+    context = Context(None, "testtag", "123:50", get_user())
+
+    request = buffer.add_request(None, context, "50")
+    assert request.inline_query is None
+    assert request.inline_query_id == 123
+
+    assert buffer.add_request(None, context, "50") is None
+    assert buffer.add_request(None, context, "100") is not None
+
+
+def test_flush_inserts_rows(session, user):
+    """Buffered inline queries and their requests are inserted in one batch."""
+    buffer = AnalyticsBuffer()
+    context = Context(None, "testtag set", "", user)
+
+    request = buffer.add_request(session, context, 0)
+    request.next_offset = "8"
+    buffer.submit(request)
+    assert session.query(InlineQuery).count() == 0
+
+    buffer.flush()
+    inline_query = session.query(InlineQuery).get(context.inline_query_id)
+    assert inline_query.mode == InlineQuery.SET_MODE
+    assert inline_query.user_id == user.id
+
+    inline_query_request = session.query(InlineQueryRequest).one()
+    assert inline_query_request.inline_query_id == inline_query.id
+    assert inline_query_request.next_offset == "8"
+
+
+def test_failed_batch_keeps_valid_rows(session, user):
+    """Only the failing rows of a batch and the requests of lost queries are dropped."""
+    buffer = AnalyticsBuffer()
+    context = Context(None, "testtag", "", user)
+    request = buffer.add_request(session, context, 0)
+    buffer.submit(request)
+
+    # The inline query of an unknown user violates the foreign key
+    lost_context = Context(None, "testtag", "", get_user())
+    lost_context.user.id = 1337
+    lost_request = buffer.add_request(session, lost_context, 0)
+    buffer.submit(lost_request)
+
+    buffer.flush()
+    assert session.query(InlineQuery).one().id == context.inline_query_id
+    assert session.query(InlineQueryRequest).count() == 1
+    assert lost_context.inline_query_id in buffer.lost_ids
+    assert buffer.dropped_rows == 2
+
+    # Later requests of the lost inline query don't break the next batch
+    buffer.submit(buffer.add_request(session, lost_context, 50))
+    buffer.submit(buffer.add_request(session, context, 50))
+
+    buffer.flush()
+    assert session.query(InlineQueryRequest).count() == 2
+    assert buffer.dropped_rows == 3
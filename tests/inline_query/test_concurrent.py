@@ -0,0 +1,74 @@
+"""Test the concurrent execution of strict and fuzzy search."""
+from concurrent.futures import Future
+
+from stickerfinder.config import config
+from stickerfinder.telegram.inline_query.concurrent import (
+    FuzzySearch,
+    cancel_fuzzy_search,
+    exclude_stickers,
+    should_search_concurrently,
+)
+from stickerfinder.telegram.inline_query.context import Context
+
+
+def test_exclude_strict_stickers():
+    """Strictly matching stickers are removed from the fuzzy results."""
+    fuzzy = [(i, f"file_{i}", f"unique_{i}", "set", 0.5) for i in range(0, 10)]
+
+    result = exclude_stickers(fuzzy, ["unique_3", "unique_7", "unknown"])
+    assert [sticker[0] for sticker in result] == [0, 1, 2, 4, 5, 6, 8, 9]
+
+
+def test_concurrent_search_for_sparse_tags(
+    session, tg_context, fuzzy_inline_search, user, monkeypatch
+):
+    """Fuzzy search is only started concurrently for tags on few stickers."""
+    monkeypatch.setitem(config["mode"], "concurrent_fuzzy", True)
+    monkeypatch.setitem(config["mode"], "concurrent_fuzzy_max_frequency", 50)
+
+    context = Context(tg_context, "longstrng", "", user)
+    assert should_search_concurrently(session, context)
+
+    # 20 stickers are tagged with `testtag`
+    monkeypatch.setitem(config["mode"], "concurrent_fuzzy_max_frequency", 20)
+    context = Context(tg_context, "testtag", "", user)
+    assert not should_search_concurrently(session, context)
+
+    # Only the first request is searched concurrently
+    context = Context(tg_context, "longstrng", "123:50", user)
+    assert not should_search_concurrently(session, context)
+
+
+class StatementRecorder:
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, statement):
+        self.statements.append(str(statement))
+
+
+def test_cancel_running_fuzzy_search():
+    """A running fuzzy query is canceled on the server."""
+    fuzzy_search = FuzzySearch()
+    fuzzy_search.future = Future()
+    fuzzy_search.future.set_running_or_notify_cancel()
+    fuzzy_search.backend_pid = 1234
+
+    session = StatementRecorder()
+    cancel_fuzzy_search(session, fuzzy_search)
+
+    assert fuzzy_search.canceled
+    assert len(session.statements) == 1
+    assert "pg_cancel_backend" in session.statements[0]
+
+
+def test_cancel_queued_fuzzy_search():
+    """A queued fuzzy query never reaches the server."""
+    fuzzy_search = FuzzySearch()
+    fuzzy_search.future = Future()
+
+    session = StatementRecorder()
+    cancel_fuzzy_search(session, fuzzy_search)
+
+    assert fuzzy_search.future.cancelled()
+    assert session.statements == []
@@ -1,4 +1,6 @@
 """Other context testing."""
+from types import SimpleNamespace
+
 from stickerfinder.telegram.inline_query.context import Context
 
 
@@ -47,3 +49,20 @@ def test_sticker_set_search(user):
     assert context.mode == Context.STICKER_SET_MODE
     assert len(context.tags) == 1
     assert context.tags[0] == "test"
+
+
+def test_deferred_answer():
+    """Deferred searches only remember their first answer."""
+    answers = []
+    inline_query = SimpleNamespace(answer=lambda results, **kwargs: answers.append(1))
+    user = SimpleNamespace(
+        id=2, nsfw=False, furry=False, international=False, deluxe=False
+    )
+    context = Context(None, "test", "", user)
+    context.deferred = True
+
+    context.answer(inline_query, [], switch_pm_text="Sorry")
+    context.answer(inline_query, ["sticker"])
+
+    assert answers == []
+    assert context.deferred_answer == (inline_query, [], {"switch_pm_text": "Sorry"})
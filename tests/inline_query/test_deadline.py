@@ -0,0 +1,37 @@
+"""Test deadline handling of inline search."""
+from types import SimpleNamespace
+
+from stickerfinder.config import config
+from stickerfinder.telegram.inline_query.context import Context
+from stickerfinder.telegram.inline_query.deadline import (
+    has_time_for_fuzzy_search,
+    search_within_deadline,
+)
+
+
+def get_user():
+    """Create a detached user."""
+    return SimpleNamespace(
+        id=2, nsfw=False, furry=False, international=False, deluxe=False
+    )
+
+
+def test_no_deadline(tg_context):
+    """Searches without a deadline are run as usual."""
+    context = Context(tg_context, "test", "", get_user())
+
+    assert context.get_remaining_time() is None
+    assert search_within_deadline(None, context, lambda session, context: [1]) == [1]
+    assert has_time_for_fuzzy_search(context)
+    assert not context.truncated
+
+
+def test_exceeded_deadline(tg_context, monkeypatch):
+    """Searches aren't started anymore, if the deadline has been exceeded."""
+    monkeypatch.setitem(config["mode"], "search_deadline", True)
+    monkeypatch.setitem(config["mode"], "search_budget_seconds", 0)
+    context = Context(tg_context, "test", "", get_user())
+
+    assert not has_time_for_fuzzy_search(context)
+    assert search_within_deadline(None, context, lambda session, context: [1]) is None
+    assert context.truncated
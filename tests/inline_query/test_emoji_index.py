@@ -0,0 +1,141 @@
+"""Test the in-memory emoji index for pure emoji searches."""
+from types import SimpleNamespace
+
+from stickerfinder.config import config
+from stickerfinder.logic.search_doc import rebuild_search_docs
+from stickerfinder.models import Tag
+from stickerfinder.telegram.inline_query.context import Context
+from stickerfinder.telegram.inline_query.emoji_index import (
+    EmojiIndex,
+    EmojiIndexSnapshot,
+    emoji_index,
+)
+from stickerfinder.telegram.inline_query.search import get_matching_stickers
+
+
+def get_user():
+    """Create a detached user with default settings."""
+    return SimpleNamespace(
+        id=2, nsfw=False, furry=False, international=False, deluxe=False
+    )
+
+
+def get_sticker(sticker_id, nsfw=False):
+    """Create a reviewed sticker row."""
+    return SimpleNamespace(
+        id=sticker_id,
+        file_id=f"file_{sticker_id}",
+        file_unique_id=f"unique_{sticker_id}",
+        set_name="set",
+        animated=False,
+        banned=False,
+        nsfw=nsfw,
+        furry=False,
+        international=False,
+        deluxe=False,
+        reviewed=True,
+        deleted=False,
+    )
+
+
+# Sorted by popularity
+STICKERS = [get_sticker(3), get_sticker(1), get_sticker(2, nsfw=True), get_sticker(4)]
+STICKER_EMOJIS = [
+    ("unique_1", "😂"),
+    ("unique_2", "😂"),
+    ("unique_3", "😂"),
+    ("unique_4", "😂"),
+    ("unique_4", "🐱"),
+    ("unique_1", "🐱"),
+]
+
+
+def test_emoji_detection(monkeypatch):
+    """Only queries, which consist of emojis, are emoji searches."""
+    monkeypatch.setitem(config["mode"], "emoji_index", True)
+
+    assert Context(None, "😂", "", get_user()).emoji
+    assert Context(None, "👍🏽 ❤️", "", get_user()).emoji
+    assert not Context(None, "😂 cat", "", get_user()).emoji
+    assert not Context(None, "😂 set", "", get_user()).emoji
+    assert not Context(None, "", "", get_user()).emoji
+    assert not Context(None, "°", "", get_user()).emoji
+    assert not Context(None, "^", "", get_user()).emoji
+
+
+def test_popularity_order(monkeypatch):
+    """Stickers are ordered by popularity and filtered by the user's settings."""
+    monkeypatch.setitem(config["mode"], "emoji_index", True)
+    snapshot = EmojiIndexSnapshot(STICKERS, STICKER_EMOJIS)
+    context = Context(None, "😂", "", get_user())
+
+    results = snapshot.get_matching_stickers(context, [], 0, 50)
+    assert [result[0] for result in results] == [3, 1, 4]
+
+    results = snapshot.get_matching_stickers(context, [], 1, 1)
+    assert [result[0] for result in results] == [1]
+
+
+def test_hits_and_usages(monkeypatch):
+    """Stickers with more matching emojis and more usages of the user rank higher."""
+    monkeypatch.setitem(config["mode"], "emoji_index", True)
+    snapshot = EmojiIndexSnapshot(STICKERS, STICKER_EMOJIS)
+
+    context = Context(None, "😂🐱", "", get_user())
+    results = snapshot.get_matching_stickers(context, [("unique_4", 2)], 0, 50)
+    assert [(result[0], result[4]) for result in results] == [
+        (4, 2.1),
+        (1, 2.0),
+        (3, 1.0),
+    ]
+
+
+def test_tags_with_several_emojis(monkeypatch):
+    """Tags with several emojis are indexed by each of their emojis."""
+    monkeypatch.setitem(config["mode"], "emoji_index", True)
+    snapshot = EmojiIndexSnapshot(STICKERS, [*STICKER_EMOJIS, ("unique_3", "🦄🐱")])
+
+    context = Context(None, "🦄", "", get_user())
+    results = snapshot.get_matching_stickers(context, [], 0, 50)
+    assert [result[0] for result in results] == [3]
+
+    context = Context(None, "🐱", "", get_user())
+    results = snapshot.get_matching_stickers(context, [], 0, 50)
+    assert [result[0] for result in results] == [3, 1, 4]
+
+
+def test_user_emoji_tags(session, tg_context, strict_inline_search, user, monkeypatch):
+    """Emojis, which users added as normal tags, are indexed as well."""
+    monkeypatch.setitem(config["mode"], "emoji_index", True)
+    sticker = strict_inline_search[0].stickers[0]
+    tag = Tag.get_or_create(session, "🦄", False, False)
+    sticker.tags.append(tag)
+    session.commit()
+    rebuild_search_docs(session)
+
+    emoji_index = EmojiIndex()
+    emoji_index.rebuild(session)
+
+    context = Context(tg_context, "🦄", "", user)
+    results = emoji_index.get_matching_stickers(session, context, 0, 50)
+    assert [result[1] for result in results] == [sticker.file_id]
+
+
+def test_fuzzy_search_without_index(
+    session, tg_context, fuzzy_inline_search, user, monkeypatch
+):
+    """Emoji searches fall back to fuzzy search, as long as the index isn't built."""
+    monkeypatch.setitem(config["mode"], "emoji_index", True)
+    monkeypatch.setattr(emoji_index, "snapshot", None)
+
+    context = Context(tg_context, "🦄", "", user)
+    assert context.emoji
+
+    get_matching_stickers(session, context)
+    assert context.switched_to_fuzzy
+
+    # The built index answers emoji searches without fuzzy search.
+    monkeypatch.setattr(emoji_index, "snapshot", EmojiIndexSnapshot([], []))
+    context = Context(tg_context, "🦄", "", user)
+    get_matching_stickers(session, context)
+    assert not context.switched_to_fuzzy
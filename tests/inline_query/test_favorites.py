@@ -0,0 +1,119 @@
+"""Test the precomputed favorites."""
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from stickerfinder.caches import favorite_cache
+from stickerfinder.logic.usage import invalidate_usages
+from stickerfinder.telegram.inline_query.favorites import (
+    add_favorite,
+    cache_favorites,
+    get_cached_favorites,
+    record_favorite,
+)
+
+now = datetime.now()
+
+
+def favorite(number, usage_count, minutes=0):
+    """Create a favorite row."""
+    updated_at = now + timedelta(minutes=minutes)
+    return (number, f"sticker_{number}", f"unique_{number}", usage_count, updated_at)
+
+
+def test_move_favorite():
+    """A used favorite moves up and keeps the list complete."""
+    favorites = [favorite(1, 3), favorite(2, 2), favorite(3, 1)]
+
+    favorites, complete = add_favorite((favorites, True), favorite(3, 3, minutes=1))
+
+    assert [entry[0] for entry in favorites] == [3, 1, 2]
+    assert complete
+
+
+def test_unknown_favorite_of_incomplete_list():
+    """Unknown stickers are only added to incomplete lists, if they rank among them."""
+    favorites = [favorite(1, 3), favorite(2, 2)]
+
+    cached = add_favorite((favorites, False), favorite(3, 1, minutes=1))
+    assert [entry[0] for entry in cached[0]] == [1, 2]
+
+    cached = add_favorite((favorites, False), favorite(3, 2, minutes=1))
+    assert [entry[0] for entry in cached[0]] == [1, 3, 2]
+
+
+def test_record_favorite():
+    """Chosen stickers are added to all matching filter variants."""
+    favorite_cache.clear()
+    user = SimpleNamespace(id=1)
+    context = SimpleNamespace(user=user, nsfw=False, furry=False, animated=False)
+    animated_context = SimpleNamespace(
+        user=user, nsfw=False, furry=False, animated=True
+    )
+    nsfw_context = SimpleNamespace(user=user, nsfw=True, furry=False, animated=False)
+    for filter_context in [context, animated_context, nsfw_context]:
+        cache_favorites(filter_context, [], complete=True)
+
+    sticker_set = SimpleNamespace(banned=False, nsfw=False, furry=False)
+    sticker = SimpleNamespace(
+        id=5,
+        file_id="sticker_5",
+        file_unique_id="unique_5",
+        animated=True,
+        banned=False,
+        sticker_set=sticker_set,
+    )
+    sticker_usage = SimpleNamespace(user_id=1, usage_count=1, updated_at=now)
+    record_favorite(sticker, sticker_usage)
+
+    assert get_cached_favorites(context, 0, 50) == [(5, "sticker_5", "unique_5", 1)]
+    assert get_cached_favorites(animated_context, 0, 50) == [
+        (5, "sticker_5", "unique_5", 1)
+    ]
+    assert get_cached_favorites(nsfw_context, 0, 50) == []
+    favorite_cache.clear()
+
+
+def test_invalidate_favorites():
+    """All filter variants of a user are dropped at once."""
+    favorite_cache.clear()
+    user = SimpleNamespace(id=1)
+    context = SimpleNamespace(user=user, nsfw=False, furry=False, animated=False)
+    nsfw_context = SimpleNamespace(user=user, nsfw=True, furry=False, animated=False)
+    other_context = SimpleNamespace(
+        user=SimpleNamespace(id=2), nsfw=False, furry=False, animated=False
+    )
+    for filter_context in [context, nsfw_context, other_context]:
+        cache_favorites(filter_context, [favorite(1, 1)], complete=True)
+
+    invalidate_usages(1)
+
+    assert get_cached_favorites(context, 0, 50) is None
+    assert get_cached_favorites(nsfw_context, 0, 50) is None
+    assert get_cached_favorites(other_context, 0, 50) == [
+        (1, "sticker_1", "unique_1", 1)
+    ]
+    favorite_cache.clear()
+
+
+def test_banned_favorite():
+    """Banned stickers aren't added to the favorites."""
+    favorite_cache.clear()
+    context = SimpleNamespace(
+        user=SimpleNamespace(id=1), nsfw=False, furry=False, animated=False
+    )
+    cache_favorites(context, [], complete=True)
+
+    sticker_set = SimpleNamespace(banned=False, nsfw=False, furry=False)
+    sticker = SimpleNamespace(
+        id=5,
+        file_id="sticker_5",
+        file_unique_id="unique_5",
+        animated=False,
+        banned=True,
+        sticker_set=sticker_set,
+    )
+    sticker_usage = SimpleNamespace(user_id=1, usage_count=1, updated_at=now)
+    record_favorite(sticker, sticker_usage)
+
+    assert get_cached_favorites(context, 0, 50) == []
+    favorite_cache.clear()
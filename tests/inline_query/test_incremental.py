@@ -0,0 +1,92 @@
+"""Test incremental strict search."""
+from decimal import Decimal
+from types import SimpleNamespace
+
+from stickerfinder.caches import recent_search_cache
+from stickerfinder.config import config
+from stickerfinder.models import StickerUsage
+from stickerfinder.telegram.inline_query.context import Context
+from stickerfinder.telegram.inline_query.incremental import (
+    get_previous_search,
+    merge_results,
+    remember_search,
+)
+from stickerfinder.telegram.inline_query.sql_query import (
+    get_strict_matching_query,
+    get_strict_matching_stickers,
+)
+
+
+def test_merge_results():
+    """The scores of added tags are added and new stickers get their usage score."""
+    results = [
+        (1, "file_1", "unique_1", "b_set", Decimal("1")),
+        (2, "file_2", "unique_2", "a_set", Decimal("1")),
+    ]
+    added_results = [
+        (1, "file_1", "unique_1", "b_set", Decimal("0.75")),
+        (3, "file_3", "unique_3", "c_set", Decimal("1")),
+    ]
+    usages = {"unique_3": 1}
+    key_ranks = {"unique_1": 2, "unique_2": 1, "unique_3": 3}
+
+    merged = merge_results(results, added_results, usages, key_ranks)
+    assert [result[0] for result in merged] == [1, 3, 2]
+    assert merged[0][4] == Decimal("1.75")
+    assert merged[1][4] == Decimal("1.05")
+
+
+def test_merge_results_ties_by_key_rank():
+    """Ties are ordered by the key rank of the database instead of the names."""
+    results = [(1, "file_1", "unique_1", "B_set", Decimal("1"))]
+    added_results = [(2, "file_2", "unique_2", "a_set", Decimal("1"))]
+    key_ranks = {"unique_1": 2, "unique_2": 1}
+
+    merged = merge_results(results, added_results, {}, key_ranks)
+    assert [result[0] for result in merged] == [2, 1]
+
+
+def test_previous_search_needs_all_tags(tg_context):
+    """Only searches that extend the previous search can use its results."""
+    user = SimpleNamespace(
+        id=2, nsfw=False, furry=False, international=False, deluxe=False
+    )
+    recent_search_cache.clear()
+    remember_search(Context(tg_context, "cat cute", "", user), [])
+
+    assert get_previous_search(Context(tg_context, "cat", "", user)) is None
+    assert get_previous_search(Context(tg_context, "cat cute", "", user)) is None
+    assert (
+        get_previous_search(Context(tg_context, "cat nsfw cute funny", "", user))
+        is None
+    )
+
+    _, added_tags = get_previous_search(Context(tg_context, "cute cat funny", "", user))
+    assert added_tags == ["funny"]
+    recent_search_cache.clear()
+
+
+def test_incremental_search_matches_sql(
+    session, tg_context, strict_inline_search, user, monkeypatch
+):
+    """Extended searches get the same results as the full query."""
+    monkeypatch.setitem(config["mode"], "incremental_search", True)
+    recent_search_cache.clear()
+
+    sticker = strict_inline_search[0].stickers[5]
+    sticker_usage = StickerUsage(user, sticker)
+    sticker_usage.usage_count = 3
+    session.add(sticker_usage)
+    session.commit()
+
+    context = Context(tg_context, "roflcopter", "", user)
+    get_strict_matching_stickers(session, context)
+    assert recent_search_cache.get(user.id) is not None
+
+    context = Context(tg_context, "roflcopter testtag", "", user)
+    results = get_strict_matching_stickers(session, context)
+    expected = get_strict_matching_query(session, context).all()
+
+    assert [result[0] for result in results] == [row[0] for row in expected]
+    assert [result[4] for result in results] == [row[4] for row in expected]
+    recent_search_cache.clear()
@@ -2,9 +2,14 @@
 import pytest
 from tests.factories import sticker_factory
 
+from stickerfinder.logic.search_doc import rebuild_search_docs
 from stickerfinder.models import Tag
 from stickerfinder.telegram.inline_query.context import Context
 from stickerfinder.telegram.inline_query.search import get_matching_stickers
+from stickerfinder.telegram.inline_query.sql_query import (
+    get_sticker_cursor,
+    get_strict_matching_query,
+)
 
 
 @pytest.mark.parametrize(
@@ -87,6 +92,7 @@ def test_no_combined_on_full_strict(session, tg_context, strict_inline_search, u
         sticker = sticker_factory(session, f"sticker_{i}", ["testtag", "unique-other"])
         sticker_set.stickers.append(sticker)
     session.commit()
+    rebuild_search_docs(session)
 
     matching_stickers, fuzzy_matching_stickers, duration = get_matching_stickers(
         session, context
@@ -114,9 +120,27 @@ def test_nsfw_search(session, tg_context, strict_inline_search, user):
     tag = Tag.get_or_create(session, "porn", False, False)
     sticker.tags.append(tag)
     session.commit()
+    rebuild_search_docs(session)
 
     matching_stickers, fuzzy_matching_stickers, duration = get_matching_stickers(
         session, context
     )
     assert len(matching_stickers) == 1
     assert matching_stickers[0][1] == sticker.file_id
+
+
+def test_strict_cursor_pagination(session, tg_context, strict_inline_search, user):
+    """Continuing after a cursor returns the same stickers as using an offset."""
+    context = Context(tg_context, "testtag roflcopter", "", user)
+    all_stickers = get_strict_matching_query(session, context).all()
+
+    last = all_stickers[29]
+    context = Context(
+        tg_context, "testtag roflcopter", f"1:30;{last[4]}:{last[0]}", user
+    )
+    cursor = get_sticker_cursor(session, context)
+    stickers = get_strict_matching_query(session, context, cursor=cursor).all()
+
+    assert [sticker[0] for sticker in stickers] == [
+        sticker[0] for sticker in all_stickers[30:]
+    ]
@@ -1,6 +1,9 @@
 """Test inline query logic with sticker usages."""
 from tests.factories import user_factory
 
+from stickerfinder.caches import usage_cache
+from stickerfinder.config import config
+from stickerfinder.logic.usage import record_usage
 from stickerfinder.models import Sticker, StickerUsage
 from stickerfinder.telegram.inline_query.context import Context
 from stickerfinder.telegram.inline_query.search import get_matching_stickers
@@ -68,3 +71,31 @@ def test_search_with_usage_from_another_user(
         assert result[1] == f"sticker_{i}"
         assert result[3] == "z_mega_awesome"
         assert result[4] == 0.75
+
+
+def test_search_with_cached_usages(
+    session, tg_context, strict_inline_search, user, monkeypatch
+):
+    """Cached usages are updated on write and result in the same scores."""
+    monkeypatch.setitem(config["cache"], "usage_enabled", True)
+    usage_cache.clear()
+
+    # Cache the empty usages of the user
+    context = Context(tg_context, "awesome", "", user)
+    matching_stickers, _, _ = get_matching_stickers(session, context)
+    assert matching_stickers[0][4] == 0.75
+    assert usage_cache.get(user.id) == {}
+
+    used_sticker = session.query(Sticker).filter(Sticker.file_id == "sticker_05").one()
+    sticker_usage = StickerUsage(user, used_sticker)
+    sticker_usage.usage_count = 5
+    session.add(sticker_usage)
+    session.commit()
+    record_usage(sticker_usage)
+
+    context = Context(tg_context, "awesome", "", user)
+    matching_stickers, _, _ = get_matching_stickers(session, context)
+    assert matching_stickers[0][1] == "sticker_05"
+    assert matching_stickers[0][4] == 1.0
+
+    usage_cache.clear()
@@ -0,0 +1,24 @@
+"""Test offloading the CPU-bound parts of async searches."""
+import asyncio
+import threading
+
+from sqlalchemy.util import greenlet_spawn
+
+from stickerfinder.telegram.inline_query.offload import run_cpu_bound
+
+
+def test_run_synchronously():
+    """CPU-bound work of synchronous searches runs in the current thread."""
+    assert run_cpu_bound(False, threading.get_ident) == threading.get_ident()
+
+
+def test_run_outside_of_event_loop():
+    """CPU-bound work of deferred searches doesn't block the event loop's thread."""
+
+    async def search():
+        loop_thread = threading.get_ident()
+        worker_thread = await greenlet_spawn(run_cpu_bound, True, threading.get_ident)
+        return loop_thread, worker_thread
+
+    loop_thread, worker_thread = asyncio.run(search())
+    assert loop_thread != worker_thread
@@ -1,11 +1,25 @@
 """Offset payload creation tests."""
+from decimal import Decimal
+
+from stickerfinder.models import StickerSet
 from stickerfinder.telegram.inline_query.context import Context
 from stickerfinder.telegram.inline_query.offset import (
     get_next_offset,
     get_next_set_offset,
+    get_sticker_set_key,
 )
 
 
+def get_stickers(start, end, score=1):
+    """Create fake sticker results (id, file_id, file_unique_id, set name, score)."""
+    return [(i, f"file_{i}", f"unique_{i}", "set", score) for i in range(start, end)]
+
+
+def get_sets(count):
+    """Create fake sticker set results (set, score)."""
+    return [(StickerSet(f"set_{i}", []), Decimal("2.75")) for i in range(count)]
+
+
 def test_extract_empty_offset(user):
     """Empyt offset should result in normal offset 0."""
     context = Context(None, "test", "", user)
@@ -31,21 +45,32 @@ def test_extract_fuzzy_offset(user):
     assert context.inline_query_id == 15235
     assert context.offset == 100
     assert context.fuzzy_offset == 0
+    assert context.cursor is None
+
+
+def test_extract_cursor(user):
+    """Extract the cursor of the last result from an offset payload."""
+    context = Context(None, "test", "15235:100:50;1.05:4242", user)
+
+    assert context.inline_query_id == 15235
+    assert context.offset == 100
+    assert context.fuzzy_offset == 50
+    assert context.cursor == (Decimal("1.05"), "4242")
 
 
 def test_get_next_strict_offset(user):
     """Create a new strict offset payload."""
     context = Context(None, "test", "123:50", user)
-    matching_stickers = range(0, 50)
+    matching_stickers = get_stickers(0, 50, Decimal("2.7500"))
 
     next_offset = get_next_offset(context, matching_stickers, [])
-    assert next_offset == "123:100"
+    assert next_offset == "123:100;2.75:49"
 
 
 def test_get_strict_finished_offset(user):
     """Create an offset payload that signals that strict search is done."""
     context = Context(None, "test", "123:50", user)
-    matching_stickers = range(0, 10)
+    matching_stickers = get_stickers(0, 10)
 
     next_offset = get_next_offset(context, matching_stickers, [])
     assert next_offset == "done"
@@ -55,28 +80,28 @@ def test_get_next_fuzzy_offset(user):
     """Create a new fuzzy offset payload."""
     context = Context(None, "test", "123:60:50", user)
     matching_stickers = []
-    fuzzy_matching_stickers = range(0, 50)
+    fuzzy_matching_stickers = get_stickers(0, 50, 0.123456789012)
 
     next_offset = get_next_offset(context, matching_stickers, fuzzy_matching_stickers)
-    assert next_offset == "123:60:100"
+    assert next_offset == "123:60:100;0.123456789:49"
 
 
 def test_switched_to_fuzzy_offset(user):
     """We didn't get enough strict results and switched to fuzzy."""
     context = Context(None, "test", "123:50", user)
-    matching_stickers = range(0, 40)
-    fuzzy_matching_stickers = range(0, 10)
+    matching_stickers = get_stickers(0, 40)
+    fuzzy_matching_stickers = get_stickers(40, 50, 0.5)
     context.switch_to_fuzzy(10)
 
     next_offset = get_next_offset(context, matching_stickers, fuzzy_matching_stickers)
-    assert next_offset == "123:90:10"
+    assert next_offset == "123:90:10;0.5:49"
 
 
 def test_done_offset(user):
     """Create a new fuzzy offset payload."""
     context = Context(None, "test", "123:60:50", user)
     matching_stickers = []
-    fuzzy_matching_stickers = range(0, 30)
+    fuzzy_matching_stickers = get_stickers(0, 30)
 
     next_offset = get_next_offset(context, matching_stickers, fuzzy_matching_stickers)
     assert next_offset == "done"
@@ -85,16 +110,45 @@ def test_done_offset(user):
 def test_get_next_set_offset(user):
     """Create a new set offset payload."""
     context = Context(None, "test", "123:0", user)
-    matching_sets = range(0, 8)
+    matching_sets = get_sets(8)
 
     next_offset = get_next_set_offset(context, matching_sets)
-    assert next_offset == "123:8"
+    assert next_offset == f"123:8;2.75:{get_sticker_set_key('set_7')}"
 
 
 def test_done_set_offset(user):
     """Create a new set offset payload."""
     context = Context(None, "test", "123:8", user)
-    matching_set = range(0, 4)
+    matching_set = get_sets(4)
 
     next_offset = get_next_set_offset(context, matching_set)
     assert next_offset == "done"
+
+
+def test_cursor_too_long(user):
+    """The cursor is dropped, if the payload gets too long for telegram."""
+    context = Context(None, "test", "1234567890123456789:50", user)
+    matching_stickers = get_stickers(10**40, 10**40 + 50)
+
+    next_offset = get_next_offset(context, matching_stickers, [])
+    assert next_offset == "1234567890123456789:100"
+
+
+def test_truncated_fuzzy_offset(user):
+    """Fuzzy search continues on the next request, if it has been skipped."""
+    context = Context(None, "test", "123:50", user)
+    matching_stickers = get_stickers(0, 40)
+    context.switch_to_fuzzy(10)
+    context.truncated = True
+
+    next_offset = get_next_offset(context, matching_stickers, [])
+    assert next_offset == "123:90:0"
+
+
+def test_truncated_strict_offset(user):
+    """A search without any results is done, if it hit the deadline."""
+    context = Context(None, "test", "123:50", user)
+    context.truncated = True
+
+    next_offset = get_next_offset(context, [], [])
+    assert next_offset == "done"
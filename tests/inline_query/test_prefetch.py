@@ -0,0 +1,121 @@
+"""Test the background prefetch of the next result window."""
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+from stickerfinder.config import config
+from stickerfinder.helper.sqlite_cache import SQLiteCache
+from stickerfinder.telegram.inline_query import cache, prefetch
+from stickerfinder.telegram.inline_query.cache import (
+    cache_stickers,
+    dump_entry,
+    initialize_cache,
+    inline_query_cache,
+    load_entry,
+)
+from stickerfinder.telegram.inline_query.context import Context
+from stickerfinder.telegram.inline_query.prefetch import (
+    cancel_prefetch,
+    schedule_prefetch,
+    wait_for_prefetch,
+)
+
+
+def get_user():
+    """Create a detached user with default settings."""
+    return SimpleNamespace(
+        id=2, nsfw=False, furry=False, international=False, deluxe=False
+    )
+
+
+def get_results(start, end):
+    """Create fake sticker results."""
+    return [(i, f"file_{i}", f"unique_{i}", "set", 1) for i in range(start, end)]
+
+
+def test_prefetch_next_window(tg_context, monkeypatch):
+    """The next window is fetched, once the cached results run out."""
+    monkeypatch.setitem(config["mode"], "prefetch", True)
+    monkeypatch.setitem(config["mode"], "inline_cache_size", 100)
+
+    prefetched = []
+
+    def fake_prefetch(context, fuzzy):
+        prefetched.append((context.offset, context.cursor, fuzzy))
+        cache_stickers(context, get_results(100, 150))
+
+    monkeypatch.setattr(prefetch, "prefetch", fake_prefetch)
+
+    context = Context(tg_context, "testtag", "123:0", get_user())
+    initialize_cache(context)
+    cache_stickers(context, get_results(0, 100))
+
+    # The second page is still cached
+    schedule_prefetch(context, "123:50")
+    assert len(prefetched) == 0
+
+    # The third page isn't cached
+    context = Context(tg_context, "testtag", "123:50", get_user())
+    schedule_prefetch(context, "123:100")
+    assert wait_for_prefetch(context)
+
+    assert len(prefetched) == 1
+    offset, cursor, fuzzy = prefetched[0]
+    assert offset == 100
+    assert cursor[1] == "99"
+    assert not fuzzy
+
+    cache = inline_query_cache.get(123)
+    assert len(cache["strict"]) == 150
+    assert cache["strict_complete"]
+
+
+def test_no_prefetch_when_complete(tg_context, monkeypatch):
+    """Nothing is prefetched, if all results have already been fetched."""
+    monkeypatch.setitem(config["mode"], "prefetch", True)
+    monkeypatch.setitem(config["mode"], "inline_cache_size", 100)
+    monkeypatch.setattr(prefetch, "prefetch", None)
+
+    context = Context(tg_context, "testtag", "123:50", get_user())
+    initialize_cache(context)
+    cache_stickers(context, get_results(0, 80))
+
+    schedule_prefetch(context, "123:100")
+    assert 123 not in prefetch.futures
+
+
+def test_prefetch_with_shared_backend(tg_context, tmp_path, monkeypatch):
+    """Prefetches are tracked by the process, since shared entries are copies."""
+    monkeypatch.setitem(config["mode"], "prefetch", True)
+    monkeypatch.setitem(config["mode"], "inline_cache_size", 100)
+    shared_cache = SQLiteCache(
+        str(tmp_path / "cache.sqlite"), 10, 60, dump=dump_entry, load=load_entry
+    )
+    monkeypatch.setattr(cache, "inline_query_cache", shared_cache)
+    monkeypatch.setattr(prefetch, "inline_query_cache", shared_cache)
+
+    prefetched = []
+
+    def fake_prefetch(context, fuzzy):
+        prefetched.append(context.offset)
+        cache_stickers(context, get_results(100, 150))
+
+    monkeypatch.setattr(prefetch, "prefetch", fake_prefetch)
+
+    context = Context(tg_context, "testtag", "126:0", get_user())
+    cache_stickers(context, get_results(0, 100))
+    context = Context(tg_context, "testtag", "126:50", get_user())
+    schedule_prefetch(context, "126:100")
+    assert wait_for_prefetch(context)
+
+    assert prefetched == [100]
+    assert len(shared_cache.get(126)["strict"]) == 150
+
+
+def test_cancel_prefetch():
+    """A queued prefetch is canceled, once a result has been chosen."""
+    future = Future()
+    prefetch.futures[127] = future
+
+    cancel_prefetch(127)
+    assert future.cancelled()
+    assert 127 not in prefetch.futures
@@ -0,0 +1,129 @@
+"""Test the inline query cache."""
+import time
+from types import SimpleNamespace
+
+from stickerfinder.helper.sqlite_cache import SQLiteCache
+from stickerfinder.telegram.inline_query import cache
+from stickerfinder.telegram.inline_query.cache import (
+    cache_sticker_sets,
+    cache_stickers,
+    dump_entry,
+    get_cached_sticker_sets,
+    get_cached_stickers,
+    get_entry_size,
+    initialize_cache,
+    inline_query_cache,
+    load_entry,
+    prune_sticker_files,
+    sticker_files,
+)
+from stickerfinder.telegram.inline_query.compact import StickerFiles
+from stickerfinder.telegram.inline_query.context import Context
+
+
+def get_user():
+    """Create a detached user with default settings."""
+    return SimpleNamespace(
+        id=2, nsfw=False, furry=False, international=False, deluxe=False
+    )
+
+
+def get_results(start, end):
+    """Create fake sticker results."""
+    return [(i, f"file_{i}", f"unique_{i}", "set", 1) for i in range(start, end)]
+
+
+def test_cached_results_are_accounted(tg_context):
+    """The size of an entry grows with its cached results."""
+    context = Context(tg_context, "testtag", "123:0", get_user())
+    cache = initialize_cache(context)
+    empty_size = inline_query_cache.bytes
+
+    cache_stickers(context, get_results(0, 100))
+    assert inline_query_cache.bytes == get_entry_size(cache)
+    assert inline_query_cache.bytes > empty_size
+    assert get_cached_stickers(context)[:2] == [(0, "file_0", 1.0), (1, "file_1", 1.0)]
+    assert len(get_cached_stickers(context)) == 50
+
+
+def test_evicted_entry(tg_context, monkeypatch):
+    """Entries are evicted by their size."""
+    monkeypatch.setattr(inline_query_cache, "max_bytes", 2500)
+
+    context = Context(tg_context, "testtag", "123:0", get_user())
+    cache_stickers(context, get_results(0, 20))
+
+    context = Context(tg_context, "testtag", "124:0", get_user())
+    cache_stickers(context, get_results(0, 40))
+
+    assert inline_query_cache.get(123) is None
+    assert len(inline_query_cache.get(124)["strict"]) == 40
+
+
+def test_sticker_sets_are_contiguous(tg_context):
+    """Sticker sets are only appended, if they directly follow the cached sets."""
+    sets = [(SimpleNamespace(name=f"set_{i}", title=f"Set {i}"), 1) for i in range(30)]
+    context = Context(tg_context, "testtag", "125:0", get_user())
+    cache_sticker_sets(context, sets[:16])
+
+    # A window, which has already been cached, isn't appended again
+    context = Context(tg_context, "testtag", "125:8", get_user())
+    cache_sticker_sets(context, sets[8:24])
+    assert len(inline_query_cache.get(125)["sets"]) == 16
+
+    context = Context(tg_context, "testtag", "125:16", get_user())
+    cache_sticker_sets(context, sets[16:30])
+    assert len(inline_query_cache.get(125)["sets"]) == 30
+    assert get_cached_sticker_sets(context)[0][0].name == "set_16"
+
+
+def test_prune_sticker_files(tg_context):
+    """The file ids are kept as long as any cached results reference them."""
+    context = Context(tg_context, "testtag", "123:0", get_user())
+    cache_stickers(context, get_results(0, 20))
+    context = Context(tg_context, "testtag", "124:0", get_user())
+    cache_stickers(context, get_results(10, 30))
+
+    inline_query_cache.pop(123)
+    prune_sticker_files()
+
+    assert sticker_files.get(5) is None
+    assert sticker_files.get(10) is not None
+    assert len(get_cached_stickers(context)) == 20
+
+
+def test_pruned_sticker_files(tg_context):
+    """Entries with pruned file ids are dropped instead of returning a short page."""
+    context = Context(tg_context, "testtag", "126:0", get_user())
+    cache_stickers(context, get_results(2000, 2100))
+
+    # The entry has been evicted and the file ids have been pruned in the meantime
+    sticker_files.prune(set(range(2000, 2090)), time.monotonic())
+
+    context = Context(tg_context, "testtag", "126:50", get_user())
+    assert get_cached_stickers(context) == []
+    assert inline_query_cache.get(126) is None
+
+
+def test_shared_backend(tg_context, tmp_path, monkeypatch):
+    """Other processes can serve the cached results, including the file ids."""
+    path = str(tmp_path / "cache.sqlite")
+    shared_cache = SQLiteCache(path, 10, 60, dump=dump_entry, load=load_entry)
+    monkeypatch.setattr(cache, "inline_query_cache", shared_cache)
+
+    context = Context(tg_context, "testtag", "125:0", get_user())
+    cache_stickers(context, get_results(1000, 1100))
+
+    # The same window is only cached once
+    cache_stickers(context, get_results(1000, 1100))
+
+    # A new process doesn't know the file ids yet
+    monkeypatch.setattr(cache, "sticker_files", StickerFiles())
+    shared_cache = SQLiteCache(path, 10, 60, dump=dump_entry, load=load_entry)
+    monkeypatch.setattr(cache, "inline_query_cache", shared_cache)
+
+    context = Context(tg_context, "testtag", "125:50", get_user())
+    results = get_cached_stickers(context)
+    assert len(shared_cache.get(125)["strict"]) == 100
+    assert results[0] == (1050, "file_1050", 1.0)
+    assert len(results) == 50
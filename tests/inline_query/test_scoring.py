@@ -0,0 +1,87 @@
+"""Test the scoring and ranking of strict search in python."""
+from decimal import Decimal
+
+import pytest
+
+from stickerfinder.models import StickerUsage
+from stickerfinder.telegram.inline_query.context import Context
+from stickerfinder.telegram.inline_query.scoring import rank_matches
+from stickerfinder.telegram.inline_query.sql_query import (
+    get_ranked_strict_matching_stickers,
+    get_strict_matching_query,
+)
+
+# (id, file_id, file_unique_id, set name, key rank, tag match, set match, text match)
+MATCHES = [
+    (1, "file_1", "unique_1", "b_set", 4, True, False, False),
+    (2, "file_2", "unique_2", "a_set", 1, True, False, False),
+    (3, "file_3", "unique_3", "a_set", 2, False, True, None),
+    (4, "file_4", "unique_4", "a_set", 3, True, True, True),
+    (5, "file_5", "unique_5", "c_set", 5, False, False, True),
+]
+
+
+def test_scores_and_order():
+    """Stickers are ordered by score and afterwards by set name and file_unique_id."""
+    results = rank_matches(MATCHES, 1, {"unique_5": 2}, 0, 10)
+
+    assert [result[0] for result in results] == [4, 2, 1, 3, 5]
+    assert [result[4] for result in results] == [2.15, 1.0, 1.0, 0.75, 0.5]
+
+
+def test_ties_by_key_rank():
+    """Ties are ordered by the key rank of the database instead of the names."""
+    matches = [
+        (1, "file_1", "unique_1", "B_set", 2, True),
+        (2, "file_2", "unique_2", "a_set", 1, True),
+    ]
+
+    results = rank_matches(matches, 1, {}, 0, 10)
+    assert [result[0] for result in results] == [2, 1]
+
+    cursor = (Decimal("1.0"), ["a_set", "unique_2"])
+    results = rank_matches(matches, 1, {}, 0, 10, cursor)
+    assert [result[0] for result in results] == [1]
+
+
+@pytest.mark.parametrize("offset,limit", [(0, 1), (0, 2), (1, 2), (2, 3), (4, 10)])
+def test_windows_match_full_ranking(offset, limit):
+    """Partially sorted windows are the same as the windows of the full ranking."""
+    expected = rank_matches(MATCHES, 1, {}, 0, 10)[offset : offset + limit]
+
+    assert rank_matches(MATCHES, 1, {}, offset, limit) == expected
+
+
+def test_cursor():
+    """A cursor continues right after its sticker."""
+    results = rank_matches(MATCHES, 1, {}, 0, 10)
+    cursor = (Decimal("1.0"), ["a_set", "unique_2"])
+
+    assert rank_matches(MATCHES, 1, {}, 0, 10, cursor) == results[2:]
+
+
+def test_cursor_without_match():
+    """The offset is used, if the sticker of the cursor no longer matches."""
+    results = rank_matches(MATCHES, 1, {}, 0, 10)
+    cursor = (Decimal("1.0"), ["a_set", "unique_6"])
+
+    assert rank_matches(MATCHES, 1, {}, 2, 10, cursor) == results[2:]
+
+
+def test_numpy_engine_matches_sql(session, tg_context, strict_inline_search, user):
+    """The ranked matches are the same stickers in the same order as the sql query."""
+    sticker = strict_inline_search[0].stickers[3]
+    sticker_usage = StickerUsage(user, sticker)
+    sticker_usage.usage_count = 3
+    session.add(sticker_usage)
+    session.commit()
+
+    for query in ["testtag", "awesome dumb testtag roflcopter", "unique-other"]:
+        context = Context(tg_context, query, "", user)
+        expected = get_strict_matching_query(session, context).all()
+        results = get_ranked_strict_matching_stickers(session, context, 500)
+
+        assert len(results) == len(expected)
+        for result, expected_result in zip(results, expected):
+            assert result[0] == expected_result[0]
+            assert result[4] == round(float(expected_result[4]), 2)
@@ -1,6 +1,8 @@
 """Test inline query logic."""
+from stickerfinder.telegram.inline_query.cache import inline_query_cache
 from stickerfinder.telegram.inline_query.context import Context
 from stickerfinder.telegram.inline_query.search import get_matching_sticker_sets
+from stickerfinder.telegram.inline_query.sql_query import get_sticker_set_previews
 
 
 def test_strict_sticker_search_set_order(
@@ -21,3 +23,28 @@ def test_strict_sticker_search_set_order(
     second_set = matching_sets[1]
     assert second_set[0].name == "a_dumb_shit"
     assert second_set[1] == 20
+
+
+def test_cached_sticker_sets(session, tg_context, strict_inline_search, user):
+    """The ranked sets are cached for the next requests of the inline query."""
+    context = Context(tg_context, "testtag set", "", user)
+    get_matching_sticker_sets(session, context)
+
+    cache = inline_query_cache.get(context.inline_query_id)
+    assert [cached_set[0].name for cached_set in cache["sets"]] == [
+        "z_mega_awesome",
+        "a_dumb_shit",
+    ]
+    assert cache["sets_complete"]
+
+
+def test_sticker_set_previews(session, strict_inline_search):
+    """The first five stickers of each set are fetched at once."""
+    sticker_set = strict_inline_search[0]
+    previews = get_sticker_set_previews(session, ["z_mega_awesome", "a_dumb_shit"])
+
+    assert len(previews["z_mega_awesome"]) == 5
+    assert len(previews["a_dumb_shit"]) == 5
+    assert previews["z_mega_awesome"] == [
+        (sticker.id, sticker.file_id) for sticker in sticker_set.stickers[:5]
+    ]
@@ -0,0 +1,82 @@
+"""Test the strict search results, which are shared between all users."""
+from decimal import Decimal
+
+import pytest
+
+from stickerfinder.caches import shared_result_cache
+from stickerfinder.config import config
+from stickerfinder.models import StickerUsage
+from stickerfinder.telegram.inline_query.context import Context
+from stickerfinder.telegram.inline_query.shared_cache import (
+    may_reach_window,
+    rank_candidates,
+)
+from stickerfinder.telegram.inline_query.sql_query import (
+    get_shared_strict_matching_stickers,
+    get_strict_matching_query,
+    search_strict_matching_stickers,
+)
+
+
+def test_rank_candidates():
+    """The usage score is added and ties are broken by the key rank."""
+    candidates = [
+        (1, "file_1", "unique_1", "z_set", Decimal("1.05"), 3),
+        (2, "file_2", "unique_2", "a_set", Decimal("1"), 1),
+        (3, "file_3", "unique_3", "b_set", Decimal("1"), 2),
+    ]
+    usages = {"unique_2": 1}
+
+    ranked = rank_candidates(candidates, usages, 0, 50)
+    assert [sticker[0] for sticker in ranked] == [2, 1, 3]
+    assert ranked[0][4] == Decimal("1.05")
+
+    assert rank_candidates(candidates, usages, 1, 1)[0][0] == 1
+
+
+def test_used_stickers_after_truncated_candidates():
+    """Only usages that can lift stickers after the candidates into the window count."""
+    candidates = [
+        (1, "file_1", "unique_1", "a_set", Decimal("2"), 1),
+        (2, "file_2", "unique_2", "a_set", Decimal("1.1"), 2),
+        (3, "file_3", "unique_3", "a_set", Decimal("1"), 3),
+    ]
+
+    assert not may_reach_window(candidates, {}, 1)
+    assert not may_reach_window(candidates, {"unique_1": 50}, 1)
+    assert not may_reach_window(candidates, {"unique_4": 1}, 1)
+    assert may_reach_window(candidates, {"unique_4": 2}, 2)
+    assert may_reach_window(candidates, {"unique_4": 20}, 1)
+
+
+@pytest.mark.parametrize("candidate_count", [2000, 25])
+def test_shared_results_match_sql(
+    session, tg_context, strict_inline_search, user, monkeypatch, candidate_count
+):
+    """Shared results are the same as the ones of the personalized query."""
+    monkeypatch.setitem(config["cache"], "shared_results_enabled", True)
+    monkeypatch.setitem(config["cache"], "shared_results_candidates", candidate_count)
+    shared_result_cache.clear()
+
+    sticker = strict_inline_search[1].stickers[5]
+    sticker_usage = StickerUsage(user, sticker)
+    sticker_usage.usage_count = 3
+    session.add(sticker_usage)
+    session.commit()
+
+    context = Context(tg_context, "testtag roflcopter", "", user)
+    expected = get_strict_matching_query(session, context).all()
+
+    # Falls back to the personalized query, if the used sticker may rank in the window
+    results = search_strict_matching_stickers(session, context, 20)
+    assert [result[0] for result in results] == [row[0] for row in expected[:20]]
+    assert results[0][4] == expected[0][4]
+
+    # The window isn't covered by the truncated candidates
+    results = get_shared_strict_matching_stickers(session, context, 20, 20)
+    if candidate_count < 40:
+        assert results is None
+    else:
+        assert [result[0] for result in results] == [row[0] for row in expected[20:40]]
+
+    shared_result_cache.clear()
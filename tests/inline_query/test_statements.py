@@ -0,0 +1,57 @@
+"""Test the prebuilt search statements."""
+from stickerfinder.telegram.inline_query.cache import initialize_cache
+from stickerfinder.telegram.inline_query.context import Context
+from stickerfinder.telegram.inline_query.sql_query import (
+    get_fuzzy_matching_query,
+    get_fuzzy_matching_stickers,
+    get_strict_matching_query,
+    get_strict_matching_stickers,
+)
+from stickerfinder.telegram.inline_query.statements import (
+    StatementCache,
+    statement_cache,
+)
+
+
+def test_statement_cache():
+    """Statements are only built once per shape."""
+    cache = StatementCache()
+    built = []
+
+    def build():
+        built.append(1)
+        return len(built)
+
+    assert cache.get(("strict", 1), build) == 1
+    assert cache.get(("strict", 1), build) == 1
+    assert cache.get(("strict", 2), build) == 2
+    assert len(cache) == 2
+
+
+def test_reused_strict_statement(session, tg_context, strict_inline_search, user):
+    """A reused statement only binds the values of the current search."""
+    statement_cache.clear()
+    for query in ["testtag", "roflcopter"]:
+        context = Context(tg_context, query, "", user)
+        expected = get_strict_matching_query(session, context).limit(500).all()
+
+        matching_stickers = get_strict_matching_stickers(session, context)
+        assert [row[0] for row in matching_stickers] == [row[0] for row in expected]
+
+    assert len(statement_cache) == 1
+
+
+def test_reused_fuzzy_statement(session, tg_context, fuzzy_inline_search, user):
+    """A reused fuzzy statement only binds the values of the current search."""
+    statement_cache.clear()
+    for query in ["longstrng", "z_one_sit"]:
+        context = Context(tg_context, query, "", user)
+        context.switch_to_fuzzy(50)
+        initialize_cache(context)
+        expected = get_fuzzy_matching_query(session, context, strict_file_unique_ids=[])
+        expected = expected.limit(550).all()
+
+        matching_stickers = get_fuzzy_matching_stickers(session, context)
+        assert [row[0] for row in matching_stickers] == [row[0] for row in expected]
+
+    assert len(statement_cache) == 1
@@ -0,0 +1,90 @@
+"""Test the in-memory tag index for strict search."""
+import pytest
+
+from stickerfinder.logic.search_doc import rebuild_search_docs
+from stickerfinder.models import StickerUsage, Tag
+from stickerfinder.telegram.inline_query.context import Context
+from stickerfinder.telegram.inline_query.sql_query import get_strict_matching_query
+from stickerfinder.telegram.inline_query.tag_index import SubstringIndex, TagIndex
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "testtag",
+        "awesome dumb",
+        "testtag roflcopter",
+        "awesome dumb testtag roflcopter",
+        "awesome testtag roflcopter",
+        "unique-other",
+    ],
+)
+def test_tag_index_matches_sql(session, tg_context, strict_inline_search, user, query):
+    """The tag index returns the same stickers in the same order as the sql query."""
+    sticker = strict_inline_search[0].stickers[3]
+    sticker_usage = StickerUsage(user, sticker)
+    sticker_usage.usage_count = 3
+    session.add(sticker_usage)
+    session.commit()
+
+    context = Context(tg_context, query, "", user)
+    expected = get_strict_matching_query(session, context).all()
+
+    tag_index = TagIndex()
+    tag_index.rebuild(session)
+    results = tag_index.get_strict_matching_stickers(session, context, 0, 500)
+
+    assert len(results) == len(expected)
+    for result, expected_result in zip(results, expected):
+        assert result[0] == expected_result[0]
+        assert result[3] == expected_result[3]
+        assert round(result[4], 2) == round(float(expected_result[4]), 2)
+
+
+def test_tag_index_offset(session, tg_context, strict_inline_search, user):
+    """Offset and limit are applied on the ordered results."""
+    context = Context(tg_context, "testtag", "", user)
+
+    tag_index = TagIndex()
+    tag_index.rebuild(session)
+    all_results = tag_index.get_strict_matching_stickers(session, context, 0, 500)
+    results = tag_index.get_strict_matching_stickers(session, context, 10, 20)
+
+    assert len(all_results) == 60
+    assert results == all_results[10:30]
+
+
+def test_tag_index_flags(session, tg_context, strict_inline_search, user):
+    """Nsfw stickers are only found in nsfw search."""
+    sticker_set = strict_inline_search[0]
+    sticker_set.nsfw = True
+
+    sticker = sticker_set.stickers[0]
+    tag = Tag.get_or_create(session, "porn", False, False)
+    sticker.tags.append(tag)
+    session.commit()
+    rebuild_search_docs(session)
+
+    tag_index = TagIndex()
+    tag_index.rebuild(session)
+
+    context = Context(tg_context, "porn", "", user)
+    results = tag_index.get_strict_matching_stickers(session, context, 0, 500)
+    assert len(results) == 0
+
+    context = Context(tg_context, "nsfw porn roflcopter", "", user)
+    results = tag_index.get_strict_matching_stickers(session, context, 0, 500)
+    assert len(results) == 1
+    assert results[0][1] == sticker.file_id
+
+
+def test_substring_index():
+    """The substring index finds the same texts as a scan over all texts."""
+    texts = ["roflcopter", "copter\nhelicopter", "cop", "", "rofl rofl"]
+    substring_index = SubstringIndex(texts)
+
+    for term in ["rofl", "copter", "cop", "co", "r", "lcop", "flco", "x", "ter\nhel"]:
+        expected = [position for position, text in enumerate(texts) if term in text]
+        assert list(substring_index.find(term)) == expected
+        # The remembered matches are the same
+        assert list(substring_index.find(term)) == expected
@@ -0,0 +1,69 @@
+"""Test the in-memory trigram index for fuzzy search."""
+import pytest
+from sqlalchemy import func
+
+from stickerfinder.config import config
+from stickerfinder.helper.trigram import get_trigrams, similarity
+from stickerfinder.models import Tag
+from stickerfinder.telegram.inline_query import similar_tags
+from stickerfinder.telegram.inline_query.similar_tags import get_similar_tags
+from stickerfinder.telegram.inline_query.trigram_index import TrigramIndex
+
+
+@pytest.fixture
+def trigram_index(session, fuzzy_inline_search, monkeypatch):
+    """Look up similar tags in a freshly built trigram index."""
+    monkeypatch.setitem(config["mode"], "similar_tag_engine", "memory")
+    monkeypatch.setitem(config["cache"], "tag_expansion_enabled", False)
+
+    trigram_index = TrigramIndex()
+    monkeypatch.setattr(similar_tags, "trigram_index", trigram_index)
+
+    return trigram_index
+
+
+def test_trigrams():
+    """Trigrams are built like pg_trgm's `show_trgm`."""
+    assert get_trigrams("word") == {"  w", " wo", "wor", "ord", "rd "}
+    assert get_trigrams("A-b") == {"  a", " a ", "  b", " b "}
+    assert get_trigrams("/😀") == set()
+
+
+def test_similarity():
+    """The similarity is the same as the one of pg_trgm."""
+    assert similarity("word", "two words") == pytest.approx(0.363636, abs=1e-6)
+    assert similarity("word", "word") == 1
+    assert similarity("", "word") == 0
+
+
+@pytest.mark.parametrize("query", ["longstrng", "testtga roflcopter", "/longstring"])
+def test_trigram_index_matches_sql(session, trigram_index, query):
+    """The trigram index finds the same similar tags as postgres."""
+    terms = query.split(" ")
+    expected = {}
+    for tag in session.query(Tag).all():
+        similarities = [
+            session.query(func.similarity(tag.name, term)).scalar() for term in terms
+        ]
+        if max(similarities) >= 0.3:
+            expected[tag.name] = max(similarities)
+
+    trigram_index.rebuild(session)
+    found_tags = get_similar_tags(session, terms, True, 0.3)
+
+    assert len(found_tags) == len(expected)
+    for name, tag_similarity in found_tags:
+        assert tag_similarity == pytest.approx(expected[name], abs=1e-6)
+
+
+def test_international_tags(session, trigram_index):
+    """International tags are only found by international users."""
+    Tag.get_or_create(session, "longstrings", True, False)
+    session.commit()
+
+    trigram_index.rebuild(session)
+
+    names = [name for name, _ in get_similar_tags(session, ["longstring"], True, 0.3)]
+    assert "longstrings" in names
+    names = [name for name, _ in get_similar_tags(session, ["longstring"], False, 0.3)]
+    assert "longstrings" not in names
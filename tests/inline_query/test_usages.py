@@ -0,0 +1,68 @@
+"""Test the batched usages of chosen inline results."""
+from stickerfinder.models import InlineQuery, Sticker, StickerUsage
+from stickerfinder.telegram.inline_query import usages
+from stickerfinder.telegram.inline_query.usages import MAX_FAILED_FLUSHES, UsageBuffer
+
+
+def test_usages_are_aggregated():
+    """Repeated usages of a sticker are counted and only the last choice is kept."""
+    buffer = UsageBuffer()
+    buffer.add(2, 10, 5)
+    buffer.add(2, 10, 6)
+    buffer.add(2, 11, 5)
+
+    assert buffer.usages == {(2, 5): 2, (2, 6): 1}
+    assert buffer.chosen == {10: 6, 11: 5}
+
+
+def test_failed_flush_requeues_usages(monkeypatch):
+    """The usages of a failed batch are retried, until too many flushes failed."""
+
+    def fail(session, usages, chosen):
+        raise RuntimeError("Connection lost")
+
+    monkeypatch.setattr(usages, "apply_usages", fail)
+    buffer = UsageBuffer()
+    buffer.running = True
+
+    buffer.add(2, 10, 5)
+    buffer.flush()
+    buffer.add(2, 10, 6)
+    buffer.add(2, 11, 5)
+
+    assert buffer.usages == {(2, 5): 2, (2, 6): 1}
+    assert buffer.chosen == {10: 6, 11: 5}
+
+    for _ in range(MAX_FAILED_FLUSHES - 1):
+        buffer.flush()
+
+    assert len(buffer.usages) == 0
+    assert buffer.failed_flushes == 0
+
+
+def test_flush_upserts_usages(session, user, sticker_set):
+    """Usages are added to existing usages and the chosen stickers are stored."""
+    sticker = session.query(Sticker).filter(Sticker.file_id == "0").one()
+    other_sticker = session.query(Sticker).filter(Sticker.file_id == "1").one()
+
+    sticker_usage = StickerUsage(user, sticker)
+    sticker_usage.usage_count = 3
+    session.add(sticker_usage)
+    inline_query = InlineQuery("test", user)
+    session.add(inline_query)
+    session.commit()
+
+    buffer = UsageBuffer()
+    buffer.add(user.id, inline_query.id, sticker.id)
+    buffer.add(user.id, inline_query.id, sticker.id)
+    buffer.add(user.id, inline_query.id, other_sticker.id)
+    buffer.flush()
+    session.expire_all()
+
+    usages = {
+        usage.sticker_file_unique_id: usage.usage_count
+        for usage in session.query(StickerUsage).all()
+    }
+    assert usages == {sticker.file_unique_id: 5, other_sticker.file_unique_id: 1}
+    assert inline_query.sticker_file_unique_id == other_sticker.file_unique_id
+    assert len(buffer.usages) == 0
@@ -0,0 +1,67 @@
+"""Test the cached profiles of users."""
+import time
+from types import SimpleNamespace
+
+from stickerfinder.caches import user_profile_cache
+from stickerfinder.config import config
+from stickerfinder.helper.sqlite_cache import SQLiteCache
+from stickerfinder.logic import user as user_logic
+from stickerfinder.logic.user import (
+    get_user_profile,
+    invalidate_user_profile,
+    is_invalidated,
+)
+
+
+def test_cached_profile_skips_database(monkeypatch):
+    """A cached profile is used, as long as the username didn't change."""
+    monkeypatch.setitem(config["cache"], "user_profile_enabled", True)
+    user_profile_cache.clear()
+
+    profile = SimpleNamespace(id=2, username="testuser", banned=False)
+    user_profile_cache.put(2, profile)
+
+    # There's no session, so any database access would fail.
+    assert get_user_profile(None, SimpleNamespace(id=2, username="TestUser")) is profile
+    assert get_user_profile(None, SimpleNamespace(id=2, username=None)) is profile
+
+    user_profile_cache.clear()
+
+
+def test_profile_is_invalidated(session, user, monkeypatch):
+    """Changed flags are loaded after the profile has been invalidated."""
+    monkeypatch.setitem(config["cache"], "user_profile_enabled", True)
+    user_profile_cache.clear()
+    tg_user = SimpleNamespace(id=user.id, username=user.username)
+
+    assert get_user_profile(session, tg_user).banned is False
+
+    user.banned = True
+    session.commit()
+    assert get_user_profile(session, tg_user).banned is False
+
+    invalidate_user_profile(user.id)
+    assert get_user_profile(session, tg_user).banned is True
+
+    user_profile_cache.clear()
+
+
+def test_invalidation_of_other_process(tmp_path, monkeypatch):
+    """Profiles, which have been invalidated by another process, are reloaded."""
+    path = str(tmp_path / "invalidations.sqlite")
+    monkeypatch.setattr(
+        user_logic, "user_profile_invalidations", SQLiteCache(path, 100, 60)
+    )
+    profile = SimpleNamespace(id=2, username="testuser", loaded_at=time.time())
+    assert not is_invalidated(profile)
+
+    # The other process uses its own connection to the same file.
+    monkeypatch.setattr(
+        user_logic, "user_profile_invalidations", SQLiteCache(path, 100, 60)
+    )
+    invalidate_user_profile(2)
+    assert is_invalidated(profile)
+
+    # Profiles loaded after the invalidation are still valid.
+    profile = SimpleNamespace(id=2, username="testuser", loaded_at=time.time() + 1)
+    assert not is_invalidated(profile)
@@ -0,0 +1,21 @@
+"""Test the distribution of updates in pre-fork mode."""
+from stickerfinder.prefork import get_update_user_id, get_worker
+
+
+def test_updates_of_a_user_share_a_worker():
+    """All updates of a user are handled by the same worker."""
+    inline_query = {"update_id": 1, "inline_query": {"id": "1", "from": {"id": 7}}}
+    chosen_result = {"update_id": 2, "chosen_inline_result": {"from": {"id": 7}}}
+    message = {"update_id": 3, "message": {"from": {"id": 8}, "chat": {"id": 8}}}
+
+    assert get_worker(inline_query, 4) == 3
+    assert get_worker(chosen_result, 4) == 3
+    assert get_worker(message, 4) == 0
+
+
+def test_updates_without_user():
+    """Channel posts are distributed by chat and unknown updates by the first worker."""
+    channel_post = {"update_id": 1, "channel_post": {"chat": {"id": -1005}}}
+
+    assert get_update_user_id(channel_post) == -1005
+    assert get_update_user_id({"update_id": 2, "poll": {}}) == 0
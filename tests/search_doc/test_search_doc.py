@@ -0,0 +1,61 @@
+"""Test the maintenance of the sticker search documents."""
+from stickerfinder.logic.search_doc import (
+    rebuild_search_docs,
+    update_search_docs_of_set,
+)
+from stickerfinder.logic.tag import tag_sticker
+from stickerfinder.models import StickerSearchDoc, Tag
+
+
+def test_tag_sticker_updates_doc(session, user, sticker_set):
+    """Tagging a sticker creates and updates its search document."""
+    sticker = sticker_set.stickers[0]
+    tag_sticker(session, "tag-one", sticker, user)
+    session.commit()
+
+    doc = session.query(StickerSearchDoc).get(sticker.file_unique_id)
+    assert doc.tags == ["tag-one"]
+    assert doc.set_name == sticker_set.name
+
+    tag_sticker(session, "tag-two", sticker, user)
+    session.commit()
+
+    doc = session.query(StickerSearchDoc).get(sticker.file_unique_id)
+    assert doc.tags == ["tag-one", "tag-two"]
+
+
+def test_set_flags_are_updated(session, strict_inline_search):
+    """Changed set flags are copied onto all documents of the set."""
+    sticker_set = strict_inline_search[0]
+    sticker_set.nsfw = True
+    update_search_docs_of_set(session, sticker_set)
+    session.commit()
+
+    docs = (
+        session.query(StickerSearchDoc)
+        .filter(StickerSearchDoc.set_name == sticker_set.name)
+        .all()
+    )
+    assert len(docs) == len(sticker_set.stickers)
+    assert all(doc.nsfw for doc in docs)
+
+
+def test_rebuild_splits_international_tags(session, strict_inline_search):
+    """International tags are stored separately."""
+    sticker = strict_inline_search[0].stickers[0]
+    tag = Tag.get_or_create(session, "international-tag", True, False)
+    sticker.tags.append(tag)
+    sticker.banned = True
+    other_sticker = strict_inline_search[0].stickers[1]
+    other_sticker.tags.append(tag)
+    session.commit()
+
+    rebuild_search_docs(session)
+    session.commit()
+
+    # Banned stickers don't have a document
+    assert session.query(StickerSearchDoc).get(sticker.file_unique_id) is None
+
+    doc = session.query(StickerSearchDoc).get(other_sticker.file_unique_id)
+    assert sorted(doc.tags) == ["testtag", "unique-other"]
+    assert doc.international_tags == ["international-tag"]